@@ -12,7 +12,7 @@ from backend.routes.articles import bp as articles_bp
 from backend.routes.mp_accounts import bp as accounts_bp
 from backend.routes.targets import bp as targets_bp
 from backend.routes.logs import bp as logs_bp
-from backend.scheduler import setup_scheduler, refresh_jobs
+from backend.scheduler import setup_scheduler, refresh_jobs, is_leader
 from backend.security import hash_password
 
 
@@ -36,7 +36,11 @@ def create_app() -> Flask:
 
     @app.route("/api/health")
     def health():
-        return jsonify({"status": "ok"})
+        if settings.scheduler_mode == "off":
+            role = "off"
+        else:
+            role = "leader" if is_leader() else "standby"
+        return jsonify({"status": "ok", "scheduler": role})
 
     dist_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "dist"))
 
@@ -16,6 +16,59 @@ class Settings:
     request_max_delay: float = float(os.getenv("REQUEST_MAX_DELAY", "2.0"))
     request_timeout: float = float(os.getenv("REQUEST_TIMEOUT", "10.0"))
     request_retries: int = int(os.getenv("REQUEST_RETRIES", "3"))
+    http_pool_size: int = int(os.getenv("HTTP_POOL_SIZE", "10"))
+    http_retries: int = int(os.getenv("HTTP_RETRIES", "2"))
+    http_backoff: float = float(os.getenv("HTTP_BACKOFF", "0.5"))
+    rate_limit_per_minute: float = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+    rate_limit_burst: int = int(os.getenv("RATE_LIMIT_BURST", "5"))
+    rate_limit_max_wait: float = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+    cooldown_base: float = float(os.getenv("COOLDOWN_BASE", "60"))
+    cooldown_max: float = float(os.getenv("COOLDOWN_MAX", "1800"))
+    cooldown_jitter: float = float(os.getenv("COOLDOWN_JITTER", "0.2"))
+    account_pool_enabled: bool = os.getenv("ACCOUNT_POOL_ENABLED", "false").lower() == "true"
+    breaker_threshold: int = int(os.getenv("BREAKER_THRESHOLD", "3"))
+    breaker_probe_interval: float = float(os.getenv("BREAKER_PROBE_INTERVAL", "1800"))
+    profile_cache_ttl: float = float(os.getenv("PROFILE_CACHE_TTL", "86400"))
+    profile_cache_negative_ttl: float = float(os.getenv("PROFILE_CACHE_NEGATIVE_TTL", "3600"))
+    crawl_incremental_max_pages: int = int(os.getenv("CRAWL_INCREMENTAL_MAX_PAGES", "10"))
+    crawl_catchup_idle_hours: float = float(os.getenv("CRAWL_CATCHUP_IDLE_HOURS", "24"))
+    crawl_catchup_max_pages: int = int(os.getenv("CRAWL_CATCHUP_MAX_PAGES", "50"))
+    log_sink_batch_size: int = int(os.getenv("LOG_SINK_BATCH_SIZE", "100"))
+    log_sink_flush_interval: float = float(os.getenv("LOG_SINK_FLUSH_INTERVAL", "1.0"))
+    log_sink_max_queue: int = int(os.getenv("LOG_SINK_MAX_QUEUE", "10000"))
+    log_sink_policy: str = os.getenv("LOG_SINK_POLICY", "drop")  # drop / block
+    predictor_min_samples: int = int(os.getenv("PREDICTOR_MIN_SAMPLES", "20"))
+    predictor_coverage: float = float(os.getenv("PREDICTOR_COVERAGE", "0.8"))
+    predictor_max_polls: int = int(os.getenv("PREDICTOR_MAX_POLLS", "4"))
+    predictor_lag_minutes: int = int(os.getenv("PREDICTOR_LAG_MINUTES", "15"))
+    predictor_history_days: int = int(os.getenv("PREDICTOR_HISTORY_DAYS", "90"))
+    adaptive_min_minutes: float = float(os.getenv("ADAPTIVE_MIN_MINUTES", "30"))
+    adaptive_max_minutes: float = float(os.getenv("ADAPTIVE_MAX_MINUTES", "1440"))
+    adaptive_initial_minutes: float = float(os.getenv("ADAPTIVE_INITIAL_MINUTES", "120"))
+    adaptive_backoff_factor: float = float(os.getenv("ADAPTIVE_BACKOFF_FACTOR", "2.0"))
+    adaptive_shrink_factor: float = float(os.getenv("ADAPTIVE_SHRINK_FACTOR", "0.5"))
+    adaptive_empty_threshold: int = int(os.getenv("ADAPTIVE_EMPTY_THRESHOLD", "2"))
+    account_daily_quota: int = int(os.getenv("ACCOUNT_DAILY_QUOTA", "500"))
+    budget_requests_per_poll: float = float(os.getenv("BUDGET_REQUESTS_PER_POLL", "1.5"))
+    budget_headroom: float = float(os.getenv("BUDGET_HEADROOM", "0.9"))
+    budget_max_polls_per_target: int = int(os.getenv("BUDGET_MAX_POLLS_PER_TARGET", "24"))
+    usage_flush_interval: float = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+    scheduler_mode: str = os.getenv("SCHEDULER_MODE", "auto")  # auto / off
+    leader_lease_seconds: float = float(os.getenv("LEADER_LEASE_SECONDS", "15"))
+    leader_heartbeat_seconds: float = float(os.getenv("LEADER_HEARTBEAT_SECONDS", "5"))
+    scheduler_command_interval: float = float(os.getenv("SCHEDULER_COMMAND_INTERVAL", "2"))
+    slot_spread_seconds: float = float(os.getenv("SLOT_SPREAD_SECONDS", "600"))
+    crawl_queue_max_depth: int = int(os.getenv("CRAWL_QUEUE_MAX_DEPTH", "1000"))
+    article_count_cap: int = int(os.getenv("ARTICLE_COUNT_CAP", "10000"))
+    article_refs_interval: float = float(os.getenv("ARTICLE_REFS_INTERVAL", "30"))
+    article_refs_settle_minutes: float = float(os.getenv("ARTICLE_REFS_SETTLE_MINUTES", "30"))
+    crawl_queue_backend: str = os.getenv("CRAWL_QUEUE_BACKEND", "memory")  # memory / mongo
+    crawl_job_lease_seconds: float = float(os.getenv("CRAWL_JOB_LEASE_SECONDS", "300"))
+    crawl_job_max_attempts: int = int(os.getenv("CRAWL_JOB_MAX_ATTEMPTS", "3"))
+    crawl_job_retry_base: float = float(os.getenv("CRAWL_JOB_RETRY_BASE", "60"))
+    crawl_engine: str = os.getenv("CRAWL_ENGINE", "thread")  # thread / async
+    async_max_concurrency: int = int(os.getenv("ASYNC_MAX_CONCURRENCY", "200"))
+    async_per_account_concurrency: int = int(os.getenv("ASYNC_PER_ACCOUNT_CONCURRENCY", "2"))
 
 
 def get_settings() -> Settings:
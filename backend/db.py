@@ -16,7 +16,7 @@ def init_db(app):
     client = MongoClient(settings.mongo_uri)
     app.mongo = client[settings.mongo_db]
 
-    from pymongo import DESCENDING, TEXT
+    from pymongo import DESCENDING
 
     # Indexes for data integrity
     app.mongo["articles"].create_index([("url", ASCENDING)], unique=True)
@@ -32,11 +32,23 @@ def init_db(app):
     app.mongo["articles"].create_index([("publish_at", DESCENDING), ("target_id", ASCENDING)])
     # 5. 复合索引：publish_at + mp_name（优化公众号+排序查询）
     app.mongo["articles"].create_index([("publish_at", DESCENDING), ("mp_name", ASCENDING)])
-    # 6. 文本索引：title（用于标题搜索，但正则查询仍可能较慢）
+    # 6. 复合索引：mp_name + publish_at + _id（按公众号批量统计最近发布数；游标分页按 (publish_at, _id) 定位和排序）
+    app.mongo["articles"].create_index([("mp_name", ASCENDING), ("publish_at", DESCENDING), ("_id", DESCENDING)])
+    # 早期版本的 mp_name + publish_at 索引是上面索引的前缀，删除以减少写入开销
     try:
-        app.mongo["articles"].create_index([("title", TEXT)])
+        app.mongo["articles"].drop_index("mp_name_1_publish_at_-1")
     except Exception:
-        # 如果已存在文本索引或创建失败，忽略
+        # 索引不存在
+        pass
+    # 7. 复合索引：publish_at + _id（游标分页按 (publish_at, _id) 定位和排序）
+    app.mongo["articles"].create_index([("publish_at", DESCENDING), ("_id", DESCENDING)])
+    # 8. 检索索引：search_grams 多键索引即标题/摘要的 n-gram 倒排索引（见 crawler/search_index.py）
+    app.mongo["articles"].create_index([("search_grams", ASCENDING)])
+    # 早期版本的 title 文本索引无法切分中文且从未被查询，删除以减少写入开销
+    try:
+        app.mongo["articles"].drop_index("title_text")
+    except Exception:
+        # 索引不存在
         pass
 
     # Targets 索引
@@ -51,6 +63,16 @@ def init_db(app):
     app.mongo["crawl_logs"].create_index([("created_at", DESCENDING)])
     app.mongo["crawl_logs"].create_index([("target_id", ASCENDING)])
     app.mongo["crawl_logs"].create_index([("status", ASCENDING), ("created_at", DESCENDING)])  # 用于状态筛选+排序
+    app.mongo["account_usage"].create_index([("date", ASCENDING)])  # 每日请求用量按日期查询
+    # 文章计数器：按维度、键和日期范围求和
+    app.mongo["article_counters"].create_index([("dim", ASCENDING), ("key", ASCENDING), ("day", ASCENDING)])
+    # 公众号汇总：头像变化时按目标更新
+    app.mongo["mp_stats"].create_index([("target_id", ASCENDING)])
+    # 持久化爬取队列：按优先级认领到期任务、回收租约过期的任务
+    app.mongo["crawl_jobs"].create_index([("status", ASCENDING), ("priority", ASCENDING), ("available_at", ASCENDING)])
+    app.mongo["crawl_jobs"].create_index([("status", ASCENDING), ("lease_until", ASCENDING)])
+    # 没有主节点时积压的调度命令一天后自动删除
+    app.mongo["scheduler_commands"].create_index([("created_at", ASCENDING)], expireAfterSeconds=86400)
 
     logging.info("MongoDB connected: %s/%s", settings.mongo_uri, settings.mongo_db)
     logging.info("MongoDB indexes created for performance optimization")
@@ -0,0 +1,154 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+# 调度器租约：scheduler_lease 集合中的一个文档
+# {_id: "scheduler", holder: 进程标识, expires_at, heartbeat_at, status: 主节点发布的状态}
+LEASE_COLLECTION = "scheduler_lease"
+LEASE_ID = "scheduler"
+
+
+def make_holder_id() -> str:
+    """进程标识：主机名 + pid + 随机后缀（同一主机上重启的进程也不会被当成原主节点）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaderLease:
+    """
+    基于 Mongo 租约文档的主节点选举
+
+    每个进程每 heartbeat 秒尝试续约/抢占一次：租约由自己持有或已过期时写入自己的标识和新的过期时间。
+    只有持有租约的进程执行定时调度和爬取，其余进程只提供 API；主节点退出时主动释放租约，
+    其他进程在下一次心跳时接管，主节点崩溃时最多 ttl 秒后接管。
+    过期判断使用各节点本地时钟（UTC），节点间时钟偏差需远小于 ttl。
+    启动/停止调度（on_elected / on_revoked）在单独的线程中执行，耗时的全量对账不会耽误续约。
+    """
+
+    def __init__(self, collection, on_elected: Callable[[], None], on_revoked: Callable[[], None],
+                 ttl: float = 15.0, heartbeat: float = 5.0, status: Optional[Callable[[], Dict]] = None):
+        self.collection = collection
+        self.holder = make_holder_id()
+        self.ttl = float(ttl)
+        self.heartbeat = min(float(heartbeat), self.ttl / 2)
+        self._on_elected = on_elected
+        self._on_revoked = on_revoked
+        self._status = status
+        self._is_leader = False
+        self._deadline = 0.0  # 本地单调时钟上的租约到期时间
+        self._scheduling = False  # on_elected 已执行完、on_revoked 尚未执行
+        self._wanted = False      # 心跳线程希望的调度状态，由切换线程执行
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def is_leader(self) -> bool:
+        """是否持有未到期的租约"""
+        return self._is_leader and time.monotonic() < self._deadline
+
+    def start(self):
+        for target, name in ((self._run, "scheduler-leader"), (self._apply, "scheduler-switch")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """停止心跳；是主节点时先停止调度再释放租约，其他进程在下一次心跳时接管"""
+        self._stop.set()
+        heartbeat_thread, switch_thread = self._threads or (None, None)
+        if heartbeat_thread:
+            heartbeat_thread.join()
+        was_leader = self._is_leader
+        self._is_leader = False
+        self._want(False)
+        if switch_thread:
+            switch_thread.join()
+        if was_leader:
+            try:
+                self.collection.update_one({"_id": LEASE_ID, "holder": self.holder},
+                                           {"$set": {"expires_at": datetime.utcnow()}})
+            except PyMongoError:
+                logging.exception("Failed to release scheduler lease")
+
+    def current(self) -> Optional[Dict]:
+        """当前租约文档（用于在非主节点上查看主节点和它发布的状态）"""
+        return self.collection.find_one({"_id": LEASE_ID})
+
+    def _run(self):
+        self._tick()
+        while not self._stop.wait(self.heartbeat):
+            self._tick()
+
+    def _apply(self):
+        """切换线程：按心跳线程的结果启动或停止调度（停止时等 on_revoked 执行完才退出）"""
+        while True:
+            with self._cond:
+                while self._wanted == self._scheduling and not self._stop.is_set():
+                    self._cond.wait()
+                if self._wanted == self._scheduling:
+                    return
+                wanted = self._wanted
+            callback = self._on_elected if wanted else self._on_revoked
+            try:
+                callback()
+            except Exception:
+                logging.exception("Failed to %s scheduling", "start" if wanted else "stop")
+            with self._cond:
+                self._scheduling = wanted
+
+    def _want(self, scheduling: bool):
+        with self._cond:
+            if scheduling and self._stop.is_set():
+                return
+            self._wanted = scheduling
+            self._cond.notify_all()
+
+    def _tick(self):
+        started = time.monotonic()
+        now = datetime.utcnow()
+        update = {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl), "heartbeat_at": now}
+        if self._is_leader and self._status is not None:
+            try:
+                update["status"] = self._status()
+            except Exception:
+                logging.exception("Failed to collect scheduler status")
+        try:
+            doc = self.collection.find_one_and_update(
+                {"_id": LEASE_ID, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+                {"$set": update},
+                upsert=True,
+            )
+            acquired = True
+            previous = doc.get("holder") if doc else None
+        except DuplicateKeyError:
+            # 租约由其他进程持有且未过期（upsert 插入同 _id 文档失败）
+            acquired = False
+            previous = None
+        except PyMongoError as exc:
+            # 无法访问数据库：租约在本地到期前仍视为主节点，到期后停止调度
+            logging.warning("Scheduler lease heartbeat failed: %s", exc)
+            if self._is_leader and time.monotonic() >= self._deadline:
+                self._step_down("lease expired")
+            return
+
+        if acquired:
+            self._deadline = started + self.ttl
+            if not self._is_leader:
+                self._is_leader = True
+                logging.info("Acquired scheduler lease as %s (previous holder: %s)", self.holder, previous)
+                self._want(True)
+        elif self._is_leader:
+            self._step_down("lease taken over")
+
+    def _step_down(self, reason: str):
+        self._is_leader = False
+        self._deadline = 0.0
+        logging.warning("Stepping down as scheduler leader (%s)", reason)
+        self._want(False)
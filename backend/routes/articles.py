@@ -1,15 +1,37 @@
+import base64
+import json
 from datetime import datetime
 
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
+from bson.errors import InvalidId
 
+from backend.config import get_settings
 from backend.db import get_db
 from backend.security import jwt_required
+from crawler import article_counters, article_refs, mp_stats, search_index
 
 bp = Blueprint("articles", __name__, url_prefix="/api/articles")
 
+# 列表接口的投影：只获取需要的字段，减少数据传输
+ARTICLE_PROJECTION = {
+    "_id": 1,
+    "mp_name": 1,
+    "mp_id": 1,
+    "title": 1,
+    "url": 1,
+    "publish_at": 1,
+    "cover": 1,
+    "digest": 1,
+    "target_id": 1,
+    "category": 1,
+    "mp_avatar": 1,
+    "created_at": 1,
+}
+
 
 def _serialize(doc, category=None, mp_avatar=None):
+    """category / mp_avatar 默认取文章上冗余的值（见 crawler/article_refs.py）"""
     return {
         "id": str(doc["_id"]),
         "mp_name": doc.get("mp_name"),
@@ -20,15 +42,54 @@ def _serialize(doc, category=None, mp_avatar=None):
         "cover": doc.get("cover"),
         "digest": doc.get("digest"),
         "target_id": str(doc["target_id"]) if doc.get("target_id") else None,
-        "category": category,
+        "category": category or doc.get("category"),
         "mp_avatar": mp_avatar or doc.get("mp_avatar"),
         "created_at": doc.get("created_at"),
     }
 
 
+def encode_cursor(doc) -> str:
+    """游标：最后一篇文章的 (publish_at, _id)，编码为不透明的 URL 安全字符串"""
+    publish_at = doc.get("publish_at")
+    raw = json.dumps({"p": publish_at.isoformat() if isinstance(publish_at, datetime) else None,
+                      "i": str(doc["_id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """解析游标，返回 (publish_at, _id)；格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        publish_at = datetime.fromisoformat(data["p"]) if data.get("p") else None
+        return publish_at, ObjectId(data["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def _seek_after(publish_at, last_id) -> dict:
+    """按 (publish_at 降序, _id 降序) 排在游标之后的文章（publish_at 为空的文章排在最后）"""
+    if publish_at is None:
+        return {"publish_at": None, "_id": {"$lt": last_id}}
+    return {"$or": [
+        {"publish_at": {"$lt": publish_at}},
+        {"publish_at": None},
+        {"publish_at": publish_at, "_id": {"$lt": last_id}},
+    ]}
+
+
 @bp.route("", methods=["GET"])
 @jwt_required
 def list_articles():
+    """
+    文章列表，两种分页方式：
+
+    - 页码分页（默认）：page / page_size，返回 total，用于界面跳页
+    - 游标分页：传 after（首页传空字符串或 cursor=1），返回 next 游标（没有更多时为 null），不返回 total；
+      按 (publish_at, _id) 定位，任意深度的翻页开销相同，翻页过程中新入库的文章也不会让页面错位
+
+    q 在标题和摘要中检索（search_index 倒排索引）：页码分页按相关度排序，游标分页仍按发布时间排序。
+    """
     args = request.args
     mp_name = args.get("mp_name")
     q = args.get("q")
@@ -37,11 +98,16 @@ def list_articles():
     end = args.get("end")
     page = int(args.get("page", 1))
     page_size = int(args.get("page_size", 20))
+    cursor_mode = "after" in args or args.get("cursor") in ("1", "true")
+    after = None
+    if args.get("after"):
+        try:
+            after = decode_cursor(args["after"])
+        except ValueError:
+            return jsonify({"message": "after 参数无效"}), 400
     query = {}
     if mp_name:
         query["mp_name"] = mp_name
-    if q:
-        query["title"] = {"$regex": q, "$options": "i"}
     if start:
         query.setdefault("publish_at", {})["$gte"] = parse_dt(start)
     if end:
@@ -60,40 +126,79 @@ def list_articles():
             query["target_id"] = {"$in": target_ids}
         else:
             # 如果没有找到匹配的目标，返回空结果
-            return jsonify({"total": 0, "items": []})
-
-    # 优化：如果查询条件简单，使用 estimated_document_count（更快但不精确）
-    # 对于复杂查询，使用 count_documents
-    use_estimated = not q and not category  # 没有正则查询和分类查询时使用估算
-    if use_estimated:
-        try:
-            total = get_db()["articles"].estimated_document_count()
-        except Exception:
-            total = get_db()["articles"].count_documents(query)
-    else:
-        total = get_db()["articles"].count_documents(query)
+            if cursor_mode:
+                return jsonify({"items": [], "next": None})
+            return jsonify({"total": 0, "total_capped": False, "items": []})
 
+    search = None
+    if q:
+        search = search_index.build_search(q)
+        if search is None:
+            # 查询中没有可以走索引的词（如只有一个汉字），回退为正则匹配
+            query["$or"] = [{"title": {"$regex": q, "$options": "i"}}, {"digest": {"$regex": q, "$options": "i"}}]
+
+    if cursor_mode:
+        if search is not None:
+            query = {"$and": [query, search[0]]} if query else search[0]
+        if after is not None:
+            query = {"$and": [query, _seek_after(*after)]} if query else _seek_after(*after)
+        # 多取一条判断是否还有下一页
+        docs = list(get_db()["articles"].find(query, ARTICLE_PROJECTION)
+                    .sort([("publish_at", -1), ("_id", -1)]).limit(page_size + 1))
+        paged_docs = docs[:page_size]
+        next_cursor = encode_cursor(paged_docs[-1]) if len(docs) > page_size else None
+        return jsonify({"items": _serialize_page(paged_docs), "next": next_cursor})
+
+    start_at = parse_dt(start) if start else None
+    end_at = parse_dt(end) if end else None
     # 后端分页：使用 MongoDB 的 skip 和 limit
-    # 优化：使用投影减少数据传输（只获取需要的字段）
-    projection = {
-        "_id": 1,
-        "mp_name": 1,
-        "mp_id": 1,
-        "title": 1,
-        "url": 1,
-        "publish_at": 1,
-        "cover": 1,
-        "digest": 1,
-        "target_id": 1,
-        "created_at": 1,
-    }
     skip = (page - 1) * page_size
-    cursor = get_db()["articles"].find(query, projection).sort("publish_at", -1).skip(skip).limit(page_size)
+    if search is not None:
+        paged_docs, search_query = search_index.search_articles(search, query, ARTICLE_PROJECTION, skip, page_size)
+        total, total_capped = _count_total(search_query, use_counters=False, cap=search_index.MAX_CANDIDATES)
+        return jsonify({"total": total, "total_capped": total_capped, "items": _serialize_page(paged_docs)})
+
+    # 标题搜索、无法解析的日期由计数器回答不了
+    countable = not q and (not start or start_at) and (not end or end_at)
+    total, total_capped = _count_total(query, mp_name=mp_name, target_ids=query.get("target_id", {}).get("$in"),
+                                       start=start_at, end=end_at, use_counters=bool(countable))
+    cursor = get_db()["articles"].find(query, ARTICLE_PROJECTION).sort("publish_at", -1).skip(skip).limit(page_size)
     paged_docs = list(cursor)
-
-    # 获取当前页文章的target_id和mp_name（只查询当前页的数据）
-    target_ids = list(set([ObjectId(doc.get("target_id")) for doc in paged_docs if doc.get("target_id")]))
-    mp_names = list(set([doc.get("mp_name") for doc in paged_docs if doc.get("mp_name")]))
+    return jsonify({"total": total, "total_capped": total_capped, "items": _serialize_page(paged_docs)})
+
+
+def _count_total(query, mp_name=None, target_ids=None, start=None, end=None, use_counters=True, cap=None):
+    """
+    文章总数：公众号 / 分类 / 日期范围的组合由文章计数器回答（article_counters），
+    标题搜索等计数器无法回答的条件最多数到 article_count_cap 篇（指定 cap 时取两者中较小的）
+
+    Returns:
+        (总数, 是否被截断)
+    """
+    if use_counters:
+        total = article_counters.count_articles(mp_name=mp_name, target_ids=target_ids, start=start, end=end)
+        if total is not None:
+            return total, False
+    setting_cap = get_settings().article_count_cap
+    if cap is None or (0 < setting_cap < cap):
+        cap = setting_cap
+    total = get_db()["articles"].count_documents(query, limit=cap) if cap > 0 else \
+        get_db()["articles"].count_documents(query)
+    return total, cap > 0 and total >= cap
+
+
+def _serialize_page(paged_docs):
+    """
+    序列化一页文章：分类和头像引用直接取文章上的冗余字段，
+    只有还没有冗余字段的文章（升级前入库、尚未同步）批量查询 targets 补充
+    """
+    unsynced = [doc for doc in paged_docs if "category" not in doc]
+    if not unsynced:
+        return [_serialize(doc) for doc in paged_docs]
+
+    # 获取未同步文章的target_id和mp_name（只查询当前页的数据）
+    target_ids = list(set([ObjectId(doc.get("target_id")) for doc in unsynced if doc.get("target_id")]))
+    mp_names = list(set([doc.get("mp_name") for doc in unsynced if doc.get("mp_name")]))
 
     # 批量查询targets获取分类和头像（优化：合并查询，减少数据库访问次数）
     targets_map = {}
@@ -117,23 +222,26 @@ def list_articles():
             {"_id": 1, "category": 1, "mp_avatar": 1, "name": 1}
         ))
 
-        # 构建两个映射
+        # 构建两个映射（头像返回引用地址，不返回 base64）
         for t in targets:
             target_id_str = str(t["_id"])
             targets_map[target_id_str] = {
                 "category": t.get("category"),
-                "mp_avatar": t.get("mp_avatar")
+                "mp_avatar": article_refs.avatar_ref(t)
             }
             # 同时构建mp_name映射
             if t.get("name"):
                 mp_name_to_avatar[t["name"]] = {
-                    "mp_avatar": t.get("mp_avatar"),
+                    "mp_avatar": article_refs.avatar_ref(t),
                     "category": t.get("category")
                 }
 
     # 序列化数据
     data = []
     for doc in paged_docs:
+        if "category" in doc:
+            data.append(_serialize(doc))
+            continue
         target_id_str = str(doc.get("target_id")) if doc.get("target_id") else None
         target_info = targets_map.get(target_id_str, {}) if target_id_str else {}
 
@@ -147,7 +255,7 @@ def list_articles():
 
         data.append(_serialize(doc, category=target_info.get("category"), mp_avatar=target_info.get("mp_avatar")))
 
-    return jsonify({"total": total, "items": data})
+    return data
 
 
 @bp.route("/mp-names", methods=["GET"])
@@ -164,6 +272,20 @@ def list_mp_names():
 @jwt_required
 def mp_summary():
     """获取所有公众号的汇总统计（文章数、最新发布时间、头像等）"""
+    # 读取增量维护的公众号汇总（mp_stats），尚未重建完成时直接聚合 articles
+    stats = mp_stats.load_summary()
+    if stats is not None:
+        return jsonify([{
+            "mp_name": s.get("mp_name") or "未知",
+            "count": s.get("count", 0),
+            "latest_publish_at": s.get("latest_publish_at"),
+            "mp_avatar": s.get("mp_avatar"),
+        } for s in stats])
+    return jsonify(_mp_summary_from_articles())
+
+
+def _mp_summary_from_articles():
+    """对整个 articles 集合分组统计（文章数越多越慢）"""
     from pymongo import DESCENDING
 
     # 使用聚合管道统计每个公众号的文章数和最新发布时间
@@ -174,6 +296,7 @@ def mp_summary():
                 "count": {"$sum": 1},
                 "latest_publish_at": {"$max": "$publish_at"},
                 "target_id": {"$first": "$target_id"},  # 用于获取头像和分类
+                "mp_avatar": {"$max": "$mp_avatar"},  # 文章上冗余的头像引用
             }
         },
         {
@@ -183,9 +306,10 @@ def mp_summary():
 
     results = list(get_db()["articles"].aggregate(pipeline))
 
-    # 获取所有 target_id 和 mp_name，用于查询头像和分类
-    target_ids = [ObjectId(r["target_id"]) for r in results if r.get("target_id")]
-    mp_names = [r["_id"] for r in results if r.get("_id")]
+    # 文章上没有头像引用的公众号（升级前入库、尚未同步）才查询 targets
+    missing = [r for r in results if not r.get("mp_avatar")]
+    target_ids = [ObjectId(r["target_id"]) for r in missing if r.get("target_id")]
+    mp_names = [r["_id"] for r in missing if r.get("_id")]
 
     # 批量查询 targets 获取头像和分类
     targets_map = {}
@@ -196,7 +320,7 @@ def mp_summary():
         ))
         for t in targets:
             targets_map[str(t["_id"])] = {
-                "mp_avatar": t.get("mp_avatar"),
+                "mp_avatar": article_refs.avatar_ref(t),
                 "category": t.get("category")
             }
 
@@ -209,7 +333,7 @@ def mp_summary():
         ))
         for t in targets_by_name:
             mp_name_to_avatar[t.get("name")] = {
-                "mp_avatar": t.get("mp_avatar"),
+                "mp_avatar": article_refs.avatar_ref(t),
                 "category": t.get("category")
             }
 
@@ -219,9 +343,9 @@ def mp_summary():
         mp_name = r.get("_id") or "未知"
         target_id_str = str(r.get("target_id")) if r.get("target_id") else None
 
-        # 优先使用 target_id 查找头像，其次使用 mp_name
-        mp_avatar = None
-        if target_id_str and target_id_str in targets_map:
+        # 优先使用文章上的头像引用，其次 target_id，最后 mp_name
+        mp_avatar = r.get("mp_avatar")
+        if not mp_avatar and target_id_str and target_id_str in targets_map:
             mp_avatar = targets_map[target_id_str].get("mp_avatar")
         if not mp_avatar and mp_name in mp_name_to_avatar:
             mp_avatar = mp_name_to_avatar[mp_name].get("mp_avatar")
@@ -233,7 +357,7 @@ def mp_summary():
             "mp_avatar": mp_avatar,
         })
 
-    return jsonify(summary)
+    return summary
 
 
 def parse_dt(value):
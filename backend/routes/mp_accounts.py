@@ -2,7 +2,12 @@ from flask import Blueprint, request, jsonify
 from bson import ObjectId
 
 from backend.db import get_db
+from backend.scheduler import plan_request_budget
 from backend.security import jwt_required
+from crawler import circuit_breaker
+from crawler.account_pool import get_account_pool
+from crawler.request_budget import get_usage_tracker
+from utils.http_client import close_session
 import time
 
 bp = Blueprint("mp_accounts", __name__, url_prefix="/api/mp-accounts")
@@ -16,6 +21,9 @@ def _serialize(doc):
         "cookie": doc.get("cookie"),
         "remark": doc.get("remark"),
         "updated_at": doc.get("updated_at"),
+        "breaker_state": doc.get("breaker_state") or circuit_breaker.STATE_CLOSED,
+        "breaker_failures": doc.get("breaker_failures", 0),
+        "daily_quota": doc.get("daily_quota"),
     }
 
 
@@ -52,17 +60,54 @@ def create_account():
     return jsonify(_serialize(payload)), 201
 
 
+@bp.route("/pool", methods=["GET"])
+@jwt_required
+def pool_stats():
+    """账号池统计：进行中的爬取数、累计请求数、错误率、剩余冷却时间"""
+    stats = get_account_pool().snapshot()
+    names = {str(x["_id"]): x.get("name") for x in get_db()["mp_accounts"].find({}, {"name": 1})}
+    data = [dict(id=key, name=names.get(key), **value) for key, value in stats.items() if key in names]
+    return jsonify(data)
+
+
+@bp.route("/budget", methods=["GET"])
+@jwt_required
+def budget():
+    """每日请求预算：各账号的配额、今日实际用量和按当前规划的预计用量，以及各目标分配的轮询次数"""
+    return jsonify(plan_request_budget(apply=False))
+
+
+@bp.route("/budget/plan", methods=["POST"])
+@jwt_required
+def replan_budget():
+    """立即重新规划请求预算并按结果重排任务（默认每天 00:05 自动规划）"""
+    get_usage_tracker().flush()
+    return jsonify(plan_request_budget(apply=True))
+
+
 @bp.route("/<id>", methods=["PUT"])
 @jwt_required
 def update_account(id):
     body = request.get_json(force=True, silent=True) or {}
-    updates = {k: v for k, v in body.items() if k in {"name", "token", "cookie", "remark", "updated_at"}}
+    updates = {k: v for k, v in body.items() if k in {"name", "token", "cookie", "remark", "updated_at", "daily_quota"}}
     if not updates:
         return jsonify({"message": "无更新字段"}), 400
-    get_db()["mp_accounts"].update_one({"_id": ObjectId(id)}, {"$set": updates})
+    if "daily_quota" in updates and updates["daily_quota"] is not None:
+        try:
+            updates["daily_quota"] = int(updates["daily_quota"])
+        except (TypeError, ValueError):
+            return jsonify({"message": "daily_quota 必须是整数"}), 400
+    change = {"$set": updates}
+    if "token" in updates or "cookie" in updates:
+        # 更新凭证即关闭熔断
+        change["$unset"] = circuit_breaker.reset_update()
+    get_db()["mp_accounts"].update_one({"_id": ObjectId(id)}, change)
     doc = get_db()["mp_accounts"].find_one({"_id": ObjectId(id)})
     if not doc:
         return jsonify({"message": "未找到记录"}), 404
+    # 凭证变更后丢弃旧连接（其中可能带有旧会话的 cookie）和旧的错误统计
+    close_session(id)
+    get_account_pool().reset(id)
     return jsonify(_serialize(doc))
 
 
@@ -70,4 +115,5 @@ def update_account(id):
 @jwt_required
 def delete_account(id):
     get_db()["mp_accounts"].delete_one({"_id": ObjectId(id)})
+    close_session(id)
     return jsonify({"deleted": True})
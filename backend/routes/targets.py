@@ -1,39 +1,32 @@
-from flask import Blueprint, request, jsonify
+import base64
+import binascii
+
+from flask import Blueprint, Response, request, jsonify
 from bson import ObjectId
-from datetime import datetime, timedelta
+from bson.errors import InvalidId
 
 from backend.db import get_db
 from backend.security import jwt_required
-from backend.scheduler import trigger_target, refresh_jobs
+from backend.scheduler import (trigger_target, sync_target_jobs, remove_target_jobs, analyze_publish_frequencies,
+                               scheduler_status)
+from crawler import adaptive_interval, article_refs
+from crawler.crawl_queue import PRIORITY_MANUAL, REJECTED, CLOSED
 
 bp = Blueprint("targets", __name__, url_prefix="/api/targets")
 
 
-def _calc_auto_frequency(mp_name: str) -> str:
-    """计算公众号的发布频率等级"""
-    if not mp_name:
-        return "medium"
-    
-    db = get_db()
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    article_count = db["articles"].count_documents({
-        "mp_name": mp_name,
-        "publish_at": {"$gte": thirty_days_ago}
-    })
-    
-    if article_count >= 15:
-        return "high"
-    elif article_count >= 4:
-        return "medium"
-    else:
-        return "low"
+def _missing_frequencies(docs) -> dict:
+    """智能调度模式但没有 auto_frequency 的目标，一次聚合实时计算"""
+    return analyze_publish_frequencies(
+        doc.get("name") for doc in docs if doc.get("schedule_mode") == "smart" and not doc.get("auto_frequency"))
 
 
-def _serialize(doc):
-    # 如果是智能调度模式但没有 auto_frequency，实时计算
+def _serialize(doc, frequencies=None):
     auto_frequency = doc.get("auto_frequency")
     if doc.get("schedule_mode") == "smart" and not auto_frequency:
-        auto_frequency = _calc_auto_frequency(doc.get("name"))
+        if frequencies is None:
+            frequencies = _missing_frequencies([doc])
+        auto_frequency = frequencies.get(doc.get("name"), "medium")
     
     return {
         "id": str(doc["_id"]),
@@ -59,6 +52,9 @@ def _serialize(doc):
         "mp_user_name": doc.get("mp_user_name"),
         "last_error": doc.get("last_error"),
         "auto_frequency": auto_frequency,
+        "adaptive_interval": doc.get("adaptive_interval"),
+        "adaptive_empty_streak": doc.get("adaptive_empty_streak"),
+        "adaptive_yield": doc.get("adaptive_yield"),
     }
 
 
@@ -79,7 +75,9 @@ def list_targets():
     # 后端分页：使用 MongoDB 的 skip 和 limit
     skip = (page - 1) * page_size
     cursor = get_db()["targets"].find(query).sort("created_at", -1).skip(skip).limit(page_size)
-    data = [_serialize(x) for x in cursor]
+    docs = list(cursor)
+    frequencies = _missing_frequencies(docs)
+    data = [_serialize(x, frequencies) for x in docs]
 
     return jsonify({"total": total, "items": data})
 
@@ -122,7 +120,7 @@ def create_target():
     try:
         result = get_db()["targets"].insert_one(payload)
         payload["_id"] = result.inserted_id
-        refresh_jobs()
+        sync_target_jobs(str(result.inserted_id))
         return jsonify(_serialize(payload)), 201
     except Exception as exc:
         # 捕获唯一索引冲突
@@ -168,12 +166,22 @@ def update_target(id):
         if existing:
             return jsonify({"message": f"公众号名称 '{name}' 已存在"}), 400
 
+    current = get_db()["targets"].find_one({"_id": ObjectId(id)},
+                                           {"schedule_mode": 1, "freq_minutes": 1, "category": 1})
+    if not current:
+        return jsonify({"message": "未找到记录"}), 404
+    # 前端总是提交完整表单：只有分类真正变化时才需要同步到文章
+    update = {"$set": article_refs.mark_changed(updates, current)}
+    if any(key in updates and updates[key] != current.get(key) for key in ("schedule_mode", "freq_minutes")):
+        # 自适应间隔优先于 freq_minutes，不清除的话修改初始间隔或切换模式后仍沿用旧状态
+        update["$unset"] = {field: "" for field in adaptive_interval.STATE_FIELDS}
+
     try:
-        get_db()["targets"].update_one({"_id": ObjectId(id)}, {"$set": updates})
+        get_db()["targets"].update_one({"_id": ObjectId(id)}, update)
         doc = get_db()["targets"].find_one({"_id": ObjectId(id)})
         if not doc:
             return jsonify({"message": "未找到记录"}), 404
-        refresh_jobs()
+        sync_target_jobs(id)
         return jsonify(_serialize(doc))
     except Exception as exc:
         # 捕获唯一索引冲突
@@ -187,7 +195,7 @@ def update_target(id):
 @jwt_required
 def delete_target(id):
     get_db()["targets"].delete_one({"_id": ObjectId(id)})
-    refresh_jobs()
+    remove_target_jobs(id)
     return jsonify({"deleted": True})
 
 
@@ -200,11 +208,52 @@ def get_target(id):
     return jsonify(_serialize(doc))
 
 
+@bp.route("/<id>/avatar", methods=["GET"])
+def get_avatar(id):
+    """
+    公众号头像图片（文章上的 mp_avatar 引用指向这里）
+
+    供 <img> 直接加载，无法携带 Authorization 头，因此不使用 jwt_required，改为校验地址中的签名：
+    地址只由已登录的文章接口下发（见 crawler.article_refs），无签名或签名不符时拒绝，不能按目标 id 枚举头像。
+    地址带头像摘要作为版本号，头像变化后地址随之变化，可以长期缓存。
+    """
+    if not article_refs.verify_avatar_ref(id, request.args.get("v"), request.args.get("s")):
+        return jsonify({"message": "Forbidden"}), 403
+    try:
+        doc = get_db()["targets"].find_one({"_id": ObjectId(id)}, {"mp_avatar": 1})
+    except InvalidId:
+        doc = None
+    avatar = (doc or {}).get("mp_avatar") or ""
+    header, _, data = avatar.partition(",")
+    if not header.startswith("data:image/") or not header.endswith(";base64"):
+        return jsonify({"message": "未找到头像"}), 404
+    try:
+        image = base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        return jsonify({"message": "头像格式无效"}), 404
+    response = Response(image, mimetype=header[len("data:"):-len(";base64")])
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
 @bp.route("/<id>/run", methods=["POST"])
 @jwt_required
 def run_target(id):
-    trigger_target(id)
-    return jsonify({"triggered": True})
+    status = trigger_target(id, priority=PRIORITY_MANUAL)
+    if status in (REJECTED, CLOSED):
+        return jsonify({"message": "爬取队列已满，请稍后再试", "status": status}), 503
+    return jsonify({"triggered": True, "status": status})
+
+
+@bp.route("/queue", methods=["GET"])
+@jwt_required
+def queue_stats():
+    """
+    爬取队列状态：等待数、正在爬取的目标、合并/拒绝的触发次数、等待分散启动的目标数
+
+    请求落在非主节点时返回主节点最近一次心跳发布的状态（最多延迟一个心跳间隔）
+    """
+    return jsonify(scheduler_status())
 
 
 @bp.route("/categories", methods=["GET"])
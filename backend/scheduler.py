@@ -1,20 +1,44 @@
 import atexit
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import pytz
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
 from bson import ObjectId
 from flask import Flask
+from pymongo import ReturnDocument, UpdateOne
 
+from backend.config import get_settings
 from backend.db import get_db
-from crawler.tasks import run_crawl
+from backend.leader import LEASE_COLLECTION, LEASE_ID, LeaderLease, make_holder_id
+from crawler import article_counters, article_refs, circuit_breaker, mp_stats, search_index
+from crawler.log_sink import start_log_sink, stop_log_sink
+from crawler.account_limits import MongoCooldownRegistry, MongoTokenBucket
+from crawler.account_pool import get_account_pool
+from crawler.adaptive_interval import ADAPTIVE_MODE, current_interval
+from crawler.request_budget import allocate_polls, get_usage_tracker
+from crawler.publish_predictor import (build_histograms, predict_poll_times, DAY_NAMES, HIST_FIELD,
+                                       HIST_TOTAL_FIELD)
+from crawler.async_engine import aiohttp, start_async_engine, stop_async_engine
+from crawler import crawl_queue
+from crawler.mongo_queue import JOB_COLLECTION, MongoCrawlQueue
+from crawler.crawl_queue import (get_crawl_queue, start_feeder, stop_feeder, get_feeder, plan_staggered_starts,
+                                 PRIORITY_SCHEDULED, REJECTED)
+from crawler.tasks import run_crawl, _append_log
+from utils import http_client, rate_limiter, cooldown, profile_cache
+from utils.cooldown import FreqControlError
 
 # 智能调度配置
+# 启用账号池时时间槽内所有目标共用的账号 key
+POOL_ACCOUNT_KEY = "pool"
+
 SMART_SCHEDULE_CONFIG = {
     "high": ["09:00", "13:00", "18:00", "22:00"],   # 高频：日均≥1篇，每天4次
     "medium": ["10:00", "18:00"],                   # 中频：周均2-6篇，每天2次
@@ -23,131 +47,485 @@ SMART_SCHEDULE_CONFIG = {
 
 scheduler = BackgroundScheduler()
 _app: Optional[Flask] = None
-# 使用线程池异步执行爬取任务，避免阻塞主线程
-_executor = ThreadPoolExecutor(max_workers=5, thread_name_prefix="crawl")
+_lease: Optional[LeaderLease] = None
+_active = False  # 本进程作为主节点正在调度（_start_scheduling 已开始、_stop_scheduling 未执行）
+# 爬取线程数（线程池引擎），从去重的优先级爬取队列取目标执行，避免阻塞主线程
+CRAWL_WORKERS = 5
+_workers: List[threading.Thread] = []
+# 目标 id -> 该目标自己的定时任务 id（不含改期任务），用于单目标对账
+_job_ids: Dict[str, Set[str]] = {}
+# 时间槽：每个 daily 时间点 / cron 表达式只有一个任务，到点后分散触发槽内所有目标
+_slot_members: Dict[str, Dict[str, str]] = {}  # slot_id -> {target_id: 绑定账号 id}
+_target_slots: Dict[str, Set[str]] = {}        # target_id -> 所属 slot_id
+_jobs_lock = threading.Lock()
+DEFERRED_JOB_SUFFIX = "-deferred"
+SLOT_JOB_PREFIX = "slot-"
+# 系统任务（请求计数写库、每日请求预算规划），不属于任何目标
+SYSTEM_JOB_PREFIX = "sys-"
+USAGE_FLUSH_JOB_ID = "sys-usage-flush"
+BUDGET_PLAN_JOB_ID = "sys-budget-plan"
+COMMAND_JOB_ID = "sys-commands"
+COUNTERS_JOB_ID = "sys-article-counters"
+SEARCH_BACKFILL_JOB_ID = "sys-search-backfill"
+ARTICLE_REFS_JOB_ID = "sys-article-refs"
+MP_STATS_JOB_ID = "sys-mp-stats"
+# 非主节点提交给主节点的调度命令：{type: run/sync/remove/refresh/plan, target_id, priority, created_at}
+COMMAND_COLLECTION = "scheduler_commands"
+COMMAND_BATCH_SIZE = 500
+# 非主节点上 trigger_target 的返回值：已转交主节点
+FORWARDED = "forwarded"
+# 请求预算只分配给这些模式的目标，其余模式的轮询次数由用户配置决定，作为固定开销
+BUDGETED_MODES = ("smart", ADAPTIVE_MODE)
+# 批量计算发布频率时每次聚合的公众号数
+FREQUENCY_BATCH_SIZE = 1000
 
 
 def setup_scheduler(app: Flask):
+    """
+    初始化调度相关组件，并参与调度主节点选举（SCHEDULER_MODE=off 时只提供 API）
+
+    多个 gunicorn worker / 多个容器同时运行时，只有持有 Mongo 租约的进程执行定时任务和爬取，
+    其余进程对目标的调度变更和手动触发写入 scheduler_commands，由主节点执行。
+    """
+    global _lease
+    settings = get_settings()
+    _configure_components(app)
+    scheduler.configure(timezone="Asia/Shanghai")
+    if settings.scheduler_mode == "off":
+        logging.info("SCHEDULER_MODE=off, this process only serves API requests")
+        return
+    _lease = LeaderLease(
+        app.mongo[LEASE_COLLECTION],
+        on_elected=_start_scheduling,
+        on_revoked=_stop_scheduling,
+        ttl=settings.leader_lease_seconds,
+        heartbeat=settings.leader_heartbeat_seconds,
+        status=_leader_status,
+    )
+    _lease.start()
+    atexit.register(_lease.stop)
+
+
+def setup_worker(app: Flask):
+    """
+    初始化独立爬取进程（crawler.worker）：只消费 Mongo 爬取队列，不参与主节点选举、不执行定时任务
+
+    爬取收尾需要调整目标调度时（自适应间隔、智能调度）通过 scheduler_commands 转交主节点。
+    """
+    if get_settings().crawl_queue_backend != "mongo":
+        raise RuntimeError("crawler.worker requires CRAWL_QUEUE_BACKEND=mongo")
+    _configure_components(app)
+
+
+def _configure_components(app: Flask):
+    """API 进程和爬取进程共用的初始化：日志写入器、HTTP 连接池、限流、冷却、资料缓存、请求计数、爬取队列"""
     global _app
     _app = app
-    scheduler.configure(timezone="Asia/Shanghai")
+    settings = get_settings()
+    start_log_sink(
+        app.mongo["crawl_logs"],
+        batch_size=settings.log_sink_batch_size,
+        flush_interval=settings.log_sink_flush_interval,
+        max_queue=settings.log_sink_max_queue,
+        policy=settings.log_sink_policy,
+    )
+    http_client.configure(
+        pool_size=settings.http_pool_size,
+        retries=settings.http_retries,
+        backoff=settings.http_backoff,
+        timeout=settings.request_timeout,
+    )
+    rate_limiter.configure(rate=settings.rate_limit_per_minute / 60.0, burst=settings.rate_limit_burst)
+    cooldown.configure(base=settings.cooldown_base, maximum=settings.cooldown_max, jitter=settings.cooldown_jitter)
+    profile_cache.configure(ttl=settings.profile_cache_ttl, negative_ttl=settings.profile_cache_negative_ttl)
+    http_client.add_request_listener(get_usage_tracker().on_request)
+    if settings.crawl_queue_backend == "mongo":
+        # 多个爬取进程共用账号：令牌桶和频率限制冷却保存在 mp_accounts 上，各进程共享同一份账号状态
+        rate_limiter.set_bucket_factory(
+            lambda key, rate, burst: MongoTokenBucket(app.mongo["mp_accounts"], key, rate, burst))
+        cooldown.set_registry(MongoCooldownRegistry(app.mongo["mp_accounts"], base=settings.cooldown_base,
+                                                    maximum=settings.cooldown_max, jitter=settings.cooldown_jitter))
+        crawl_queue.set_crawl_queue(MongoCrawlQueue(
+            app.mongo[JOB_COLLECTION],
+            worker_id=make_holder_id(),
+            max_depth=settings.crawl_queue_max_depth,
+            lease_seconds=settings.crawl_job_lease_seconds,
+            max_attempts=settings.crawl_job_max_attempts,
+            retry_base=settings.crawl_job_retry_base,
+        ))
+    else:
+        crawl_queue.configure(max_depth=settings.crawl_queue_max_depth)
+    # 注册退出时的清理函数（后注册先执行：先停止调度并等爬取结束、释放租约，再写入剩余计数和日志）
+    atexit.register(stop_log_sink)
+    atexit.register(_flush_usage)
+
+
+def is_leader() -> bool:
+    """本进程是否为调度主节点（持有租约且已开始调度）"""
+    return _active and _lease is not None and _lease.is_leader
+
+
+def _start_scheduling():
+    """成为主节点：启动爬取线程、调度器和系统任务，全量加载目标任务"""
+    global _active
+    if _app is None:
+        raise RuntimeError("Scheduler not initialized with app")
+    settings = get_settings()
+    _active = True
+    get_crawl_queue().reopen()
+    start_feeder(trigger_target)
+    if settings.crawl_queue_backend == "mongo":
+        # 爬取由独立的 crawler.worker 进程执行，主节点只负责按时放入队列
+        logging.info("CRAWL_QUEUE_BACKEND=mongo, crawls are executed by crawler.worker processes")
+    else:
+        start_crawl_engine()
     if not scheduler.running:
         scheduler.start()
         import time
         time.sleep(1.0)  # 等待调度器完全启动
         logging.info("Scheduler started, timezone: Asia/Shanghai")
-        # 注册退出时的清理函数
         atexit.register(lambda: scheduler.shutdown(wait=False) if scheduler.running else None)
-        atexit.register(lambda: _executor.shutdown(wait=True))
+    scheduler.add_job(_flush_usage, id=USAGE_FLUSH_JOB_ID, trigger=IntervalTrigger(seconds=settings.usage_flush_interval),
+                      replace_existing=True, max_instances=1)
+    # 每天零点后按前一天的数据重新规划请求预算
+    scheduler.add_job(plan_request_budget, id=BUDGET_PLAN_JOB_ID,
+                      trigger=CronTrigger(hour=0, minute=5, timezone="Asia/Shanghai"),
+                      replace_existing=True, max_instances=1, misfire_grace_time=3600)
+    scheduler.add_job(_run_commands, id=COMMAND_JOB_ID,
+                      trigger=IntervalTrigger(seconds=settings.scheduler_command_interval),
+                      replace_existing=True, max_instances=1)
+    scheduler.add_job(_propagate_article_refs, id=ARTICLE_REFS_JOB_ID,
+                      trigger=IntervalTrigger(seconds=settings.article_refs_interval),
+                      replace_existing=True, max_instances=1)
     refresh_jobs()
+    try:
+        plan_request_budget()
+    except Exception:
+        logging.exception("Failed to plan request budget on startup")
+    with _app.app_context():
+        if article_counters.needs_rebuild():
+            # 文章计数器尚未建立：后台重建，完成前文章列表接口直接计数
+            scheduler.add_job(_rebuild_article_counters, id=COUNTERS_JOB_ID, replace_existing=True)
+        if mp_stats.needs_rebuild():
+            # 公众号汇总尚未建立：后台重建，完成前汇总接口直接聚合 articles
+            scheduler.add_job(_rebuild_mp_stats, id=MP_STATS_JOB_ID, replace_existing=True)
+        if search_index.needs_backfill():
+            # 升级前入库的文章没有检索索引词或按旧规则切分：后台补建
+            scheduler.add_job(_backfill_search_index, id=SEARCH_BACKFILL_JOB_ID, replace_existing=True)
+        if article_refs.needs_backfill():
+            # 升级前入库的文章没有冗余的分类和头像：标记所有目标，由同步任务补齐
+            article_refs.mark_all_changed()
+
+
+def _rebuild_article_counters():
+    with _app.app_context():
+        article_counters.rebuild()
+
+
+def _rebuild_mp_stats():
+    with _app.app_context():
+        mp_stats.rebuild()
+
+
+def _backfill_search_index():
+    with _app.app_context():
+        search_index.backfill()
+
+
+def _propagate_article_refs():
+    with _app.app_context():
+        article_refs.propagate(get_settings().article_refs_settle_minutes)
+
+
+def _stop_scheduling():
+    """
+    不再是主节点（租约被接管或进程退出）：移除所有任务；内存队列时关闭爬取队列并等待正在执行的爬取结束
+    """
+    global _active
+    _active = False
+    if scheduler.running:
+        scheduler.remove_all_jobs()
+    with _jobs_lock:
+        _job_ids.clear()
+        _slot_members.clear()
+        _target_slots.clear()
+    if get_settings().crawl_queue_backend == "mongo":
+        # 爬取由 crawler.worker 进程执行，本进程没有爬取引擎；不关闭共享队列，手动触发仍可直接入队
+        stop_feeder()
+    else:
+        stop_crawl_engine()
+    _flush_usage()
+    logging.info("Scheduling stopped in this process")
+
+
+def _leader_status() -> Dict:
+    """主节点随心跳发布的状态（非主节点的 /api/targets/queue 读取）"""
+    data = get_crawl_queue().snapshot()
+    feeder = get_feeder()
+    data["staggered"] = feeder.pending() if feeder else 0
+    data["jobs"] = len(scheduler.get_jobs()) if scheduler.running else 0
+    return data
+
+
+def scheduler_status() -> Dict:
+    """调度状态：本进程是主节点时返回本地状态，否则返回主节点最近一次心跳发布的状态"""
+    if is_leader():
+        data = _leader_status()
+        data["leader"] = _lease.holder
+        data["is_leader"] = True
+        return data
+    lease = _lease.current() if _lease is not None else _app.mongo[LEASE_COLLECTION].find_one({"_id": LEASE_ID})
+    data = dict((lease or {}).get("status") or {})
+    data["leader"] = (lease or {}).get("holder")
+    data["leader_heartbeat_at"] = (lease or {}).get("heartbeat_at")
+    data["is_leader"] = False
+    return data
+
+
+def _send_command(kind: str, **fields):
+    """非主节点把调度变更写入 scheduler_commands，由主节点的 _run_commands 执行"""
+    if _app is None:
+        raise RuntimeError("Scheduler not initialized with app")
+    _app.mongo[COMMAND_COLLECTION].insert_one(dict(type=kind, created_at=datetime.utcnow(), **fields))
+
+
+def _run_commands():
+    """主节点定期执行其他进程提交的调度命令（同一批中有全量刷新时跳过单目标的同步）"""
+    if _app is None or not is_leader():
+        return
+    collection = _app.mongo[COMMAND_COLLECTION]
+    docs = list(collection.find().sort("_id", 1).limit(COMMAND_BATCH_SIZE))
+    if not docs:
+        return
+    collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+    kinds = {doc["type"] for doc in docs}
+    if "refresh" in kinds:
+        refresh_jobs()
+    for doc in docs:
+        kind = doc["type"]
+        target_id = doc.get("target_id")
+        try:
+            if kind == "run":
+                trigger_target(target_id, doc.get("priority", PRIORITY_SCHEDULED))
+            elif kind == "sync" and "refresh" not in kinds:
+                sync_target_jobs(target_id)
+            elif kind == "remove":
+                remove_target_jobs(target_id)
+        except Exception:
+            logging.exception("Failed to run scheduler command %s for target %s", kind, target_id)
+    if "plan" in kinds:
+        plan_request_budget()
 
 
 def refresh_jobs():
+    """
+    全量同步所有目标的定时任务（启动时和 /api/admin/refresh-jobs 使用）
+
+    逐个目标对账，不会先清空任务；已停用/删除目标的任务被移除，改期任务保留。
+    新增/修改/删除单个目标请用 sync_target_jobs / remove_target_jobs。
+    """
     if _app is None:
         raise RuntimeError("Scheduler not initialized with app")
+    if not _active:
+        _send_command("refresh")
+        return
     with _app.app_context():
-        # 确保调度器正在运行
-        if not scheduler.running:
-            logging.warning("Scheduler not running, starting it...")
-            scheduler.start()
-            import time
-            time.sleep(1.0)
-
-        scheduler.remove_all_jobs()
         targets = list(get_db()["targets"].find({"enabled": True}))
+        _ensure_histograms(targets)
+        # 智能调度目标的发布频率一次聚合算出
+        frequencies = analyze_publish_frequencies(
+            t.get("name") for t in targets if t.get("schedule_mode") == "smart")
 
         # 收集需要立即执行的目标（daily 模式且今天的执行时间已过，但今天还未执行过）
-        tz = pytz.timezone("Asia/Shanghai")
-        current_time = datetime.now(tz)
-        today = current_time.date()
+        current_time = datetime.now(pytz.timezone("Asia/Shanghai"))
         targets_to_execute = set()
-
+        enabled_ids = set()
         for target in targets:
-            mode = target.get("schedule_mode") or "daily"
-            if mode in ("daily", "smart"):
-                # 对于 daily/smart 模式，检查今天已过的时间点是否需要立即执行
-                times = get_smart_schedule_times(target)
-
-                # 获取最后一次执行时间
-                last_run_at = target.get("last_run_at")
-                last_run_time_tz = None
-                if last_run_at:
-                    if isinstance(last_run_at, datetime):
-                        if last_run_at.tzinfo is None:
-                            last_run_time_tz = pytz.UTC.localize(last_run_at).astimezone(tz)
-                        else:
-                            last_run_time_tz = last_run_at.astimezone(tz)
-
-                # 检查今天是否有已过的时间点需要执行
-                # 策略：对于每个已过的时间点，如果今天还没有执行过（或执行时间早于该时间点），则执行一次
-                # 这样可以补执行今天错过的任务，即使之前已经执行过其他时间点
-                should_execute_now = False
-                missed_times = []
-
-                for t in times:
-                    try:
-                        hh, mm = t.split(":")
-                        scheduled_time = tz.localize(datetime.combine(
-                            today, datetime.min.time().replace(hour=int(hh), minute=int(mm))))
-
-                        if scheduled_time < current_time:
-                            # 这个时间点已过
-                            # 如果今天还没有执行过，或者最后执行时间早于这个时间点，则需要执行
-                            if last_run_time_tz is None:
-                                # 今天还没有执行过
-                                should_execute_now = True
-                                missed_times.append(t)
-                                break
-                            elif last_run_time_tz.date() < today:
-                                # 今天还没有执行过
-                                should_execute_now = True
-                                missed_times.append(t)
-                                break
-                            elif last_run_time_tz < scheduled_time:
-                                # 今天执行过，但执行时间早于这个时间点，说明这个时间点的任务还没执行
-                                should_execute_now = True
-                                missed_times.append(t)
-                                break
-                    except Exception:
-                        pass
-
-                if should_execute_now:
-                    logging.info("Target %s has missed time(s) %s today (current: %s, last_run: %s), will execute immediately",
-                                 target.get("name", str(target["_id"])),
-                                 ", ".join(missed_times),
-                                 current_time.strftime("%H:%M"),
-                                 last_run_time_tz.strftime("%Y-%m-%d %H:%M") if last_run_time_tz else "never")
-                    targets_to_execute.add(str(target["_id"]))
-
-            _add_jobs_for_target(target)
+            target_id = str(target["_id"])
+            enabled_ids.add(target_id)
+            times = get_smart_schedule_times(target, frequencies.get(target.get("name")))
+            _sync_jobs_for_target(target, times)
+            if _missed_times_today(target, current_time, times):
+                targets_to_execute.add(target_id)
+
+        # 移除已停用或已删除目标的任务（包括上次启动前遗留的）
+        stale_ids = {_job_target_id(job.id) for job in scheduler.get_jobs() if _is_target_job(job.id)}
+        stale_ids |= set(_job_ids) | set(_target_slots)
+        for target_id in stale_ids - enabled_ids:
+            remove_target_jobs(target_id)
 
         # 立即执行错过的目标（每个目标只执行一次，异步执行避免阻塞）
         for target_id in targets_to_execute:
             logging.info("Scheduling missed daily jobs for target %s", target_id)
-            _executor.submit(_execute_target_async, target_id)
+            trigger_target(target_id)
 
-        # 等待任务被调度器处理
-        import time
-        time.sleep(0.2)
-
-        # 验证所有任务的下次执行时间
         all_jobs = scheduler.get_jobs()
-        tz = pytz.timezone("Asia/Shanghai")
-        current_time = datetime.now(tz)
         logging.info("Scheduler loaded %s targets, total %s jobs (current time: %s)",
                      len(targets), len(all_jobs), current_time)
         for job in all_jobs:
-            if hasattr(job, "next_run_time") and job.next_run_time:
-                logging.info("Job %s next run: %s (in %s)",
-                             job.id, job.next_run_time,
-                             job.next_run_time - current_time if job.next_run_time > current_time else "PAST")
-            else:
-                logging.warning("Job %s has no next_run_time", job.id)
+            logging.debug("Job %s next run: %s", job.id, getattr(job, "next_run_time", None))
 
 
-def trigger_target(target_id: str):
-    """触发目标爬取（异步执行，不阻塞）"""
-    _executor.submit(_execute_target_async, target_id)
+def sync_target_jobs(target_id: str):
+    """只更新单个目标的定时任务（新增/修改目标后调用），停用的目标移除其任务"""
+    if _app is None:
+        raise RuntimeError("Scheduler not initialized with app")
+    if not _active:
+        _send_command("sync", target_id=target_id)
+        return
+    with _app.app_context():
+        target = get_db()["targets"].find_one({"_id": ObjectId(target_id)})
+        if not target or not target.get("enabled", True):
+            remove_target_jobs(target_id)
+            return
+        times = get_smart_schedule_times(target)
+        _sync_jobs_for_target(target, times)
+        if _missed_times_today(target, datetime.now(pytz.timezone("Asia/Shanghai")), times):
+            logging.info("Scheduling missed daily jobs for target %s", target_id)
+            trigger_target(target_id)
+
+
+def remove_target_jobs(target_id: str):
+    """移除目标的所有任务（包括改期任务）并移出所属时间槽，删除/停用目标后调用"""
+    if not _active:
+        _send_command("remove", target_id=target_id)
+        return
+    with _jobs_lock:
+        job_ids = _job_ids.pop(target_id, set())
+        _leave_slots(target_id)
+    job_ids = set(job_ids) | {f"{target_id}{DEFERRED_JOB_SUFFIX}"}
+    for job in scheduler.get_jobs():
+        if _is_target_job(job.id) and _job_target_id(job.id) == target_id:
+            job_ids.add(job.id)
+    for job_id in job_ids:
+        _remove_job(job_id)
+    logging.info("Removed jobs for target %s", target_id)
+
+
+def _missed_times_today(target: dict, current_time: datetime, times: Optional[List[str]] = None) -> List[str]:
+    """
+    daily/smart 模式下今天已过但还未执行的时间点
+
+    策略：对于每个已过的时间点，如果今天还没有执行过（或执行时间早于该时间点），则执行一次
+    这样可以补执行今天错过的任务，即使之前已经执行过其他时间点
+    """
+    mode = target.get("schedule_mode") or "daily"
+    if mode not in ("daily", "smart"):
+        return []
+    tz = current_time.tzinfo
+    today = current_time.date()
+    if times is None:
+        times = get_smart_schedule_times(target)
+
+    # 获取最后一次执行时间
+    last_run_at = target.get("last_run_at")
+    last_run_time_tz = None
+    if isinstance(last_run_at, datetime):
+        if last_run_at.tzinfo is None:
+            last_run_time_tz = pytz.UTC.localize(last_run_at).astimezone(tz)
+        else:
+            last_run_time_tz = last_run_at.astimezone(tz)
+
+    weekday = DAY_NAMES[today.weekday()]
+    missed_times = []
+    for t in times:
+        try:
+            hh, mm, days = _parse_schedule_time(t)
+            if days and weekday not in days.split(","):
+                continue
+            scheduled_time = tz.localize(datetime.combine(
+                today, datetime.min.time().replace(hour=int(hh), minute=int(mm))))
+
+            if scheduled_time < current_time:
+                # 这个时间点已过：今天还没有执行过，或者最后执行时间早于这个时间点
+                if (last_run_time_tz is None or last_run_time_tz.date() < today
+                        or last_run_time_tz < scheduled_time):
+                    missed_times.append(t)
+                    break
+        except Exception:
+            pass
+
+    if missed_times:
+        logging.info("Target %s has missed time(s) %s today (current: %s, last_run: %s), will execute immediately",
+                     target.get("name", str(target["_id"])),
+                     ", ".join(missed_times),
+                     current_time.strftime("%H:%M"),
+                     last_run_time_tz.strftime("%Y-%m-%d %H:%M") if last_run_time_tz else "never")
+    return missed_times
+
+
+def trigger_target(target_id: str, priority: int = PRIORITY_SCHEDULED) -> str:
+    """
+    触发目标爬取（放入爬取队列异步执行，不阻塞）
+
+    同一目标重复触发会合并为一次；手动触发使用 PRIORITY_MANUAL 优先执行。
+    使用内存队列时非主节点转交给主节点执行；使用 Mongo 队列时任何进程都直接放入队列。
+
+    Returns:
+        crawl_queue 中的 put 结果（queued/merged/running/rejected/closed），非主节点返回 forwarded
+    """
+    if not _active and get_settings().crawl_queue_backend != "mongo":
+        _send_command("run", target_id=target_id, priority=priority)
+        return FORWARDED
+    status = get_crawl_queue().put(target_id, priority)
+    if status == REJECTED:
+        logging.warning("Crawl queue full, target %s not queued", target_id)
+    return status
+
+
+def start_crawl_engine(threads: int = CRAWL_WORKERS):
+    """按 crawl_engine 配置启动 asyncio 引擎或线程池引擎，从爬取队列取目标执行"""
+    settings = get_settings()
+    if settings.crawl_engine == "async" and aiohttp is None:
+        logging.warning("CRAWL_ENGINE=async but aiohttp is not installed, falling back to thread pool")
+    if settings.crawl_engine == "async" and aiohttp is not None:
+        start_async_engine(
+            _app,
+            queue=get_crawl_queue(),
+            prepare=_prepare_target,
+            complete=_complete_target,
+            defer=_defer_after_freq_control,
+            fail=_fail_target,
+            max_concurrency=settings.async_max_concurrency,
+            per_account_concurrency=settings.async_per_account_concurrency,
+        )
+    else:
+        _start_workers(threads)
+
+
+def _start_workers(threads: int = CRAWL_WORKERS):
+    """启动线程池引擎的爬取线程"""
+    if _workers:
+        return
+    for i in range(threads):
+        worker = threading.Thread(target=_worker_loop, name=f"crawl-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def _worker_loop():
+    queue = get_crawl_queue()
+    while True:
+        target_id = queue.get()
+        if target_id is None:
+            # 队列已关闭
+            return
+        try:
+            _execute_target_async(target_id)
+        except Exception:
+            logging.exception("Crawl worker failed for target %s", target_id)
+        finally:
+            queue.done(target_id)
+
+
+def stop_crawl_engine():
+    """关闭爬取队列并等待正在执行的爬取结束"""
+    stop_feeder()
+    get_crawl_queue().close()
+    stop_async_engine()
+    for worker in _workers:
+        worker.join()
+    _workers.clear()
 
 
 def _execute_target_async(target_id: str):
@@ -155,30 +533,143 @@ def _execute_target_async(target_id: str):
     if _app is None:
         raise RuntimeError("Scheduler not initialized with app")
     with _app.app_context():
-        target = get_db()["targets"].find_one({"_id": ObjectId(target_id)})
-        if not target or not target.get("enabled", True):
+        prepared = _prepare_target(target_id)
+        if prepared is None:
             return
-        account = None
-        if target.get("account_id"):
-            account = get_db()["mp_accounts"].find_one({"_id": ObjectId(target["account_id"])})
+        target, account = prepared
         try:
             logging.info("Starting crawl for target %s", target_id)
-            run_crawl(target, account)
-            get_db()["targets"].update_one({"_id": target["_id"]}, {"$set": {"last_run_at": datetime.utcnow()}})
-            logging.info("Completed crawl for target %s", target_id)
+            if account:
+                with get_account_pool().use(account):
+                    error_type = run_crawl(target, account)
+            else:
+                error_type = run_crawl(target, account)
+            _complete_target(target, account, error_type)
+        except FreqControlError as exc:
+            _defer_after_freq_control(target_id, account, exc)
+        except Exception as exc:
+            _fail_target(target_id, exc)
+
+
+def _prepare_target(target_id: str):
+    """
+    读取目标并选择账号（线程池引擎与 asyncio 引擎共用）
+
+    Returns:
+        (target, account)；目标不存在/已停用，或账号冷却中、令牌桶需要等待过久而改期时返回 None
+    """
+    target = get_db()["targets"].find_one({"_id": ObjectId(target_id)})
+    if not target or not target.get("enabled", True):
+        return None
+    account = _pick_account(target)
+    # 账号冷却中或令牌桶需要等待过久时改期执行，释放爬取线程
+    if account:
+        account_key = str(account["_id"])
+        if not get_usage_tracker().has_quota(account_key, account.get("daily_quota")):
+            # 所有可用账号今天的请求配额都已用完：跳过本次，等下一个调度时间点（次日配额重置）
+            _append_log(target, status="error", message=f"账号 {account.get('name')} 今日请求配额已用完，跳过本次爬取",
+                        details={"step": "初始化", "error_type": "quota_exhausted"})
+            return None
+        remaining = cooldown.get_cooldowns().remaining(account_key)
+        if remaining > 0:
+            _defer_target(target_id, remaining, "account cooling down")
+            return None
+        wait = rate_limiter.get_limiter(account_key).wait_time()
+        if wait > get_settings().rate_limit_max_wait:
+            _defer_target(target_id, wait, "rate limited")
+            return None
+    return target, account
+
+
+def _complete_target(target: dict, account: Optional[dict], error_type: Optional[str]):
+    """爬取结束：记录账号结果、更新 last_run_at、智能调度检查"""
+    if error_type == circuit_breaker.CIRCUIT_OPEN:
+        # 账号已熔断、没有发出请求：不计入账号结果，也不更新 last_run_at，凭证恢复后按原计划爬取
+        logging.info("Skipped crawl for target %s: account circuit open", target["_id"])
+        return
+    if account:
+        get_account_pool().record(account, error_type)
+    if target.get("schedule_mode") == ADAPTIVE_MODE:
+        # 自适应间隔已在爬取收尾时按新文章数更新，按最新间隔重排该目标的任务
+        fresh = get_db()["targets"].find_one_and_update(
+            {"_id": target["_id"]}, {"$set": {"last_run_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER)
+        if fresh:
+            _resync_target(fresh)
+    else:
+        get_db()["targets"].update_one({"_id": target["_id"]}, {"$set": {"last_run_at": datetime.utcnow()}})
+    logging.info("Completed crawl for target %s", target["_id"])
+
+    # 智能调度模式：爬取完成后检查是否需要调整频率
+    if target.get("schedule_mode") == "smart":
+        _check_and_update_smart_schedule(target)
+
+
+def _defer_after_freq_control(target_id: str, account: Optional[dict], exc: FreqControlError):
+    # 账号被频率限制：改期到冷却结束后，其他账号的目标不受影响
+    if account:
+        get_account_pool().record(account, "freq_control")
+    _defer_target(target_id, exc.retry_after, "freq control")
+
+
+def _fail_target(target_id: str, exc: Exception):
+    logging.exception("Crawl failed for target %s: %s", target_id, exc)
+    get_db()["targets"].update_one({"_id": ObjectId(target_id)}, {"$set": {"last_error": str(exc)}})
+    if get_settings().crawl_queue_backend == "mongo":
+        # 持久化队列按尝试次数退避重试
+        get_crawl_queue().retry(target_id, str(exc))
 
-            # 智能调度模式：爬取完成后检查是否需要调整频率
-            if target.get("schedule_mode") == "smart":
-                _check_and_update_smart_schedule(target)
+
+def _pick_account(target: dict) -> Optional[dict]:
+    """选择本次爬取使用的账号：启用账号池时在所有账号间负载均衡，绑定账号优先"""
+    db = get_db()
+    if not get_settings().account_pool_enabled:
+        if not target.get("account_id"):
+            return None
+        return db["mp_accounts"].find_one({"_id": ObjectId(target["account_id"])})
+    accounts = list(db["mp_accounts"].find({}, {"name": 1, "token": 1, "cookie": 1, "daily_quota": 1,
+                                                 "breaker_state": 1, "breaker_failures": 1,
+                                                 "breaker_opened_at": 1}))
+    return get_account_pool().choose(accounts, preferred_id=target.get("account_id"))
+
+
+def _defer_target(target_id: str, delay_seconds: float, reason: str):
+    """把目标改期到 delay_seconds 秒后执行（同一目标只保留一个改期任务）"""
+    if get_settings().crawl_queue_backend == "mongo":
+        # 持久化队列：任务重新排队并设置可认领时间，进程重启也不会丢失
+        try:
+            get_crawl_queue().defer(target_id, delay_seconds, reason)
+            logging.info("Deferred target %s by %.1fs (%s)", target_id, delay_seconds, reason)
         except Exception as exc:
-            logging.exception("Crawl failed for target %s: %s", target_id, exc)
-            get_db()["targets"].update_one({"_id": ObjectId(target_id)}, {"$set": {"last_error": str(exc)}})
+            logging.error("Failed to defer target %s: %s", target_id, exc)
+        return
+    run_at = datetime.now(pytz.timezone("Asia/Shanghai")) + timedelta(seconds=delay_seconds)
+    try:
+        scheduler.add_job(
+            trigger_target,
+            id=f"{target_id}{DEFERRED_JOB_SUFFIX}",
+            trigger=DateTrigger(run_date=run_at),
+            args=[target_id],
+            replace_existing=True,
+            misfire_grace_time=300,
+        )
+        logging.info("Deferred target %s by %.1fs (%s)", target_id, delay_seconds, reason)
+    except Exception as exc:
+        logging.error("Failed to defer target %s: %s", target_id, exc)
+
 
+def _build_jobs(target: dict, times: Optional[List[str]] = None) -> Tuple[List[dict], Dict[str, object]]:
+    """
+    根据目标的调度配置生成任务（times 为已算好的 daily/smart 时间点，未提供时自行计算）
 
-def _add_jobs_for_target(target: dict):
+    Returns:
+        (目标自己的定时任务 [{id, trigger}]（interval 模式）, 目标所属的时间槽 {slot_id: trigger})
+        daily/smart 的每个时间点、cron 的每个表达式是一个时间槽，所有目标共用一个任务
+    """
     target_id = str(target["_id"])
     mode = target.get("schedule_mode") or "daily"
     jobs = []
+    slots = {}
     if mode == "interval":
         minutes = _interval_to_minutes(target)
         if minutes:
@@ -188,27 +679,26 @@ def _add_jobs_for_target(target: dict):
                     "trigger": IntervalTrigger(minutes=minutes),
                 }
             )
+    elif mode == ADAPTIVE_MODE:
+        # 间隔变化时任务被替换，下次执行时间从本次爬取结束开始计算
+        jobs.append({"id": target_id, "trigger": IntervalTrigger(minutes=current_interval(target))})
     elif mode in ("daily", "smart"):
-        times = get_smart_schedule_times(target)
-        for idx, t in enumerate(times):
+        if times is None:
+            times = get_smart_schedule_times(target)
+        for t in times:
             try:
-                hh, mm = t.split(":")
-                cron = CronTrigger(hour=int(hh), minute=int(mm), timezone="Asia/Shanghai")
-                jobs.append(
-                    {
-                        "id": f"{target_id}-{idx}",
-                        "trigger": cron,
-                    }
-                )
-                logging.info("Added daily job for target %s at %s (job id: %s-%s)", target_id, t, target_id, idx)
+                hh, mm, days = _parse_schedule_time(t)
+                slot_id = f"{SLOT_JOB_PREFIX}{hh:02d}:{mm:02d}" + (f"@{days}" if days else "")
+                slots[slot_id] = CronTrigger(day_of_week=days or None, hour=hh, minute=mm,
+                                             timezone="Asia/Shanghai")
+                logging.debug("Daily slot for target %s at %s (job id: %s)", target_id, t, slot_id)
             except Exception as exc:
                 logging.warning("Invalid daily time %s for target %s: %s", t, target_id, exc)
     elif mode == "cron":
-        expr = (target.get("cron_expr") or "").strip()
+        expr = " ".join((target.get("cron_expr") or "").split())
         if expr:
             try:
-                cron = CronTrigger.from_crontab(expr)
-                jobs.append({"id": target_id, "trigger": cron})
+                slots[f"{SLOT_JOB_PREFIX}cron {expr}"] = CronTrigger.from_crontab(expr)
             except Exception as exc:
                 logging.warning("Invalid cron expr %s for target %s: %s", expr, target_id, exc)
     else:
@@ -217,7 +707,42 @@ def _add_jobs_for_target(target: dict):
         if minutes:
             jobs.append({"id": target_id, "trigger": IntervalTrigger(minutes=minutes)})
 
+    return jobs, slots
+
+
+def _sync_jobs_for_target(target: dict, times: Optional[List[str]] = None):
+    """
+    对账单个目标的任务：移除多余的任务，新增或更新变化的任务，未变化的任务不动；
+    更新目标所属的时间槽，时间槽没有目标时移除该时间槽的任务
+    """
+    target_id = str(target["_id"])
+    jobs, slots = _build_jobs(target, times)
+    wanted = {job["id"] for job in jobs}
+    with _jobs_lock:
+        existing = _job_ids.get(target_id, set())
+        _job_ids[target_id] = wanted
+        _leave_slots(target_id, set(slots))
+        account_key = str(target.get("account_id") or "")
+        for slot_id, trigger in slots.items():
+            _slot_members.setdefault(slot_id, {})[target_id] = account_key
+            if scheduler.get_job(slot_id) is None:
+                scheduler.add_job(
+                    _fire_slot,
+                    id=slot_id,
+                    trigger=trigger,
+                    args=[slot_id],
+                    replace_existing=True,
+                    max_instances=1,
+                    misfire_grace_time=300,
+                )
+        _target_slots[target_id] = set(slots)
+    for job_id in existing - wanted:
+        _remove_job(job_id)
+
     for job in jobs:
+        current = scheduler.get_job(job["id"])
+        if current is not None and str(current.trigger) == str(job["trigger"]):
+            continue
         try:
             scheduler.add_job(
                 trigger_target,
@@ -233,6 +758,79 @@ def _add_jobs_for_target(target: dict):
             continue
 
 
+def _resync_target(target: dict, times: Optional[List[str]] = None):
+    """爬取收尾时重排目标的任务：主节点直接对账，独立爬取进程转交主节点"""
+    if _active:
+        _sync_jobs_for_target(target, times)
+    else:
+        _send_command("sync", target_id=str(target["_id"]))
+
+
+def _parse_schedule_time(entry: str) -> Tuple[int, int, Optional[str]]:
+    """解析调度时间点："HH:MM" 或 "HH:MM@mon,wed"（只在指定星期几执行）"""
+    time_part, _, days = entry.partition("@")
+    hh, mm = time_part.strip().split(":")
+    days = ",".join(d.strip().lower() for d in days.split(",") if d.strip())
+    if days and any(d not in DAY_NAMES for d in days.split(",")):
+        raise ValueError(f"invalid weekday in {entry}")
+    return int(hh), int(mm), days or None
+
+
+def _leave_slots(target_id: str, keep=frozenset()):
+    """把目标移出不在 keep 中的时间槽，空的时间槽移除其任务（调用方持有 _jobs_lock）"""
+    for slot_id in _target_slots.pop(target_id, set()) - set(keep):
+        members = _slot_members.get(slot_id)
+        if members is None:
+            continue
+        members.pop(target_id, None)
+        if not members:
+            del _slot_members[slot_id]
+            _remove_job(slot_id)
+
+
+def _fire_slot(slot_id: str):
+    """时间槽到点：把槽内目标分散到 slot_spread_seconds 内放入爬取队列"""
+    with _jobs_lock:
+        members = dict(_slot_members.get(slot_id, {}))
+    if not members:
+        return
+    settings = get_settings()
+    # 同一账号相邻两次启动至少间隔一个令牌的时间
+    account_spacing = 60.0 / max(settings.rate_limit_per_minute, 1e-6)
+    if settings.account_pool_enabled:
+        # 账号池在所有账号间分配爬取，绑定的账号不代表实际使用的账号：按账号池的总速率分散
+        with _app.app_context():
+            accounts = get_db()["mp_accounts"].count_documents({})
+        members = {target_id: POOL_ACCOUNT_KEY for target_id in members}
+        account_spacing /= max(accounts, 1)
+    plan = plan_staggered_starts(members, settings.slot_spread_seconds, account_spacing)
+    feeder = get_feeder()
+    if feeder is None:
+        for _, target_id in plan:
+            trigger_target(target_id)
+    else:
+        feeder.schedule(plan)
+    logging.info("Slot %s fired for %d targets, spread over %.0fs",
+                 slot_id, len(plan), max((delay for delay, _ in plan), default=0))
+
+
+def _remove_job(job_id: str):
+    try:
+        scheduler.remove_job(job_id)
+    except JobLookupError:
+        pass
+
+
+def _job_target_id(job_id: str) -> str:
+    """目标任务 id 形如 <target_id> 或 <target_id>-deferred（时间槽任务以 slot- 开头）"""
+    return job_id.split("-", 1)[0]
+
+
+def _is_target_job(job_id: str) -> bool:
+    """是否为目标自己的任务（不是时间槽任务或系统任务）"""
+    return not job_id.startswith((SLOT_JOB_PREFIX, SYSTEM_JOB_PREFIX))
+
+
 def _interval_to_minutes(target: dict):
     mode = target.get("schedule_mode")
     if mode == "interval":
@@ -253,24 +851,14 @@ def _interval_to_minutes(target: dict):
     return None
 
 
-def _analyze_publish_frequency(mp_name: str) -> str:
+def _frequency_level(article_count: int) -> str:
     """
-    分析公众号发布频率，返回频率等级：high/medium/low
+    由最近30天文章数得到频率等级：high/medium/low
 
     - high: 两天至少发1篇（月均≥15篇）
     - medium: 一周至少发1篇（月均≥4篇）
     - low: 一个月才发1篇（月均<4篇）
     """
-    db = get_db()
-
-    # 查询最近30天的文章数量
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    article_count = db["articles"].count_documents({
-        "mp_name": mp_name,
-        "publish_at": {"$gte": thirty_days_ago}
-    })
-
-    # 判断频率等级
     if article_count >= 15:  # 两天至少1篇 = 月均15篇
         return "high"
     elif article_count >= 4:  # 一周至少1篇 = 月均4篇
@@ -279,11 +867,60 @@ def _analyze_publish_frequency(mp_name: str) -> str:
         return "low"
 
 
-def get_smart_schedule_times(target: dict) -> List[str]:
+def _ensure_histograms(targets: List[dict]):
+    """为还没有发布时间直方图的智能调度目标一次聚合构建直方图，并写回 targets 列表中的文档"""
+    missing = [t for t in targets if t.get("schedule_mode") == "smart" and HIST_TOTAL_FIELD not in t]
+    if not missing:
+        return
+    try:
+        build_histograms([t["_id"] for t in missing], days=get_settings().predictor_history_days)
+    except Exception:
+        logging.exception("Failed to build publish histograms")
+        return
+    fresh = get_db()["targets"].find({"_id": {"$in": [t["_id"] for t in missing]}},
+                                     {HIST_FIELD: 1, HIST_TOTAL_FIELD: 1})
+    by_id = {doc["_id"]: doc for doc in fresh}
+    for target in missing:
+        doc = by_id.get(target["_id"], {})
+        target[HIST_FIELD] = doc.get(HIST_FIELD, {})
+        target[HIST_TOTAL_FIELD] = doc.get(HIST_TOTAL_FIELD, 0)
+
+
+def analyze_publish_frequencies(mp_names) -> Dict[str, str]:
+    """
+    一次聚合计算多个公众号的发布频率等级（调度器和目标列表接口共用）
+
+    Returns:
+        {mp_name: high/medium/low}，最近30天没有文章的公众号为 low
+    """
+    names = sorted({name for name in mp_names if name})
+    if not names:
+        return {}
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    counts = dict.fromkeys(names, 0)
+    for i in range(0, len(names), FREQUENCY_BATCH_SIZE):
+        pipeline = [
+            {"$match": {"mp_name": {"$in": names[i:i + FREQUENCY_BATCH_SIZE]},
+                        "publish_at": {"$gte": thirty_days_ago}}},
+            {"$group": {"_id": "$mp_name", "count": {"$sum": 1}}},
+        ]
+        for row in get_db()["articles"].aggregate(pipeline):
+            counts[row["_id"]] = row["count"]
+    return {name: _frequency_level(count) for name, count in counts.items()}
+
+
+def _analyze_publish_frequency(mp_name: str) -> str:
+    """分析单个公众号的发布频率，返回频率等级：high/medium/low"""
+    return analyze_publish_frequencies([mp_name]).get(mp_name, "low")
+
+
+def get_smart_schedule_times(target: dict, frequency: Optional[str] = None) -> List[str]:
     """
     根据公众号发布频率智能获取调度时间
 
-    如果 schedule_mode 是 "smart"，则根据历史发布频率自动计算
+    如果 schedule_mode 是 "smart"：
+      - 发布时间直方图样本足够时，在该公众号常见发布时段之后轮询，另加每天一次兜底轮询
+      - 否则根据历史发布频率选择固定时间（frequency 为调用方批量算好的频率等级，未提供时单独查询）
     否则返回用户配置的 daily_times
     """
     mode = target.get("schedule_mode") or "daily"
@@ -293,12 +930,26 @@ def get_smart_schedule_times(target: dict) -> List[str]:
         if not mp_name:
             return SMART_SCHEDULE_CONFIG["medium"]  # 默认中频
 
-        frequency = _analyze_publish_frequency(mp_name)
+        settings = get_settings()
+        predicted = predict_poll_times(
+            target.get(HIST_FIELD),
+            min_samples=settings.predictor_min_samples,
+            coverage=settings.predictor_coverage,
+            max_polls=settings.predictor_max_polls,
+            lag_minutes=settings.predictor_lag_minutes,
+            baseline=SMART_SCHEDULE_CONFIG["low"],
+        )
+        if predicted is not None:
+            logging.debug("Predicted schedule for %s: %s", mp_name, predicted)
+            return _limit_times(predicted, target.get("budget_polls"))
+
+        if frequency is None:
+            frequency = _analyze_publish_frequency(mp_name)
         times = SMART_SCHEDULE_CONFIG.get(frequency, SMART_SCHEDULE_CONFIG["medium"])
 
-        logging.info("Smart schedule for %s: frequency=%s, times=%s",
-                     mp_name, frequency, times)
-        return times
+        logging.debug("Smart schedule for %s: frequency=%s, times=%s",
+                      mp_name, frequency, times)
+        return _limit_times(times, target.get("budget_polls"))
 
     # 非智能模式，返回用户配置
     return target.get("daily_times") or ["09:00", "13:00", "18:00", "22:00"]
@@ -307,7 +958,7 @@ def get_smart_schedule_times(target: dict) -> List[str]:
 def _check_and_update_smart_schedule(target: dict):
     """
     检查并更新单个目标的智能调度频率
-    在每次爬取完成后调用，实时调整调度频率
+    在每次爬取完成后调用，实时调整调度频率（发布时间直方图已在文章入库时增量更新）
     """
     mp_name = target.get("name")
     if not mp_name:
@@ -315,12 +966,14 @@ def _check_and_update_smart_schedule(target: dict):
 
     db = get_db()
     old_frequency = target.get("auto_frequency")
+    old_times = target.get("daily_times")
     new_frequency = _analyze_publish_frequency(mp_name)
+    fresh = db["targets"].find_one({"_id": target["_id"]}, {HIST_FIELD: 1, HIST_TOTAL_FIELD: 1}) or {}
+    target[HIST_FIELD] = fresh.get(HIST_FIELD)
+    new_times = get_smart_schedule_times(target, new_frequency)
 
-    # 如果频率发生变化，更新配置并刷新该目标的调度任务
-    if old_frequency != new_frequency:
-        new_times = SMART_SCHEDULE_CONFIG.get(new_frequency, SMART_SCHEDULE_CONFIG["medium"])
-
+    # 如果频率或预测的时间点发生变化，更新配置并刷新该目标的调度任务
+    if old_frequency != new_frequency or old_times != new_times:
         db["targets"].update_one(
             {"_id": target["_id"]},
             {"$set": {"daily_times": new_times, "auto_frequency": new_frequency}}
@@ -332,35 +985,260 @@ def _check_and_update_smart_schedule(target: dict):
         # 重新添加该目标的调度任务
         target["auto_frequency"] = new_frequency
         target["daily_times"] = new_times
-        _add_jobs_for_target(target)
+        _resync_target(target, new_times)
 
 
 def update_all_smart_schedules():
-    """更新所有智能调度的目标的调度时间"""
+    """更新所有智能调度的目标的调度时间（一次聚合计算全部目标的发布频率）"""
     if _app is None:
         return
 
     with _app.app_context():
         db = get_db()
-        targets = list(db["targets"].find({"enabled": True, "schedule_mode": "smart"}))
+        targets = [t for t in db["targets"].find({"enabled": True, "schedule_mode": "smart"}) if t.get("name")]
+        _ensure_histograms(targets)
+        frequencies = analyze_publish_frequencies(t["name"] for t in targets)
 
+        updates = []
         for target in targets:
-            mp_name = target.get("name")
-            if not mp_name:
+            frequency = frequencies.get(target["name"], "low")
+            new_times = get_smart_schedule_times(target, frequency)
+            if target.get("auto_frequency") != frequency or target.get("daily_times") != new_times:
+                # 更新数据库中的 daily_times（用于显示）
+                updates.append(UpdateOne(
+                    {"_id": target["_id"]},
+                    {"$set": {"daily_times": new_times, "auto_frequency": frequency}}
+                ))
+                logging.info("Updated smart schedule for %s: %s -> %s",
+                             target["name"], frequency, new_times)
+            target["auto_frequency"] = frequency
+            target["daily_times"] = new_times
+            # 只更新这些目标的任务
+            _sync_jobs_for_target(target, new_times)
+        if updates:
+            db["targets"].bulk_write(updates, ordered=False)
+
+
+def _daily_weight(entry: str) -> float:
+    """时间点平均每天的轮询次数：每天执行为 1，只在部分星期几执行的按天数折算"""
+    try:
+        _, _, days = _parse_schedule_time(entry)
+    except ValueError:
+        return 0.0
+    return len(days.split(",")) / 7.0 if days else 1.0
+
+
+def _limit_times(times: List[str], budget_polls: Optional[float],
+                 baseline: Iterable[str] = SMART_SCHEDULE_CONFIG["low"]) -> List[str]:
+    """
+    把时间点限制在请求预算分配的每日轮询次数内
+
+    每天执行的时间点优先（兜底时间点 baseline 最先，其余均匀保留），至少保留一个；
+    剩余预算再按覆盖天数从多到少加入只在部分星期几执行的预测时间点（按天数折算为小数次）。
+    """
+    if not budget_polls or sum(_daily_weight(t) for t in times) <= budget_polls:
+        return times
+    daily = sorted(t for t in times if _daily_weight(t) == 1.0)
+    partial = sorted((t for t in times if 0 < _daily_weight(t) < 1.0), key=lambda t: -_daily_weight(t))
+
+    keep_daily = min(len(daily), max(1, int(budget_polls)))
+    kept = [t for t in daily if t in set(baseline)][:keep_daily]
+    rest = [t for t in daily if t not in kept]
+    if keep_daily > len(kept):
+        step = len(rest) / float(keep_daily - len(kept))
+        kept += [rest[int(i * step)] for i in range(keep_daily - len(kept))]
+    remaining = budget_polls - len(kept)
+    for entry in partial:
+        if _daily_weight(entry) <= remaining + 1e-9:
+            kept.append(entry)
+            remaining -= _daily_weight(entry)
+    return sorted(kept)
+
+
+def _fixed_daily_polls(target: dict) -> float:
+    """非预算模式（daily/interval/cron）的目标平均每天轮询次数"""
+    mode = target.get("schedule_mode") or "daily"
+    if mode == "daily":
+        return sum(_daily_weight(t) for t in get_smart_schedule_times(target))
+    if mode == "cron":
+        expr = " ".join((target.get("cron_expr") or "").split())
+        try:
+            trigger = CronTrigger.from_crontab(expr, timezone="Asia/Shanghai")
+        except Exception:
+            return 0.0
+        # 数出未来24小时内的触发次数（最多按每分钟一次计）
+        now = datetime.now(pytz.timezone("Asia/Shanghai"))
+        end = now + timedelta(days=1)
+        count = 0
+        fire = trigger.get_next_fire_time(None, now)
+        while fire is not None and fire < end and count < 1440:
+            count += 1
+            fire = trigger.get_next_fire_time(fire, fire + timedelta(seconds=1))
+        return float(count)
+    minutes = _interval_to_minutes(target)
+    return 1440.0 / minutes if minutes else 0.0
+
+
+def _publish_rates(target_ids: List) -> Dict:
+    """一次聚合算出目标最近30天的日均发文数 {target _id: 篇/天}"""
+    since = datetime.utcnow() - timedelta(days=30)
+    rates = dict.fromkeys(target_ids, 0.0)
+    for i in range(0, len(target_ids), FREQUENCY_BATCH_SIZE):
+        pipeline = [
+            {"$match": {"target_id": {"$in": target_ids[i:i + FREQUENCY_BATCH_SIZE]}, "publish_at": {"$gte": since}}},
+            {"$group": {"_id": "$target_id", "count": {"$sum": 1}}},
+        ]
+        for row in get_db()["articles"].aggregate(pipeline):
+            rates[row["_id"]] = row["count"] / 30.0
+    return rates
+
+
+def _flush_usage():
+    if _app is None:
+        return
+    with _app.app_context():
+        get_usage_tracker().flush()
+
+
+def plan_request_budget(apply: bool = True) -> Dict:
+    """
+    规划每日请求预算：在账号每日配额内给 smart/adaptive 目标分配轮询次数
+
+    - 启用账号池时所有账号的配额合并为一个预算（任一账号都可以爬任一目标），否则按目标绑定的账号分别计算
+    - 每个预算 = 配额 * budget_headroom / budget_requests_per_poll 次轮询，先扣除 daily/interval/cron
+      目标的固定轮询次数，剩余的按日均发文数贪心分配（allocate_polls），每个目标至少 1 次
+    - apply 为 True 时把结果写入 targets.budget_polls，并重排轮询次数变化的目标的任务
+      （非主节点转交主节点执行，本次只返回规划结果）
+
+    Returns:
+        {"date", "groups": [预算组的预计用量], "accounts": [账号配额、今日实际用量和预计用量], "targets": [分配结果]}
+    """
+    if _app is None:
+        raise RuntimeError("Scheduler not initialized with app")
+    if apply and not _active:
+        _send_command("plan")
+        apply = False
+    with _app.app_context():
+        settings = get_settings()
+        db = get_db()
+        accounts = list(db["mp_accounts"].find({}, {"name": 1, "daily_quota": 1, "token": 1, "cookie": 1}))
+        targets = list(db["targets"].find({"enabled": True}))
+        pooled = settings.account_pool_enabled
+        per_poll = max(settings.budget_requests_per_poll, 1e-6)
+
+        def quota_of(account):
+            quota = account.get("daily_quota")
+            return int(quota if quota is not None else settings.account_daily_quota)
+
+        # 预算组：账号池为 "pool"，否则为绑定的账号 id
+        group_accounts = defaultdict(list)
+        for account in accounts:
+            if pooled and not ((account.get("token") or "").strip() and (account.get("cookie") or "").strip()):
                 continue
+            group_accounts["pool" if pooled else str(account["_id"])].append(account)
+        group_targets = defaultdict(list)
+        for target in targets:
+            group = "pool" if pooled else str(target.get("account_id") or "")
+            if group in group_accounts:
+                group_targets[group].append(target)
 
-            frequency = _analyze_publish_frequency(mp_name)
-            new_times = SMART_SCHEDULE_CONFIG.get(frequency, SMART_SCHEDULE_CONFIG["medium"])
+        rates = _publish_rates([t["_id"] for t in targets if t.get("schedule_mode") in BUDGETED_MODES])
+        allocation = {}
+        groups = []
+        for group, members in group_targets.items():
+            quotas = [quota_of(a) for a in group_accounts[group]]
+            unlimited = any(q <= 0 for q in quotas)
+            fixed = sum(_fixed_daily_polls(t) for t in members if t.get("schedule_mode") not in BUDGETED_MODES)
+            flexible = {t["_id"]: rates.get(t["_id"], 0.0) for t in members
+                        if t.get("schedule_mode") in BUDGETED_MODES}
+            max_polls = settings.budget_max_polls_per_target
+            if unlimited:
+                budget = max_polls * len(flexible)
+            else:
+                budget = sum(quotas) * settings.budget_headroom / per_poll - fixed
+            polls = allocate_polls(flexible, budget, min_polls=1, max_polls=max_polls)
+            allocation.update(polls)
+            projected = (fixed + sum(polls.values())) * per_poll
+            groups.append({
+                "group": group,
+                "quota": None if unlimited else sum(quotas),
+                "fixed_polls": round(fixed, 1),
+                "budget_polls": sum(polls.values()),
+                "projected_requests": round(projected),
+                "over_quota": not unlimited and projected > sum(quotas),
+            })
+            if not unlimited and projected > sum(quotas):
+                logging.warning("Request budget for %s exceeds quota: projected %.0f > %s requests/day",
+                                group, projected, sum(quotas))
 
-            # 更新数据库中的 daily_times（用于显示）
-            db["targets"].update_one(
-                {"_id": target["_id"]},
-                {"$set": {"daily_times": new_times, "auto_frequency": frequency}}
-            )
+        if apply:
+            _apply_budget(targets, allocation)
+
+        # 账号的预计用量：账号池按配额比例分摊预算组的预计用量
+        projected_by_group = {g["group"]: g["projected_requests"] for g in groups}
+        usage = get_usage_tracker().usage_today(str(a["_id"]) for a in accounts)
+        account_rows = []
+        for account in accounts:
+            key = str(account["_id"])
+            group = "pool" if pooled else key
+            members = group_accounts.get(group, [])
+            share = 0.0
+            if account in members:
+                total_quota = sum(max(quota_of(a), 0) for a in members)
+                share = max(quota_of(account), 0) / total_quota if total_quota else 1.0 / len(members)
+            used = usage.get(key, {})
+            account_rows.append({
+                "id": key,
+                "name": account.get("name"),
+                "quota": quota_of(account),
+                "used_list": used.get("list", 0),
+                "used_search": used.get("search", 0),
+                "used": used.get("list", 0) + used.get("search", 0),
+                "projected": round(projected_by_group.get(group, 0) * share),
+            })
+        target_rows = [
+            {
+                "id": str(t["_id"]),
+                "name": t.get("name"),
+                "schedule_mode": t.get("schedule_mode"),
+                "daily_articles": round(rates.get(t["_id"], 0.0), 2),
+                "budget_polls": allocation[t["_id"]],
+            }
+            for t in targets if t["_id"] in allocation
+        ]
+        target_rows.sort(key=lambda row: (-row["budget_polls"], row["name"] or ""))
+        return {
+            "date": datetime.now(pytz.timezone("Asia/Shanghai")).strftime("%Y-%m-%d"),
+            "groups": groups,
+            "accounts": account_rows,
+            "targets": target_rows,
+        }
 
-            logging.info("Updated smart schedule for %s: %s -> %s",
-                         mp_name, frequency, new_times)
 
-        # 刷新调度器
-        if targets:
-            refresh_jobs()
+def _apply_budget(targets: List[dict], allocation: Dict):
+    """写入 budget_polls 并重排轮询次数变化的目标的任务（调用方持有 app context）"""
+    changed = [t for t in targets if t.get("budget_polls") != allocation.get(t["_id"])]
+    if not changed:
+        return
+    for target in changed:
+        if allocation.get(target["_id"]) is None:
+            target.pop("budget_polls", None)
+        else:
+            target["budget_polls"] = allocation[target["_id"]]
+    frequencies = analyze_publish_frequencies(t.get("name") for t in changed if t.get("schedule_mode") == "smart")
+    updates = []
+    for target in changed:
+        polls = target.get("budget_polls")
+        if polls is None:
+            updates.append(UpdateOne({"_id": target["_id"]}, {"$unset": {"budget_polls": ""}}))
+            times = None
+        elif target.get("schedule_mode") == "smart":
+            times = get_smart_schedule_times(target, frequencies.get(target.get("name")))
+            target["daily_times"] = times
+            updates.append(UpdateOne({"_id": target["_id"]}, {"$set": {"budget_polls": polls, "daily_times": times}}))
+        else:
+            times = None
+            updates.append(UpdateOne({"_id": target["_id"]}, {"$set": {"budget_polls": polls}}))
+        _sync_jobs_for_target(target, times)
+    get_db()["targets"].bulk_write(updates, ordered=False)
+    logging.info("Request budget updated for %d targets", len(changed))
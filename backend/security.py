@@ -1,4 +1,6 @@
 import datetime
+import hashlib
+import hmac
 from functools import wraps
 from typing import Dict, Optional
 
@@ -24,6 +26,16 @@ def create_token(payload: Dict) -> str:
     return jwt.encode(data, settings.jwt_secret, algorithm="HS256")
 
 
+def sign(value: str) -> str:
+    """用 JWT_SECRET 对 value 签名（用于无法携带 Authorization 头的地址，如 <img> 加载的图片）"""
+    key = get_settings().jwt_secret.encode()
+    return hmac.new(key, value.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def verify_signature(value: str, signature: Optional[str]) -> bool:
+    return bool(signature) and hmac.compare_digest(sign(value), signature)
+
+
 def decode_token(token: str) -> Optional[Dict]:
     settings = get_settings()
     try:
@@ -0,0 +1,144 @@
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from utils.cooldown import CooldownRegistry
+from utils.rate_limiter import TokenBucket
+
+# 多进程共享的账号限流状态，保存在 mp_accounts 文档上：
+# {rate_tokens, rate_updated_at, rate_granted, cooldown_until, cooldown_strikes}
+TOKENS_FIELD = "rate_tokens"
+UPDATED_FIELD = "rate_updated_at"
+GRANTED_FIELD = "rate_granted"
+COOLDOWN_UNTIL_FIELD = "cooldown_until"
+STRIKES_FIELD = "cooldown_strikes"
+
+
+def _account_filter(key) -> Optional[Dict]:
+    """账号 key 对应的文档条件；key 不是账号 id（如未绑定账号时的公众号名称）时返回 None"""
+    return {"_id": ObjectId(key)} if ObjectId.is_valid(key) else None
+
+
+class MongoTokenBucket(TokenBucket):
+    """
+    多进程共享的令牌桶，接口同 utils.rate_limiter.TokenBucket
+
+    多个 crawler.worker 进程使用同一个账号时从同一个桶取令牌，账号的总速率仍为 rate。
+    令牌按 MongoDB 服务端时间（$$NOW）补充，各进程的时钟偏差不影响速率；每次预约是一次原子的管道更新。
+    账号文档不存在时退回进程内令牌桶。
+    """
+
+    def __init__(self, collection, key, rate, burst):
+        super().__init__(rate, burst)
+        self.collection = collection
+        self.filter = _account_filter(key)
+
+    def _refilled(self) -> Dict:
+        elapsed = {"$divide": [{"$max": [0, {"$subtract": ["$$NOW", {"$ifNull": [f"${UPDATED_FIELD}", "$$NOW"]}]}]},
+                               1000]}
+        tokens = {"$ifNull": [f"${TOKENS_FIELD}", self.burst]}
+        return {"$min": [self.burst, {"$add": [tokens, {"$multiply": [elapsed, self.rate]}]}]}
+
+    def wait_time(self):
+        if self.filter is None:
+            return super().wait_time()
+        rows = list(self.collection.aggregate([{"$match": self.filter}, {"$project": {"tokens": self._refilled()}}]))
+        if not rows:
+            return super().wait_time()
+        return max(0.0, (1.0 - rows[0]["tokens"]) / self.rate)
+
+    def reserve(self, max_wait=None):
+        if self.filter is None:
+            return super().reserve(max_wait)
+        # 需要等待不超过 max_wait 秒（令牌不少于 1 - max_wait * rate）时才扣除令牌
+        if max_wait is None:
+            granted = {"$literal": True}
+        else:
+            granted = {"$gte": [f"${TOKENS_FIELD}", 1.0 - max_wait * self.rate]}
+        doc = self.collection.find_one_and_update(
+            self.filter,
+            [
+                {"$set": {TOKENS_FIELD: self._refilled(), UPDATED_FIELD: "$$NOW"}},
+                {"$set": {GRANTED_FIELD: granted}},
+                {"$set": {TOKENS_FIELD: {"$cond": [f"${GRANTED_FIELD}", {"$subtract": [f"${TOKENS_FIELD}", 1]},
+                                                   f"${TOKENS_FIELD}"]}}},
+            ],
+            projection={TOKENS_FIELD: 1, GRANTED_FIELD: 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return super().reserve(max_wait)
+        if not doc[GRANTED_FIELD]:
+            return None
+        self.acquired += 1
+        # 扣除后的令牌数为负时需要等待补回
+        return max(0.0, -doc[TOKENS_FIELD] / self.rate)
+
+
+class MongoCooldownRegistry(CooldownRegistry):
+    """
+    多进程共享的账号冷却登记表，接口同 utils.cooldown.CooldownRegistry
+
+    冷却结束时间和连续触发次数保存在账号文档上，任一进程触发频率限制后，其他进程使用该账号的请求同样进入冷却。
+    key 不是账号 id 时退回进程内登记表。
+    """
+
+    def __init__(self, collection, base=60.0, maximum=1800.0, jitter=0.2):
+        super().__init__(base, maximum, jitter)
+        self.collection = collection
+
+    def trip(self, key):
+        account = _account_filter(key)
+        if account is None:
+            return super().trip(key)
+        now = datetime.utcnow()
+        # 先原子地占位（最短冷却）：冷却期内其他进程或线程已触发过时不匹配，沿用当前冷却
+        doc = self.collection.find_one_and_update(
+            {**account, "$or": [{COOLDOWN_UNTIL_FIELD: None}, {COOLDOWN_UNTIL_FIELD: {"$lte": now}}]},
+            {"$inc": {STRIKES_FIELD: 1}, "$set": {COOLDOWN_UNTIL_FIELD: now + timedelta(seconds=self.base)}},
+            projection={STRIKES_FIELD: 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            remaining = self.remaining(key)
+            return remaining if remaining > 0 else super().trip(key)
+        strikes = doc[STRIKES_FIELD]
+        delay = min(self.base * (2 ** (strikes - 1)), self.maximum)
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        self.collection.update_one(account, {"$set": {COOLDOWN_UNTIL_FIELD: now + timedelta(seconds=delay)}})
+        return delay
+
+    def remaining(self, key):
+        account = _account_filter(key)
+        if account is None:
+            return super().remaining(key)
+        doc = self.collection.find_one(account, {COOLDOWN_UNTIL_FIELD: 1}) or {}
+        until = doc.get(COOLDOWN_UNTIL_FIELD)
+        if until is None:
+            return 0.0
+        return max(0.0, (until - datetime.utcnow()).total_seconds())
+
+    def record_success(self, key):
+        account = _account_filter(key)
+        if account is None:
+            return super().record_success(key)
+        self.collection.update_one(
+            {**account, STRIKES_FIELD: {"$gt": 0}, COOLDOWN_UNTIL_FIELD: {"$lte": datetime.utcnow()}},
+            {"$set": {STRIKES_FIELD: 0}},
+        )
+
+    def reset(self, key):
+        account = _account_filter(key)
+        if account is None:
+            return super().reset(key)
+        self.collection.update_one(account, {"$unset": {COOLDOWN_UNTIL_FIELD: "", STRIKES_FIELD: ""}})
+
+    def snapshot(self):
+        now = datetime.utcnow()
+        result = super().snapshot()
+        for doc in self.collection.find({COOLDOWN_UNTIL_FIELD: {"$gt": now}}, {COOLDOWN_UNTIL_FIELD: 1}):
+            result[str(doc["_id"])] = (doc[COOLDOWN_UNTIL_FIELD] - now).total_seconds()
+        return result
@@ -0,0 +1,152 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from crawler import circuit_breaker
+from crawler.request_budget import get_usage_tracker
+from utils.cooldown import get_cooldowns
+from utils.rate_limiter import get_limiter
+
+# 错误率按指数滑动平均统计，越大越看重最近的结果
+ERROR_RATE_ALPHA = 0.2
+# 错误率超过该值（且样本足够）的账号视为不健康
+UNHEALTHY_ERROR_RATE = 0.6
+MIN_SAMPLES = 5
+# 计入账号错误率的错误类型：账号凭证失效（与熔断共用同一份定义）和频率限制，只与单个目标有关的失败不计入
+ACCOUNT_ERROR_TYPES = circuit_breaker.AUTH_ERROR_TYPES | {"freq_control"}
+
+
+class _AccountStats:
+    __slots__ = ("in_flight", "crawls", "errors", "error_rate")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.crawls = 0
+        self.errors = 0
+        self.error_rate = 0.0
+
+
+class AccountPool:
+    """
+    多账号负载均衡
+
+    每次爬取从已登录的 mp_accounts 中选择一个健康（有凭证、未熔断或已到熔断探测时间、未冷却、错误率不高、今日配额未用完）
+    且负载最低的账号；目标绑定的账号在负载不高于其他账号时优先使用。
+    fakeid 是公众号的全局标识，不同账号的 token 都可以用它拉取文章列表。
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, _AccountStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> _AccountStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats.setdefault(key, _AccountStats())
+        return stats
+
+    def is_healthy(self, account: Dict) -> bool:
+        if not (account.get("token") or "").strip() or not (account.get("cookie") or "").strip():
+            return False
+        # 熔断打开的账号到了探测时间后重新参与选择，由 before_crawl 放行一次探测爬取，否则永远不会恢复
+        probing = circuit_breaker.is_open(account)
+        if probing and not circuit_breaker.probe_due(account):
+            return False
+        key = str(account["_id"])
+        if get_cooldowns().remaining(key) > 0:
+            return False
+        stats = self._stats.get(key)
+        # 待探测账号的错误率来自熔断前的凭证失败，不据此排除
+        if not probing and stats and stats.crawls >= MIN_SAMPLES and stats.error_rate >= UNHEALTHY_ERROR_RATE:
+            return False
+        if not get_usage_tracker().has_quota(key, account.get("daily_quota")):
+            return False
+        return True
+
+    def _load(self, account: Dict):
+        key = str(account["_id"])
+        stats = self._stats.get(key)
+        in_flight = stats.in_flight if stats else 0
+        error_rate = stats.error_rate if stats else 0.0
+        return in_flight, get_limiter(key).wait_time(), error_rate
+
+    def choose(self, accounts: Iterable[Dict], preferred_id=None) -> Optional[Dict]:
+        """
+        选择本次爬取使用的账号
+
+        Args:
+            accounts: 候选账号（mp_accounts 文档）
+            preferred_id: 目标绑定的账号 id
+
+        Returns:
+            选中的账号；没有健康账号时退回绑定账号（由爬取流程自行报错）
+        """
+        accounts = list(accounts)
+        preferred = None
+        if preferred_id is not None:
+            preferred = next((a for a in accounts if str(a["_id"]) == str(preferred_id)), None)
+        healthy = [a for a in accounts if self.is_healthy(a)]
+        if not healthy:
+            return preferred
+        best = min(healthy, key=self._load)
+        if preferred is not None and preferred in healthy:
+            # 绑定账号的负载不高于最优账号时优先使用，减少跨账号切换
+            if self._load(preferred)[:2] <= self._load(best)[:2]:
+                return preferred
+        if preferred is not None and best is not preferred:
+            logging.info("Account pool picked %s instead of bound account %s",
+                         best.get("name"), preferred.get("name"))
+        return best
+
+    @contextmanager
+    def use(self, account: Dict):
+        """标记账号正在执行一次爬取"""
+        key = str(account["_id"])
+        with self._lock:
+            self._get(key).in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._get(key).in_flight -= 1
+
+    def record(self, account: Dict, error_type: Optional[str] = None):
+        """记录一次爬取结果（run_crawl 返回的 error_type），用于统计错误率"""
+        key = str(account["_id"])
+        ok = error_type not in ACCOUNT_ERROR_TYPES
+        if ok and circuit_breaker.is_open(account):
+            # 探测成功、熔断关闭：熔断前的失败不再计入错误率
+            self.reset(key)
+        with self._lock:
+            stats = self._get(key)
+            stats.crawls += 1
+            if not ok:
+                stats.errors += 1
+            stats.error_rate += ERROR_RATE_ALPHA * ((0.0 if ok else 1.0) - stats.error_rate)
+
+    def reset(self, account_id):
+        """账号凭证更新后清空统计"""
+        with self._lock:
+            self._stats.pop(str(account_id), None)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        result = {}
+        for key, stats in list(self._stats.items()):
+            result[key] = {
+                "in_flight": stats.in_flight,
+                "crawls": stats.crawls,
+                "errors": stats.errors,
+                "error_rate": round(stats.error_rate, 3),
+                "requests": get_limiter(key).acquired,
+                "requests_today": get_usage_tracker().used(key),
+                "cooldown_remaining": round(get_cooldowns().remaining(key), 1),
+            }
+        return result
+
+
+_pool = AccountPool()
+
+
+def get_account_pool() -> AccountPool:
+    return _pool
@@ -0,0 +1,76 @@
+import logging
+from typing import Dict, Tuple
+
+from backend.config import get_settings
+from backend.db import get_db
+
+# 自适应间隔调度模式（targets.schedule_mode）
+ADAPTIVE_MODE = "adaptive"
+
+# 新文章数的指数滑动平均系数（仅用于展示每次轮询的平均收获）
+YIELD_ALPHA = 0.3
+# 调度模式或初始间隔变化时清除的自适应状态（下次从新配置的间隔开始）
+STATE_FIELDS = ("adaptive_interval", "adaptive_empty_streak")
+
+
+def current_interval(target: Dict) -> int:
+    """
+    目标当前的轮询间隔（分钟）：已有自适应状态时用它，否则从配置的间隔开始
+
+    请求预算规划分配了每日轮询次数（budget_polls）时，间隔不小于 1440 / budget_polls
+    """
+    settings = get_settings()
+    minutes = target.get("adaptive_interval") or target.get("freq_minutes") or settings.adaptive_initial_minutes
+    floor = settings.adaptive_min_minutes
+    if target.get("budget_polls"):
+        floor = max(floor, 1440.0 / int(target["budget_polls"]))
+    return int(min(max(float(minutes), floor), max(settings.adaptive_max_minutes, floor)))
+
+
+def next_interval(interval: float, empty_streak: int, new_count: int) -> Tuple[int, int]:
+    """
+    根据本次轮询的新文章数计算下一次间隔
+
+    - 有新文章：清零连续空轮询次数，间隔乘以 adaptive_shrink_factor
+    - 无新文章：连续空轮询达到 adaptive_empty_threshold 次后，每次间隔乘以 adaptive_backoff_factor
+    间隔始终限制在 [adaptive_min_minutes, adaptive_max_minutes]
+
+    Returns:
+        (新间隔分钟数, 新的连续空轮询次数)
+    """
+    settings = get_settings()
+    if new_count > 0:
+        empty_streak = 0
+        interval *= settings.adaptive_shrink_factor
+    else:
+        empty_streak += 1
+        if empty_streak >= settings.adaptive_empty_threshold:
+            interval *= settings.adaptive_backoff_factor
+    interval = min(max(interval, settings.adaptive_min_minutes), settings.adaptive_max_minutes)
+    return int(round(interval)), empty_streak
+
+
+def record_poll(target: Dict, new_count: int):
+    """成功爬取后更新目标文档上的自适应状态（失败的爬取不计入）"""
+    interval, streak = next_interval(current_interval(target), int(target.get("adaptive_empty_streak") or 0),
+                                     new_count)
+    avg_yield = float(target.get("adaptive_yield") or 0.0)
+    avg_yield += YIELD_ALPHA * (new_count - avg_yield)
+    try:
+        get_db()["targets"].update_one(
+            {"_id": target["_id"]},
+            {
+                "$set": {
+                    "adaptive_interval": interval,
+                    "adaptive_empty_streak": streak,
+                    "adaptive_yield": round(avg_yield, 3),
+                },
+                "$inc": {"adaptive_polls": 1},
+            },
+        )
+    except Exception:
+        logging.exception("Failed to update adaptive interval for target=%s", target.get("_id"))
+        return
+    if interval != target.get("adaptive_interval"):
+        logging.info("Adaptive interval for %s: %s -> %s min (new=%s, empty streak=%s)",
+                     target.get("name"), target.get("adaptive_interval"), interval, new_count, streak)
@@ -0,0 +1,211 @@
+"""
+文章计数器：按天维护的文章篇数，文章列表接口用它回答常见筛选条件下的总数
+
+    python -m crawler.article_counters   # 从 articles 全量重建计数器
+
+article_counters 集合：
+    {_id: "<dim>:<key>:<YYYY-MM-DD>", dim, key, day: 当天零点（UTC）, count}
+    dim 为 all（key 为空）/ mp（公众号名称）/ target（目标 id），day 为文章 publish_at 所在的 UTC 日期。
+    按分类统计时对分类下各目标的 target 计数求和（目标改分类后无需迁移计数）。
+    {_id: "meta", since: 重建开始时间, ready: 是否已完成重建}
+
+文章入库后紧接着以 $inc 更新计数（standalone MongoDB 不支持多文档事务）；
+重建期间入库的文章按 created_at 与 since 比较，只由增量或重建中的一方计入。
+"""
+
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from backend.db import get_db
+
+COUNTER_COLLECTION = "article_counters"
+META_ID = "meta"
+DIM_ALL = "all"
+DIM_MP = "mp"
+DIM_TARGET = "target"
+# 重建时等待已创建但尚未写入的文章落库的秒数
+REBUILD_SETTLE_SECONDS = 5
+
+
+def _day(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """带时区的时间转为 UTC naive（与库中 publish_at 一致）"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _counter_id(dim: str, key: str, day: datetime) -> str:
+    return f"{dim}:{key}:{day:%Y-%m-%d}"
+
+
+def _inc_ops(counts: Dict) -> List[UpdateOne]:
+    return [
+        UpdateOne({"_id": _counter_id(dim, key, day)},
+                  {"$inc": {"count": n}, "$setOnInsert": {"dim": dim, "key": key, "day": day}},
+                  upsert=True)
+        for (dim, key, day), n in counts.items()
+    ]
+
+
+def load_meta() -> Dict:
+    return get_db()[COUNTER_COLLECTION].find_one({"_id": META_ID}) or {}
+
+
+def is_ready() -> bool:
+    return bool(load_meta().get("ready"))
+
+
+def needs_rebuild(stale_after: float = 3600.0) -> bool:
+    """从未重建过，或上次重建开始后超过 stale_after 秒仍未完成（进程中途退出）"""
+    meta = load_meta()
+    if meta.get("ready"):
+        return False
+    since = meta.get("since")
+    return since is None or (datetime.utcnow() - since).total_seconds() > stale_after
+
+
+def record_articles(articles: Iterable[Dict], meta: Optional[Dict] = None):
+    """
+    新文章入库后增量更新计数（计数器从未重建过时不更新，重建时会全部计入）
+
+    meta 为调用方已读取的 load_meta()（一次爬取的各页共用），不传时重新读取。
+    """
+    if meta is None:
+        meta = load_meta()
+    if not meta:
+        return
+    since = meta.get("since")
+    counts = defaultdict(int)
+    for art in articles:
+        publish_at = art.get("publish_at")
+        if not isinstance(publish_at, datetime):
+            continue
+        if not meta.get("ready") and since and art.get("created_at") and art["created_at"] < since:
+            # 重建开始前创建的文章由重建计入
+            continue
+        day = _day(publish_at)
+        counts[(DIM_ALL, "", day)] += 1
+        if art.get("mp_name"):
+            counts[(DIM_MP, art["mp_name"], day)] += 1
+        if art.get("target_id"):
+            counts[(DIM_TARGET, str(art["target_id"]), day)] += 1
+    if not counts:
+        return
+    try:
+        get_db()[COUNTER_COLLECTION].bulk_write(_inc_ops(counts), ordered=False)
+    except Exception:
+        logging.exception("Failed to update article counters")
+
+
+def rebuild():
+    """
+    从 articles 全量重建计数器（一次按 目标/公众号/天 分组的聚合）
+
+    重建期间接口回退为直接计数；since 之后创建的文章由增量更新计入，之前的由本次聚合计入。
+    """
+    db = get_db()
+    collection = db[COUNTER_COLLECTION]
+    collection.delete_many({})
+    since = datetime.utcnow()
+    collection.insert_one({"_id": META_ID, "since": since, "ready": False})
+    time.sleep(REBUILD_SETTLE_SECONDS)
+    started = time.monotonic()
+
+    pipeline = [
+        {"$match": {"publish_at": {"$type": "date"},
+                    "$or": [{"created_at": {"$lt": since}}, {"created_at": {"$exists": False}}]}},
+        {"$group": {
+            "_id": {
+                "target_id": "$target_id",
+                "mp_name": "$mp_name",
+                "day": {"$dateTrunc": {"date": "$publish_at", "unit": "day"}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+    counts = defaultdict(int)
+    for row in db["articles"].aggregate(pipeline, allowDiskUse=True):
+        key = row["_id"]
+        day = key["day"]
+        counts[(DIM_ALL, "", day)] += row["count"]
+        if key.get("mp_name"):
+            counts[(DIM_MP, key["mp_name"], day)] += row["count"]
+        if key.get("target_id"):
+            counts[(DIM_TARGET, str(key["target_id"]), day)] += row["count"]
+    ops = _inc_ops(counts)
+    for i in range(0, len(ops), 1000):
+        collection.bulk_write(ops[i:i + 1000], ordered=False)
+    collection.update_one({"_id": META_ID}, {"$set": {"ready": True, "rebuilt_at": datetime.utcnow()}})
+    logging.info("Rebuilt %d article counters in %.1fs", len(ops), time.monotonic() - started)
+
+
+def count_articles(mp_name: Optional[str] = None, target_ids: Optional[List] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[int]:
+    """
+    用计数器计算文章总数（publish_at 在 [start, end] 内），mp_name 和 target_ids 最多指定一个
+
+    整天的部分对计数器求和，start/end 不在零点时首尾不足一天的部分直接计数（按 publish_at 索引只扫描一天）。
+
+    Returns:
+        总数；计数器未就绪或筛选条件无法由计数器回答时返回 None
+    """
+    if mp_name and target_ids is not None:
+        return None
+    if not is_ready():
+        return None
+    if mp_name:
+        match = {"dim": DIM_MP, "key": mp_name}
+        article_filter = {"mp_name": mp_name}
+    elif target_ids is not None:
+        match = {"dim": DIM_TARGET, "key": {"$in": [str(tid) for tid in target_ids]}}
+        article_filter = {"target_id": {"$in": list(target_ids)}}
+    else:
+        match = {"dim": DIM_ALL, "key": ""}
+        article_filter = {}
+
+    db = get_db()
+    start, end = _naive_utc(start), _naive_utc(end)
+    first_day = None if start is None else (start if start == _day(start) else _day(start) + timedelta(days=1))
+    last_day = None if end is None else _day(end)  # 不含：当天的部分单独计数
+    if first_day is not None and last_day is not None and first_day > last_day:
+        # 范围在同一天内
+        return db["articles"].count_documents(dict(article_filter, publish_at={"$gte": start, "$lte": end}))
+
+    total = 0
+    if first_day is not None and start < first_day:
+        total += db["articles"].count_documents(dict(article_filter, publish_at={"$gte": start, "$lt": first_day}))
+    if last_day is not None:
+        total += db["articles"].count_documents(dict(article_filter, publish_at={"$gte": last_day, "$lte": end}))
+    day_range = {}
+    if first_day is not None:
+        day_range["$gte"] = first_day
+    if last_day is not None:
+        day_range["$lt"] = last_day
+    if day_range:
+        match["day"] = day_range
+    pipeline = [{"$match": match}, {"$group": {"_id": None, "n": {"$sum": "$count"}}}]
+    for row in db[COUNTER_COLLECTION].aggregate(pipeline):
+        total += row["n"]
+    return total
+
+
+def main():
+    from crawler.worker import create_worker_app
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_worker_app()
+    with app.app_context():
+        rebuild()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+文章上冗余的目标信息：分类（category）和头像引用（mp_avatar），列表接口读文章时不再关联 targets
+
+    python -m crawler.article_refs   # 把所有目标的分类和头像引用同步到文章
+
+头像在 targets 上以 base64 保存，文章上只写入带版本号和签名的图片地址 /api/targets/<id>/avatar?v=<摘要>&s=<签名>，
+头像变化后地址随之变化，浏览器可以长期缓存。<img> 无法携带登录令牌，图片接口按签名校验：
+只有通过已登录的接口拿到地址的人才能加载，不能按目标 id 枚举。
+
+文章入库时写入当时的分类和头像引用；目标的分类或头像变化时写入方在同一次更新中设置 refs_updated_at，
+主节点的后台任务把变化同步到该目标的所有文章（头像同时更新 mp_stats 汇总）。变化前已开始的爬取可能在同步之后写入旧值，
+因此变化后的 settle 时间内每一轮都重新检查该目标的文章，之后才清除 refs_updated_at。
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from backend.db import get_db
+from backend.security import sign, verify_signature
+from crawler import mp_stats
+
+UPDATED_FIELD = "refs_updated_at"
+AVATAR_PATH = "/api/targets/{id}/avatar"
+# 冗余字段的格式版本：格式变化（如头像地址加上签名）时加一，启动时重新同步所有目标
+REFS_VERSION = 2
+META_COLLECTION = "article_refs_meta"
+META_ID = "refs"
+
+
+def avatar_ref(target: Dict) -> Optional[str]:
+    """目标头像的引用地址（没有头像时为 None）"""
+    avatar = target.get("mp_avatar")
+    if not avatar:
+        return None
+    version = hashlib.sha1(avatar.encode()).hexdigest()[:10]
+    return f"{AVATAR_PATH.format(id=target['_id'])}?v={version}&s={sign(_signed_value(target['_id'], version))}"
+
+
+def _signed_value(target_id, version: str) -> str:
+    return f"avatar:{target_id}:{version}"
+
+
+def verify_avatar_ref(target_id, version: Optional[str], signature: Optional[str]) -> bool:
+    """校验头像地址中的签名"""
+    return bool(version) and verify_signature(_signed_value(target_id, version), signature)
+
+
+def target_refs(target: Dict) -> Dict:
+    """写到文章上的目标信息"""
+    return {"category": target.get("category"), "mp_avatar": avatar_ref(target)}
+
+
+def mark_changed(update: Dict, current: Dict) -> Dict:
+    """目标的 $set 改变了分类或头像（与 current 中已保存的值不同）时附加变更标记，与变更写在同一次更新中"""
+    if any(key in update and update[key] != current.get(key) for key in ("category", "mp_avatar")):
+        update[UPDATED_FIELD] = datetime.utcnow()
+    return update
+
+
+def sync_target(target: Dict) -> int:
+    """把目标当前的分类和头像引用写到它的文章上，返回更新的篇数"""
+    refs = target_refs(target)
+    stale = [{key: {"$ne": value}} for key, value in refs.items()]
+    # 字段不存在时 {$ne: None} 不匹配（缺失视为 null），升级前的文章单独匹配
+    stale.append({"category": {"$exists": False}})
+    result = get_db()["articles"].update_many({"target_id": target["_id"], "$or": stale}, {"$set": refs})
+    mp_stats.set_avatar(target["_id"], refs["mp_avatar"])
+    return result.modified_count
+
+
+def propagate(settle_minutes: float = 30.0) -> int:
+    """同步所有有变更标记的目标，超过 settle 时间的标记在同步后清除；返回更新的文章篇数"""
+    targets = get_db()["targets"]
+    settled_before = datetime.utcnow() - timedelta(minutes=settle_minutes)
+    total = 0
+    for target in targets.find({UPDATED_FIELD: {"$ne": None}},
+                               {"category": 1, "mp_avatar": 1, "name": 1, UPDATED_FIELD: 1}):
+        modified = sync_target(target)
+        if modified:
+            logging.info("Propagated category/avatar of target %s to %d articles", target.get("name"), modified)
+        total += modified
+        if target[UPDATED_FIELD] < settled_before:
+            # 条件更新：同步期间目标又有变化时保留标记
+            targets.update_one({"_id": target["_id"], UPDATED_FIELD: target[UPDATED_FIELD]},
+                               {"$unset": {UPDATED_FIELD: ""}})
+    return total
+
+
+def needs_backfill() -> bool:
+    """文章上的冗余字段还没有按当前格式版本同步过（升级前入库的文章没有冗余字段，或头像地址没有签名）"""
+    meta = get_db()[META_COLLECTION].find_one({"_id": META_ID}) or {}
+    return meta.get("version") != REFS_VERSION
+
+
+def mark_all_changed():
+    """为所有目标设置变更标记，由后台任务把分类和头像同步到全部文章，并记录当前格式版本"""
+    db = get_db()
+    db["targets"].update_many({UPDATED_FIELD: None}, {"$set": {UPDATED_FIELD: datetime.utcnow()}})
+    db[META_COLLECTION].update_one({"_id": META_ID}, {"$set": {"version": REFS_VERSION}}, upsert=True)
+
+
+def main():
+    from crawler.worker import create_worker_app
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_worker_app()
+    with app.app_context():
+        total = 0
+        for target in get_db()["targets"].find({}, {"category": 1, "mp_avatar": 1}):
+            total += sync_target(target)
+        logging.info("Synced category/avatar to %d articles", total)
+
+
+if __name__ == "__main__":
+    main()
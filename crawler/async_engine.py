@@ -0,0 +1,376 @@
+import asyncio
+import logging
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:  # 未安装 aiohttp 时只能使用线程池引擎
+    aiohttp = None
+
+from flask import Flask
+
+from backend.config import get_settings
+from crawler.account_pool import get_account_pool
+from crawler.crawl_queue import CrawlQueue
+from crawler.tasks import (
+    STEP_AVATAR,
+    STEP_CALL,
+    STEP_FETCH,
+    STEP_RESOLVE,
+    _absolute_avatar_url,
+    _crawl_steps,
+    _encode_avatar,
+    _save_page,
+)
+from utils.cooldown import AUTH_EXPIRED_RETS, FREQ_CONTROL_RET, AuthExpiredError, FreqControlError, get_cooldowns
+from utils.getAllUrls import LIST_URL, ArticleRecord, HighWaterMark, list_params, parse_list_page
+from utils.getFakId import SEARCH_URL, parse_biz_list, search_params
+from utils.http_client import notify_request
+from utils.profile_cache import get_profile_cache
+
+# 不设置频率限制冷却 key 时，遇到频率限制原地等待的秒数（与同步实现一致）
+FREQ_CONTROL_WAIT = 60
+
+
+class AsyncCrawlEngine:
+    """
+    asyncio 爬取引擎
+
+    在独立线程中运行一个事件循环，从爬取队列（CrawlQueue）取出目标作为协程并发执行，
+    HTTP 请求使用 aiohttp 共享连接池，MongoDB 读写和爬取日志通过 asyncio.to_thread 放到线程中执行。
+    并发受全局信号量和单账号信号量限制，每个账号的请求仍从共享令牌桶取令牌。
+
+    调度相关的准备/收尾逻辑由调度器通过回调传入，与线程池引擎共用：
+        prepare(target_id) -> (target, account) 或 None（目标不存在、已改期等）
+        complete(target, account, error_type)
+        defer(target_id, account, exc)  # FreqControlError
+        fail(target_id, exc)
+    """
+
+    def __init__(self, app: Flask, queue: CrawlQueue, prepare: Callable, complete: Callable, defer: Callable,
+                 fail: Callable, max_concurrency: int = 200, per_account_concurrency: int = 2):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the async crawl engine")
+        self._app = app
+        self._queue = queue
+        self._prepare = prepare
+        self._complete = complete
+        self._defer = defer
+        self._fail = fail
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.per_account_concurrency = max(1, int(per_account_concurrency))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session = None
+        self._global_sem: Optional[asyncio.Semaphore] = None
+        self._account_sems: Dict[str, asyncio.Semaphore] = {}
+        self._running: Dict[str, asyncio.Future] = {}
+        self._ready = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_loop, name="crawl-async", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        logging.info("Async crawl engine started (max_concurrency=%s, per_account=%s)",
+                     self.max_concurrency, self.per_account_concurrency)
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._open())
+        finally:
+            self._ready.set()
+        consumer = self._loop.create_task(self._consume())
+        try:
+            self._loop.run_forever()
+        finally:
+            consumer.cancel()
+            self._loop.run_until_complete(self._session.close())
+            self._loop.close()
+
+    async def _open(self):
+        # aiohttp 的连接池和信号量需要在事件循环内创建
+        self._global_sem = asyncio.Semaphore(self.max_concurrency)
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency))
+
+    def stop(self, timeout: float = 30.0):
+        """停止引擎（调用前先关闭队列），等待正在执行的爬取结束（最多 timeout 秒）"""
+        if self._loop is None or self._thread is None:
+            return
+        pending = list(self._running.values())
+        if pending:
+            done = asyncio.run_coroutine_threadsafe(asyncio.wait(pending, timeout=timeout), self._loop)
+            try:
+                done.result(timeout + 1)
+            except Exception:
+                logging.warning("Async crawl engine stopped with %d crawls still running", len(self._running))
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    async def _consume(self):
+        """有空闲并发名额时才从队列取目标，队列满时由队列拒绝新的触发"""
+        while True:
+            await self._global_sem.acquire()
+            target_id = await asyncio.to_thread(self._queue.get)
+            if target_id is None:
+                # 队列已关闭
+                self._global_sem.release()
+                return
+            task = self._loop.create_task(self._run_target(target_id))
+            self._running[target_id] = task
+            task.add_done_callback(lambda _, tid=target_id: self._running.pop(tid, None))
+
+    def _account_sem(self, account: Optional[Dict]) -> asyncio.Semaphore:
+        key = str(account["_id"]) if account else ""
+        sem = self._account_sems.get(key)
+        if sem is None:
+            sem = self._account_sems[key] = asyncio.Semaphore(self.per_account_concurrency)
+        return sem
+
+    async def _run_target(self, target_id: str):
+        try:
+            # to_thread 会复制当前上下文，线程中的 get_db() 同样可用
+            with self._app.app_context():
+                prepared = await asyncio.to_thread(self._prepare, target_id)
+                if prepared is None:
+                    return
+                target, account = prepared
+                try:
+                    logging.info("Starting async crawl for target %s", target_id)
+                    async with self._account_sem(account):
+                        if account:
+                            with get_account_pool().use(account):
+                                error_type = await async_run_crawl(self._session, target, account)
+                        else:
+                            error_type = await async_run_crawl(self._session, target, account)
+                    await asyncio.to_thread(self._complete, target, account, error_type)
+                except FreqControlError as exc:
+                    await asyncio.to_thread(self._defer, target_id, account, exc)
+                except Exception as exc:
+                    await asyncio.to_thread(self._fail, target_id, exc)
+        finally:
+            self._queue.done(target_id)
+            self._global_sem.release()
+
+    def snapshot(self) -> Dict:
+        return {"running": len(self._running), "max_concurrency": self.max_concurrency}
+
+
+async def async_run_crawl(session, target: Dict, account: Optional[Dict], page_num: int = None) -> Optional[str]:
+    """
+    run_crawl 的 asyncio 版本：执行同一个 tasks._crawl_steps 流程，返回值相同
+
+    HTTP 请求用 aiohttp，数据库读写和日志写入放到线程中执行，不阻塞事件循环。
+    频率限制时同样抛出 FreqControlError，由调用方改期。
+    """
+    steps = _crawl_steps(target, account, page_num)
+    result, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = await _async_run_step(session, target, step), None
+        except Exception as exc:
+            result, error = None, exc
+
+
+async def _async_run_step(session, target: Dict, step: Tuple):
+    """在事件循环中执行 _crawl_steps 产出的一个步骤"""
+    kind, args = step[0], step[1:]
+    if kind == STEP_CALL:
+        return await asyncio.to_thread(args[0])
+    if kind == STEP_RESOLVE:
+        headers, token, mp_name, account_key, limiter, refresh = args
+        return await async_resolve_fakid(session, headers, token, mp_name, limiter, account_key, refresh=refresh)
+    if kind == STEP_FETCH:
+        fakeid, token, headers, page_num, high_water, account_key, limiter = args
+        return await _async_fetch_and_save(session, target, fakeid, token, headers, page_num, high_water, limiter,
+                                           account_key)
+    if kind == STEP_AVATAR:
+        return await async_download_avatar(session, *args)
+    raise ValueError(f"unknown crawl step: {kind}")
+
+
+async def _async_fetch_and_save(session, target: Dict, fakeid: str, token: str, headers: Dict, page_num: int,
+                                high_water: Optional[HighWaterMark], limiter,
+                                account_key: str) -> Tuple[int, int, Optional[Dict]]:
+    """逐页拉取文章列表并写入数据库，返回值同 tasks._fetch_and_save"""
+    fetched = 0
+    inserted = 0
+    newest = None
+    metas: Dict = {}
+    async for records in async_iter_url_pages(session, page_num, 0, fakeid, token, headers, stop_at=high_water,
+                                              limiter=limiter, cooldown_key=account_key):
+        page_inserted, page_newest = await asyncio.to_thread(_save_page, target, records, metas)
+        inserted += page_inserted
+        fetched += len(records)
+        if newest is None or page_newest["publish_at"] > newest["publish_at"]:
+            newest = page_newest
+    return fetched, inserted, newest
+
+
+async def _acquire(limiter, delay_range: Tuple[float, float]):
+    """从令牌桶预约令牌后异步等待，不占用线程；没有令牌桶时随机延时"""
+    if limiter is not None:
+        # 多进程共享的令牌桶预约时读写 MongoDB，放到线程中执行
+        wait = await asyncio.to_thread(limiter.reserve)
+    else:
+        wait = random.uniform(*delay_range)
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+async def _get_json(session, url: str, headers: Dict, params: Dict, timeout: float, account_key=None) -> Dict:
+    # 不经过 http_get，自行通知请求回调（每日请求计数）
+    notify_request(account_key, url)
+    async with session.get(url, headers=headers, params=params,
+                           timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
+
+
+async def async_iter_url_pages(session, page_num: int, start_page: int, fad: str, tok: str, headers: Dict,
+                               stop_at: Optional[HighWaterMark] = None, limiter=None, cooldown_key=None):
+    """utils.getAllUrls.iterAllUrlPages 的 asyncio 版本，逐页产出 ArticleRecord 列表"""
+    settings = get_settings()
+    delay_range = (settings.request_min_delay, settings.request_max_delay)
+    retries = max(1, settings.request_retries)
+    for i in range(page_num):
+        params = {k: str(v) for k, v in list_params(start_page + i * 5, fad, tok).items()}
+        if cooldown_key is not None:
+            await asyncio.to_thread(get_cooldowns().check, cooldown_key)
+        await _acquire(limiter, delay_range)
+        dic = None
+        for attempt in range(retries):
+            try:
+                dic = await _get_json(session, LIST_URL, headers, params, settings.request_timeout,
+                                       account_key=cooldown_key)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+                logging.warning("request page %s failed: %s", i, exc)
+                if attempt < retries - 1:
+                    await _acquire(limiter, delay_range)
+        if dic is None:
+            break
+        base_ret = dic.get("base_resp", {}).get("ret")
+        if base_ret not in (0, None):
+            if base_ret in AUTH_EXPIRED_RETS:
+                raise AuthExpiredError(base_ret, dic.get("base_resp", {}).get("err_msg", ""))
+            if base_ret == FREQ_CONTROL_RET:
+                if cooldown_key is not None:
+                    retry_after = await asyncio.to_thread(get_cooldowns().trip, cooldown_key)
+                    logging.warning("wechat returned freq control on page %s, account cooling down %.0fs",
+                                    i, retry_after)
+                    raise FreqControlError(cooldown_key, retry_after)
+                await asyncio.sleep(FREQ_CONTROL_WAIT)
+                continue
+            logging.warning("wechat returned error ret=%s, msg=%s", base_ret,
+                            dic.get("base_resp", {}).get("err_msg", "未知错误"))
+            break
+        if cooldown_key is not None:
+            await asyncio.to_thread(get_cooldowns().record_success, cooldown_key)
+        msg_list = dic.get("app_msg_list") or []
+        records: List[ArticleRecord] = parse_list_page(msg_list, i, stop_at)
+        if stop_at is not None and not msg_list:
+            stop_at.exhausted = True
+        if records:
+            yield records
+        if (stop_at is not None and stop_at.reached) or not msg_list:
+            break
+
+
+async def async_search_biz(session, headers: Dict, tok: str, query: str, limiter=None,
+                           cooldown_key=None) -> Optional[List[Dict]]:
+    """utils.getFakId.search_biz 的 asyncio 版本；接口出错返回 None，登录态失效抛出 AuthExpiredError"""
+    settings = get_settings()
+    if cooldown_key is not None:
+        await asyncio.to_thread(get_cooldowns().check, cooldown_key)
+    await _acquire(limiter, (settings.request_min_delay, settings.request_max_delay))
+    params = {k: str(v) for k, v in search_params(query, tok).items()}
+    # 网络错误向上抛出（与线程池引擎的 search_biz 一致），不当作凭证失效
+    dic = await _get_json(session, SEARCH_URL, headers, params, settings.request_timeout, account_key=cooldown_key)
+    base_ret = dic.get("base_resp", {}).get("ret")
+    if dic.get("ret") in AUTH_EXPIRED_RETS or base_ret in AUTH_EXPIRED_RETS:
+        raise AuthExpiredError(dic.get("ret") or base_ret, dic.get("base_resp", {}).get("err_msg", ""))
+    ret = dic.get("ret", 0)
+    if ret != 0:
+        if ret == FREQ_CONTROL_RET and cooldown_key is not None:
+            retry_after = await asyncio.to_thread(get_cooldowns().trip, cooldown_key)
+            logging.warning("wechat returned freq control (ret=%s), account cooling down %.0fs", ret, retry_after)
+            raise FreqControlError(cooldown_key, retry_after)
+        logging.warning("wechat returned error ret=%s, msg=%s", ret, dic.get("errmsg", "未知错误"))
+        return None
+    if cooldown_key is not None:
+        await asyncio.to_thread(get_cooldowns().record_success, cooldown_key)
+    if "list" not in dic:
+        logging.warning("wechat response missing 'list' field: %s", dic)
+        return None
+    return parse_biz_list(dic["list"])
+
+
+async def async_resolve_fakid(session, headers: Dict, tok: str, query: str, limiter=None, cooldown_key=None,
+                              refresh: bool = False) -> Optional[List[Dict]]:
+    """
+    带缓存的 async_search_biz，返回值同 utils.profile_cache.resolve_fakid（接口出错返回 None）
+
+    与线程池引擎共用同一个资料缓存；事件循环内的并发解析不做请求合并。
+    """
+    cache = get_profile_cache()
+    if refresh:
+        cache.invalidate(query)
+    else:
+        hit, profile = cache.get(query)
+        if hit:
+            return [dict(profile)] if profile else []
+    results = await async_search_biz(session, headers, tok, query, limiter=limiter, cooldown_key=cooldown_key)
+    profile = cache.store(query, results)
+    if results is None:
+        return None
+    return [dict(profile)] if profile else []
+
+
+async def async_download_avatar(session, avatar_url: str, headers: Dict, thumbnail: bool = True) -> Optional[str]:
+    """tasks._download_avatar_as_base64 的 asyncio 版本，图片处理放到线程中执行"""
+    avatar_url = _absolute_avatar_url(avatar_url)
+    try:
+        async with session.get(avatar_url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get("Content-Type", "").lower()
+            if not content_type.startswith("image/"):
+                logging.warning("Avatar URL does not return an image: %s", avatar_url)
+                return None
+            data = await resp.read()
+        return await asyncio.to_thread(_encode_avatar, data, content_type, thumbnail)
+    except Exception as exc:
+        logging.warning("Failed to download avatar from %s: %s", avatar_url, exc)
+        return None
+
+
+_engine: Optional[AsyncCrawlEngine] = None
+
+
+def start_async_engine(app: Flask, **kwargs) -> AsyncCrawlEngine:
+    global _engine
+    if _engine is None:
+        _engine = AsyncCrawlEngine(app, **kwargs)
+        _engine.start()
+    return _engine
+
+
+def stop_async_engine():
+    global _engine
+    if _engine is not None:
+        _engine.stop()
+        _engine = None
+
+
+def get_async_engine() -> Optional[AsyncCrawlEngine]:
+    return _engine
@@ -0,0 +1,105 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+
+from backend.config import get_settings
+from backend.db import get_db
+
+# 熔断状态（保存在 mp_accounts 文档上，多进程共享，更新凭证时清除）
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 判定为账号凭证失效的错误类型：账号缺少 token/cookie、搜索接口出错、微信返回登录态失效。
+# 搜索无结果、目标缺少名称等只与单个目标有关的失败不计入，否则几个配置错误的目标就会熔断整个账号
+AUTH_ERROR_TYPES = {"missing_credentials", "search_failed", "auth_expired"}
+
+# 熔断打开、被拒绝的爬取（没有实际执行，不计入账号结果和 last_run_at）
+CIRCUIT_OPEN = "circuit_open"
+
+# before_crawl 的结果
+ALLOW = "allow"
+PROBE = "probe"
+REJECT = "reject"
+
+BREAKER_FIELDS = ("breaker_state", "breaker_failures", "breaker_opened_at")
+
+
+def before_crawl(account: Dict) -> str:
+    """
+    爬取前检查账号熔断状态
+
+    - 关闭：放行
+    - 打开且未到探测时间：拒绝
+    - 打开且已到探测时间：原子地切换为半开，仅放行一次探测爬取
+    """
+    state = account.get("breaker_state") or STATE_CLOSED
+    if state == STATE_CLOSED:
+        return ALLOW
+    settings = get_settings()
+    now = datetime.utcnow()
+    probe_before = now - timedelta(seconds=settings.breaker_probe_interval)
+    # 半开状态下探测超时（进程退出等）也允许重新探测
+    result = get_db()["mp_accounts"].update_one(
+        {
+            "_id": account["_id"],
+            "breaker_state": {"$in": [STATE_OPEN, STATE_HALF_OPEN]},
+            "breaker_opened_at": {"$lte": probe_before},
+        },
+        {"$set": {"breaker_state": STATE_HALF_OPEN, "breaker_opened_at": now}},
+    )
+    if result.modified_count:
+        logging.info("Circuit breaker half-open for account=%s, probing", account.get("name"))
+        return PROBE
+    return REJECT
+
+
+def after_crawl(account: Dict, error_type: Optional[str]):
+    """记录爬取结果：成功关闭熔断，连续凭证类失败达到阈值打开熔断"""
+    col = get_db()["mp_accounts"]
+    try:
+        if error_type not in AUTH_ERROR_TYPES:
+            if account.get("breaker_failures") or (account.get("breaker_state") or STATE_CLOSED) != STATE_CLOSED:
+                col.update_one({"_id": account["_id"]}, {"$unset": {f: "" for f in BREAKER_FIELDS}})
+                logging.info("Circuit breaker closed for account=%s", account.get("name"))
+            return
+
+        threshold = get_settings().breaker_threshold
+        doc = col.find_one_and_update(
+            {"_id": account["_id"]},
+            {"$inc": {"breaker_failures": 1}},
+            projection={"breaker_failures": 1, "breaker_state": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not doc:
+            return
+        if doc.get("breaker_state") == STATE_HALF_OPEN or doc.get("breaker_failures", 0) >= threshold:
+            col.update_one(
+                {"_id": account["_id"]},
+                {"$set": {"breaker_state": STATE_OPEN, "breaker_opened_at": datetime.utcnow()}},
+            )
+            logging.warning("Circuit breaker open for account=%s after %s auth failures",
+                            account.get("name"), doc.get("breaker_failures"))
+    except Exception:
+        logging.exception("Failed to update circuit breaker for account=%s", account.get("_id"))
+
+
+def is_open(account: Dict) -> bool:
+    return (account.get("breaker_state") or STATE_CLOSED) != STATE_CLOSED
+
+
+def probe_due(account: Dict) -> bool:
+    """熔断未关闭且已到探测时间（before_crawl 会放行一次探测爬取）；account 需包含 breaker_opened_at"""
+    if not is_open(account):
+        return False
+    opened_at = account.get("breaker_opened_at")
+    if opened_at is None:
+        return False
+    return datetime.utcnow() - opened_at >= timedelta(seconds=get_settings().breaker_probe_interval)
+
+
+def reset_update() -> Dict:
+    """更新凭证时附加到 mp_accounts 更新中的 $unset，关闭熔断"""
+    return {f: "" for f in BREAKER_FIELDS}
@@ -0,0 +1,255 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 优先级（数值越小越先执行）
+PRIORITY_MANUAL = 0      # 手动触发（/api/targets/<id>/run）
+PRIORITY_SCHEDULED = 10  # 定时任务、补执行、改期
+
+# put 的结果
+QUEUED = "queued"      # 新加入队列
+MERGED = "merged"      # 已在队列中等待，与之合并（必要时提升优先级）
+RUNNING = "running"    # 正在爬取，忽略本次触发
+REJECTED = "rejected"  # 队列已满
+CLOSED = "closed"      # 队列已关闭（进程退出中）
+
+
+class CrawlQueue:
+    """
+    去重的优先级爬取队列
+
+    同一目标在队列中最多只有一项：重复触发与等待中的项合并，手动触发会把等待中的
+    定时项提升为手动优先级；正在爬取的目标再次触发时直接忽略。
+    队列长度有上限，满时拒绝新的触发并计数，便于通过接口观察积压。
+    """
+
+    def __init__(self, max_depth: int = 1000):
+        self.max_depth = max(1, int(max_depth))
+        self._heap = []                     # (priority, seq, target_id)
+        self._pending: Dict[str, tuple] = {}  # target_id -> 当前有效的堆项
+        self._in_flight: Dict[str, int] = {}  # target_id -> priority
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.merged = 0
+        self.rejected = 0
+
+    def put(self, target_id: str, priority: int = PRIORITY_SCHEDULED) -> str:
+        with self._cond:
+            if self._closed:
+                return CLOSED
+            if target_id in self._in_flight:
+                self.merged += 1
+                return RUNNING
+            entry = self._pending.get(target_id)
+            if entry is not None:
+                self.merged += 1
+                if priority < entry[0]:
+                    # 提升优先级：压入新项，旧项出堆时因与 _pending 不一致被丢弃
+                    entry = (priority, next(self._seq), target_id)
+                    self._pending[target_id] = entry
+                    heapq.heappush(self._heap, entry)
+                    self._cond.notify()
+                return MERGED
+            if len(self._pending) >= self.max_depth:
+                self.rejected += 1
+                logging.warning("Crawl queue full (%d pending), rejected target %s", len(self._pending), target_id)
+                return REJECTED
+            entry = (priority, next(self._seq), target_id)
+            self._pending[target_id] = entry
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+            return QUEUED
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        取出优先级最高的目标并标记为正在爬取（阻塞直到有目标）
+
+        Returns:
+            target_id；队列关闭或等待超时返回 None
+        """
+        with self._cond:
+            while True:
+                while self._heap:
+                    entry = heapq.heappop(self._heap)
+                    target_id = entry[2]
+                    if self._pending.get(target_id) is not entry:
+                        continue
+                    del self._pending[target_id]
+                    self._in_flight[target_id] = entry[0]
+                    return target_id
+                if self._closed:
+                    return None
+                if not self._cond.wait(timeout):
+                    return None
+
+    def done(self, target_id: str):
+        """目标爬取结束（无论成功失败）"""
+        with self._cond:
+            self._in_flight.pop(target_id, None)
+
+    def close(self):
+        """关闭队列：丢弃等待中的目标，唤醒所有等待的消费者"""
+        with self._cond:
+            self._closed = True
+            if self._pending:
+                logging.info("Crawl queue closed, dropped %d pending targets", len(self._pending))
+            self._pending.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+
+    def reopen(self):
+        """重新接受目标（进程重新成为调度主节点时）"""
+        with self._cond:
+            self._closed = False
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            manual = sum(1 for p, _, _ in self._pending.values() if p <= PRIORITY_MANUAL)
+            return {
+                "pending": len(self._pending),
+                "pending_manual": manual,
+                "in_flight": sorted(self._in_flight),
+                "max_depth": self.max_depth,
+                "merged": self.merged,
+                "rejected": self.rejected,
+            }
+
+
+class StaggeredFeeder:
+    """
+    按计划的延迟把目标逐个交给 trigger（通常是 scheduler.trigger_target）
+
+    同一时间点触发的大批目标不再同时进入爬取队列，而是分散在一个时间窗口内，
+    队列长度也不会因为一个时间点的目标过多而被瞬间占满。
+    """
+
+    def __init__(self, trigger: Callable[[str], object]):
+        self._trigger = trigger
+        self._heap: List[Tuple[float, int, str]] = []  # (到期时间, seq, target_id)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="crawl-feeder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止投放，未到期的目标被丢弃（下一个时间点会重新触发）"""
+        with self._cond:
+            self._closed = True
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def schedule(self, plan: Iterable[Tuple[float, str]]):
+        """plan: [(延迟秒数, target_id), ...]"""
+        now = time.monotonic()
+        with self._cond:
+            for delay, target_id in plan:
+                heapq.heappush(self._heap, (now + max(0.0, delay), next(self._seq), target_id))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if self._closed:
+                    return
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+            for target_id in due:
+                try:
+                    self._trigger(target_id)
+                except Exception:
+                    logging.exception("Failed to trigger staggered target %s", target_id)
+
+
+def plan_staggered_starts(members: Dict[str, str], window: float, account_spacing: float) -> List[Tuple[float, str]]:
+    """
+    把同一时间点的目标分散到 window 秒内
+
+    Args:
+        members: target_id -> 账号 key
+        window: 分散窗口（秒）
+        account_spacing: 同一账号相邻两次启动的最小间隔（秒）
+
+    Returns:
+        [(延迟秒数, target_id), ...]；各账号的目标轮流排列，同一账号的目标不会挤在一起。
+        延迟不超过 window：同一账号的目标多到窗口内排不开时，超出部分在窗口末尾入队，由令牌桶限流
+    """
+    by_account = defaultdict(list)
+    for target_id, account_key in sorted(members.items()):
+        by_account[account_key].append(target_id)
+    keys = sorted(by_account)
+    order = []
+    for i in range(max((len(by_account[key]) for key in keys), default=0)):
+        for key in keys:
+            if i < len(by_account[key]):
+                order.append((key, by_account[key][i]))
+
+    step = window / len(order) if order else 0.0
+    next_free: Dict[str, float] = {}
+    plan = []
+    for i, (account_key, target_id) in enumerate(order):
+        delay = min(max(i * step, next_free.get(account_key, 0.0)), window)
+        next_free[account_key] = delay + account_spacing
+        plan.append((delay, target_id))
+    return plan
+
+
+_queue = CrawlQueue()
+_feeder: Optional[StaggeredFeeder] = None
+
+
+def configure(max_depth: Optional[int] = None):
+    if max_depth is not None:
+        _queue.max_depth = max(1, int(max_depth))
+
+
+def get_crawl_queue() -> CrawlQueue:
+    return _queue
+
+
+def set_crawl_queue(queue):
+    """替换进程使用的爬取队列（如 crawler.mongo_queue.MongoCrawlQueue，接口相同）"""
+    global _queue
+    _queue = queue
+
+
+def start_feeder(trigger: Callable[[str], object]) -> StaggeredFeeder:
+    global _feeder
+    if _feeder is None:
+        _feeder = StaggeredFeeder(trigger)
+        _feeder.start()
+    return _feeder
+
+
+def stop_feeder():
+    global _feeder
+    if _feeder is not None:
+        _feeder.stop()
+        _feeder = None
+
+
+def get_feeder() -> Optional[StaggeredFeeder]:
+    return _feeder
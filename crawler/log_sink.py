@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+# 队列满时的处理策略
+POLICY_DROP = "drop"    # 丢弃新日志，不阻塞爬取线程
+POLICY_BLOCK = "block"  # 阻塞等待队列空位
+
+_STOP = object()
+
+
+class CrawlLogSink:
+    """
+    爬取日志缓冲写入器
+
+    爬取线程只把日志记录放入内存队列，由后台线程按数量或时间阈值
+    使用 insert_many 批量写入 crawl_logs，避免每一步都同步等待 Mongo。
+    """
+
+    def __init__(self, collection, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_queue: int = 10000, policy: str = POLICY_DROP):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.05, flush_interval)
+        self.policy = policy if policy in (POLICY_DROP, POLICY_BLOCK) else POLICY_DROP
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="crawl-log-sink", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程，并写入队列中剩余的日志"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if not thread or not thread.is_alive():
+            return
+        # 停止信号必须入队，队列满时等待后台线程腾出空位
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def put(self, record: Dict) -> bool:
+        """放入一条日志；按策略丢弃时返回 False"""
+        if self.policy == POLICY_BLOCK:
+            self._queue.put(record)
+            return True
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logging.warning("Crawl log queue full, dropped %d records so far", self.dropped)
+            return False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        buffer: List[Dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(buffer)
+                return
+            if item is not None:
+                buffer.append(item)
+            if len(buffer) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, buffer: List[Dict]):
+        if not buffer:
+            return
+        try:
+            self.collection.insert_many(buffer, ordered=False)
+        except Exception:
+            logging.exception("Failed to flush %d crawl logs", len(buffer))
+
+
+_sink: Optional[CrawlLogSink] = None
+
+
+def start_log_sink(collection, **kwargs) -> CrawlLogSink:
+    """创建并启动进程内共享的日志写入器"""
+    global _sink
+    if _sink is None:
+        _sink = CrawlLogSink(collection, **kwargs)
+    _sink.start()
+    return _sink
+
+
+def stop_log_sink():
+    if _sink is not None:
+        _sink.stop()
+
+
+def get_log_sink() -> Optional[CrawlLogSink]:
+    if _sink is not None and _sink.running:
+        return _sink
+    return None
@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from crawler.crawl_queue import PRIORITY_SCHEDULED, QUEUED, MERGED, RUNNING, REJECTED, CLOSED
+
+# 持久化爬取任务：crawl_jobs 集合，每个目标最多一个文档（_id 为 target_id）
+# {_id, status: pending/running, priority, available_at, lease_until, worker, attempts, last_error,
+#  created_at, updated_at}
+JOB_COLLECTION = "crawl_jobs"
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+
+
+class MongoCrawlQueue:
+    """
+    基于 MongoDB 的持久化爬取队列，接口与 CrawlQueue 相同（put/get/done/close/snapshot）
+
+    - 去重：同一目标只有一个任务文档，等待中的任务合并触发并取较高优先级，正在爬取时忽略新的触发
+    - 租约：get 原子地认领一个到期的任务并设置 lease_until，认领进程定期续约；
+      进程崩溃后租约过期（visibility timeout），任务被其他进程重新认领
+    - 重试：每次认领 attempts +1，失败后按指数退避重新排队（retry），超过 max_attempts 的任务被丢弃；
+      账号冷却等改期（defer）不计入尝试次数
+    进程重启或扩容都不会丢失已排队的任务，多个 crawler.worker 进程可以同时消费。
+    """
+
+    def __init__(self, collection, worker_id: str, max_depth: int = 1000, lease_seconds: float = 300.0,
+                 max_attempts: int = 3, retry_base: float = 60.0, poll_interval: float = 1.0):
+        self.collection = collection
+        self.worker_id = worker_id
+        self.max_depth = max(1, int(max_depth))
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base = float(retry_base)
+        self.poll_interval = float(poll_interval)
+        self._in_flight: Set[str] = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+        self.merged = 0
+        self.rejected = 0
+
+    def put(self, target_id: str, priority: int = PRIORITY_SCHEDULED) -> str:
+        if self._closed.is_set():
+            return CLOSED
+        now = datetime.utcnow()
+        result = self.collection.update_one(
+            {"_id": target_id, "status": STATUS_PENDING},
+            {"$min": {"priority": priority}, "$set": {"updated_at": now}},
+        )
+        if result.matched_count:
+            self.merged += 1
+            return MERGED
+        if self.collection.count_documents({"status": STATUS_PENDING}) >= self.max_depth:
+            self.rejected += 1
+            logging.warning("Crawl job queue full (%d pending), rejected target %s", self.max_depth, target_id)
+            return REJECTED
+        try:
+            self.collection.insert_one({
+                "_id": target_id,
+                "status": STATUS_PENDING,
+                "priority": priority,
+                "available_at": now,
+                "attempts": 0,
+                "created_at": now,
+                "updated_at": now,
+            })
+        except DuplicateKeyError:
+            # 目标正在被某个进程爬取（或刚被并发的触发插入）
+            self.merged += 1
+            return RUNNING
+        return QUEUED
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        认领优先级最高的到期任务（没有任务时每 poll_interval 秒轮询一次）
+
+        Returns:
+            target_id；队列关闭或等待超时返回 None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._ensure_renewer()
+        while not self._closed.is_set():
+            try:
+                job = self._claim()
+            except PyMongoError as exc:
+                logging.warning("Failed to claim crawl job: %s", exc)
+                job = None
+            if job is not None:
+                with self._lock:
+                    self._in_flight.add(job["_id"])
+                return job["_id"]
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            self._closed.wait(wait)
+        return None
+
+    def done(self, target_id: str):
+        """爬取结束：删除任务（任务已被 defer/retry 重新排队时保留）"""
+        with self._lock:
+            self._in_flight.discard(target_id)
+        try:
+            self.collection.delete_one({"_id": target_id, "status": STATUS_RUNNING, "worker": self.worker_id})
+        except PyMongoError:
+            # 租约到期后任务会被重新认领
+            logging.exception("Failed to complete crawl job %s", target_id)
+
+    def defer(self, target_id: str, delay_seconds: float, reason: str = ""):
+        """改期：delay_seconds 秒后重新可被认领，不计入尝试次数"""
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": target_id, "worker": self.worker_id},
+            {
+                "$set": {"status": STATUS_PENDING, "available_at": now + timedelta(seconds=delay_seconds),
+                         "updated_at": now, "deferred_reason": reason},
+                "$unset": {"worker": "", "lease_until": ""},
+                "$inc": {"attempts": -1},
+            },
+        )
+
+    def retry(self, target_id: str, error: str):
+        """爬取出错：未超过 max_attempts 时按指数退避重新排队，否则丢弃任务"""
+        job = self.collection.find_one({"_id": target_id, "worker": self.worker_id}, {"attempts": 1})
+        attempts = int((job or {}).get("attempts") or 0)
+        if job is None or attempts >= self.max_attempts:
+            self.collection.delete_one({"_id": target_id, "worker": self.worker_id})
+            logging.error("Crawl job %s dropped after %d attempts: %s", target_id, attempts, error)
+            return
+        delay = self.retry_base * (2 ** (attempts - 1))
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": target_id, "worker": self.worker_id},
+            {
+                "$set": {"status": STATUS_PENDING, "available_at": now + timedelta(seconds=delay),
+                         "updated_at": now, "last_error": error},
+                "$unset": {"worker": "", "lease_until": ""},
+            },
+        )
+        logging.info("Crawl job %s retry %d/%d in %.0fs", target_id, attempts + 1, self.max_attempts, delay)
+
+    def close(self):
+        """停止认领新任务（已排队的任务保留在数据库中，正在爬取的任务继续续约直到结束）"""
+        self._closed.set()
+
+    def reopen(self):
+        self._closed.clear()
+
+    def snapshot(self) -> Dict:
+        now = datetime.utcnow()
+        counts = {STATUS_PENDING: 0, STATUS_RUNNING: 0}
+        for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        with self._lock:
+            in_flight = sorted(self._in_flight)
+        return {
+            "backend": "mongo",
+            "pending": counts[STATUS_PENDING],
+            "pending_manual": self.collection.count_documents({"status": STATUS_PENDING,
+                                                               "priority": {"$lt": PRIORITY_SCHEDULED}}),
+            "delayed": self.collection.count_documents({"status": STATUS_PENDING, "available_at": {"$gt": now}}),
+            "running": counts[STATUS_RUNNING],
+            "in_flight": in_flight,
+            "max_depth": self.max_depth,
+            "merged": self.merged,
+            "rejected": self.rejected,
+        }
+
+    def _claim(self) -> Optional[Dict]:
+        now = datetime.utcnow()
+        while True:
+            job = self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": STATUS_PENDING, "available_at": {"$lte": now}},
+                    # 认领进程崩溃或失联，租约已过期
+                    {"status": STATUS_RUNNING, "lease_until": {"$lt": now}},
+                ]},
+                {
+                    "$set": {"status": STATUS_RUNNING, "worker": self.worker_id,
+                             "lease_until": now + timedelta(seconds=self.lease_seconds), "claimed_at": now},
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("priority", 1), ("available_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None or job["attempts"] <= self.max_attempts:
+                return job
+            self.collection.delete_one({"_id": job["_id"], "worker": self.worker_id})
+            logging.error("Crawl job %s dropped after %d attempts (lease expired, last error: %s)",
+                          job["_id"], job["attempts"] - 1, job.get("last_error"))
+
+    def _ensure_renewer(self):
+        with self._lock:
+            if self._renewer is None or not self._renewer.is_alive():
+                self._renewer = threading.Thread(target=self._renew_loop, name="crawl-job-lease", daemon=True)
+                self._renewer.start()
+
+    def _renew_loop(self):
+        """每 1/3 租约时间为本进程正在爬取的任务续约，队列关闭且没有正在爬取的任务时退出"""
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                ids = list(self._in_flight)
+            if not ids:
+                if self._closed.is_set():
+                    return
+                continue
+            try:
+                self.collection.update_many(
+                    {"_id": {"$in": ids}, "status": STATUS_RUNNING, "worker": self.worker_id},
+                    {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+                )
+            except PyMongoError as exc:
+                logging.warning("Failed to renew crawl job leases: %s", exc)
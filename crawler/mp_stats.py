@@ -0,0 +1,150 @@
+"""
+公众号汇总：每个公众号的文章数、最新发布时间和头像引用，/api/articles/mp-summary 直接读取
+
+    python -m crawler.mp_stats   # 从 articles 全量重建
+
+mp_stats 集合：
+    {_id: "mp:<公众号名称>", mp_name, count, latest_publish_at, target_id, mp_avatar}
+    {_id: "meta", since: 重建开始时间, ready: 是否已完成重建}
+
+文章入库后紧接着以 $inc / $max 增量更新，目标头像变化时由 article_refs 同步 mp_avatar；
+与 article_counters 相同，重建期间入库的文章按 created_at 与 since 比较，只由增量或重建中的一方计入。
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from backend.db import get_db
+
+STATS_COLLECTION = "mp_stats"
+META_ID = "meta"
+# 重建时等待已创建但尚未写入的文章落库的秒数
+REBUILD_SETTLE_SECONDS = 5
+
+
+def _stats_id(mp_name: str) -> str:
+    return f"mp:{mp_name}"
+
+
+def load_meta() -> Dict:
+    return get_db()[STATS_COLLECTION].find_one({"_id": META_ID}) or {}
+
+
+def is_ready() -> bool:
+    return bool(load_meta().get("ready"))
+
+
+def needs_rebuild(stale_after: float = 3600.0) -> bool:
+    """从未重建过，或上次重建开始后超过 stale_after 秒仍未完成（进程中途退出）"""
+    meta = load_meta()
+    if meta.get("ready"):
+        return False
+    since = meta.get("since")
+    return since is None or (datetime.utcnow() - since).total_seconds() > stale_after
+
+
+def _upsert_op(mp_name: str, count: int, latest: Optional[datetime], target_id, mp_avatar: Optional[str],
+               overwrite: bool) -> UpdateOne:
+    """overwrite 为 True 时用本次的目标和头像覆盖（增量），否则只在新建时写入（重建）"""
+    update = {"$inc": {"count": count}, "$setOnInsert": {"mp_name": mp_name}}
+    if latest is not None:
+        update["$max"] = {"latest_publish_at": latest}
+    refs = {"target_id": target_id, "mp_avatar": mp_avatar}
+    if overwrite:
+        update["$set"] = refs
+    else:
+        update["$setOnInsert"].update(refs)
+    return UpdateOne({"_id": _stats_id(mp_name)}, update, upsert=True)
+
+
+def record_articles(articles: Iterable[Dict], meta: Optional[Dict] = None):
+    """新文章入库后增量更新汇总（从未重建过时不更新，重建时会全部计入）；meta 同 article_counters.record_articles"""
+    if meta is None:
+        meta = load_meta()
+    if not meta:
+        return
+    since = meta.get("since")
+    groups: Dict[str, Dict] = {}
+    for art in articles:
+        if not meta.get("ready") and since and art.get("created_at") and art["created_at"] < since:
+            # 重建开始前创建的文章由重建计入
+            continue
+        mp_name = art.get("mp_name") or ""
+        group = groups.setdefault(mp_name, {"count": 0, "latest": None})
+        group["count"] += 1
+        publish_at = art.get("publish_at")
+        if isinstance(publish_at, datetime) and (group["latest"] is None or publish_at > group["latest"]):
+            group["latest"] = publish_at
+        group["target_id"] = art.get("target_id")
+        group["mp_avatar"] = art.get("mp_avatar")
+    if not groups:
+        return
+    ops = [_upsert_op(mp_name, g["count"], g["latest"], g["target_id"], g["mp_avatar"], overwrite=True)
+           for mp_name, g in groups.items()]
+    try:
+        get_db()[STATS_COLLECTION].bulk_write(ops, ordered=False)
+    except Exception:
+        logging.exception("Failed to update mp stats")
+
+
+def set_avatar(target_id, mp_avatar: Optional[str]):
+    """目标头像引用变化后同步到汇总"""
+    get_db()[STATS_COLLECTION].update_many({"target_id": target_id}, {"$set": {"mp_avatar": mp_avatar}})
+
+
+def rebuild():
+    """从 articles 全量重建汇总（一次按公众号分组的聚合）"""
+    db = get_db()
+    collection = db[STATS_COLLECTION]
+    collection.delete_many({})
+    since = datetime.utcnow()
+    collection.insert_one({"_id": META_ID, "since": since, "ready": False})
+    time.sleep(REBUILD_SETTLE_SECONDS)
+    started = time.monotonic()
+
+    pipeline = [
+        {"$match": {"$or": [{"created_at": {"$lt": since}}, {"created_at": {"$exists": False}}]}},
+        {"$group": {
+            "_id": "$mp_name",
+            "count": {"$sum": 1},
+            "latest_publish_at": {"$max": "$publish_at"},
+            "target_id": {"$first": "$target_id"},
+            "mp_avatar": {"$max": "$mp_avatar"},
+        }},
+    ]
+    ops = [_upsert_op(row["_id"] or "", row["count"], row.get("latest_publish_at"), row.get("target_id"),
+                      row.get("mp_avatar"), overwrite=False)
+           for row in db["articles"].aggregate(pipeline, allowDiskUse=True)]
+    for i in range(0, len(ops), 1000):
+        collection.bulk_write(ops[i:i + 1000], ordered=False)
+    collection.update_one({"_id": META_ID}, {"$set": {"ready": True, "rebuilt_at": datetime.utcnow()}})
+    logging.info("Rebuilt stats for %d accounts in %.1fs", len(ops), time.monotonic() - started)
+
+
+def load_summary() -> Optional[List[Dict]]:
+    """
+    所有公众号的汇总，按文章数降序
+
+    Returns:
+        汇总列表；尚未完成重建时返回 None
+    """
+    if not is_ready():
+        return None
+    return list(get_db()[STATS_COLLECTION].find({"_id": {"$ne": META_ID}}).sort("count", -1))
+
+
+def main():
+    from crawler.worker import create_worker_app
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_worker_app()
+    with app.app_context():
+        rebuild()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import pytz
+from pymongo import UpdateOne
+
+from backend.db import get_db
+
+# 发布时间直方图：targets 文档上的 publish_hist（{"<星期*24+小时>": 篇数}，星期一为0，北京时间）
+# 和 publish_hist_total（总篇数）。首次由历史文章一次性构建，之后每次新文章入库时 $inc 增量更新。
+HIST_FIELD = "publish_hist"
+HIST_TOTAL_FIELD = "publish_hist_total"
+HIST_TZ = pytz.timezone("Asia/Shanghai")
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# 占比低于该值的小时不单独安排轮询（交给兜底轮询）
+MIN_HOUR_SHARE = 0.05
+
+
+def hist_bin(publish_at: datetime) -> int:
+    """文章发布时间（UTC naive）所在的直方图格子：星期 * 24 + 小时（北京时间）"""
+    local = pytz.UTC.localize(publish_at).astimezone(HIST_TZ)
+    return local.weekday() * 24 + local.hour
+
+
+def record_articles(target: Dict, articles: Iterable[Dict]):
+    """新文章入库后增量更新目标的发布时间直方图"""
+    counts = defaultdict(int)
+    for art in articles:
+        if isinstance(art.get("publish_at"), datetime):
+            counts[hist_bin(art["publish_at"])] += 1
+    if not counts:
+        return
+    inc = {f"{HIST_FIELD}.{b}": n for b, n in counts.items()}
+    inc[HIST_TOTAL_FIELD] = sum(counts.values())
+    try:
+        get_db()["targets"].update_one({"_id": target["_id"]}, {"$inc": inc})
+    except Exception:
+        logging.exception("Failed to update publish histogram for target=%s", target.get("_id"))
+
+
+def build_histograms(target_ids: List, days: int = 90):
+    """
+    用最近 days 天的文章一次聚合构建多个目标的直方图（只用于尚未构建过的目标）
+
+    没有文章的目标写入空直方图，之后由 record_articles 增量更新。
+    """
+    if not target_ids:
+        return
+    since = datetime.utcnow() - timedelta(days=days)
+    pipeline = [
+        {"$match": {"target_id": {"$in": list(target_ids)}, "publish_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {
+                "target_id": "$target_id",
+                # $dayOfWeek: 1=星期日 ... 7=星期六
+                "dow": {"$dayOfWeek": {"date": "$publish_at", "timezone": "Asia/Shanghai"}},
+                "hour": {"$hour": {"date": "$publish_at", "timezone": "Asia/Shanghai"}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+    hists = {tid: {} for tid in target_ids}
+    db = get_db()
+    for row in db["articles"].aggregate(pipeline):
+        key = row["_id"]
+        weekday = (key["dow"] + 5) % 7  # 转为星期一=0
+        hists[key["target_id"]][str(weekday * 24 + key["hour"])] = row["count"]
+    ops = [
+        UpdateOne({"_id": tid, HIST_TOTAL_FIELD: {"$exists": False}},
+                  {"$set": {HIST_FIELD: hist, HIST_TOTAL_FIELD: sum(hist.values())}})
+        for tid, hist in hists.items()
+    ]
+    db["targets"].bulk_write(ops, ordered=False)
+    logging.info("Built publish histograms for %d targets", len(ops))
+
+
+def predict_poll_times(hist: Optional[Dict[str, int]], min_samples: int = 20, coverage: float = 0.8,
+                       max_polls: int = 4, lag_minutes: int = 15,
+                       baseline: Iterable[str] = ()) -> Optional[List[str]]:
+    """
+    根据发布时间直方图预测轮询时间点
+
+    选出发布最集中的几个小时（累计覆盖 coverage 比例，最多 max_polls 个），
+    在每个小时结束后 lag_minutes 分钟轮询，只在该小时有过发布的星期几轮询；
+    再加上每天的兜底轮询 baseline，覆盖不规律的发布。
+
+    Returns:
+        ["HH:MM" 或 "HH:MM@mon,wed,..."]；样本不足时返回 None（由调用方按发布量选择固定时间）
+    """
+    hist = hist or {}
+    total = sum(hist.values())
+    if total < max(1, min_samples):
+        return None
+    hour_counts = [0] * 24
+    hour_days = [[0] * 7 for _ in range(24)]
+    for key, count in hist.items():
+        weekday, hour = divmod(int(key), 24)
+        hour_counts[hour] += count
+        hour_days[hour][weekday] += count
+
+    chosen = []
+    covered = 0
+    for hour in sorted(range(24), key=lambda h: (-hour_counts[h], h)):
+        if len(chosen) >= max_polls or covered >= coverage * total or hour_counts[hour] < MIN_HOUR_SHARE * total:
+            break
+        chosen.append(hour)
+        covered += hour_counts[hour]
+
+    entries = set(baseline)
+    for hour in chosen:
+        poll = (hour + 1) * 60 + lag_minutes
+        day_shift, poll = divmod(poll, 24 * 60)
+        time_str = f"{poll // 60:02d}:{poll % 60:02d}"
+        if time_str in entries:
+            # 兜底轮询已覆盖该时间点
+            continue
+        days = sorted({(d + day_shift) % 7 for d in range(7) if hour_days[hour][d] > 0})
+        if len(days) == 7:
+            entries.add(time_str)
+        else:
+            entries.add(f"{time_str}@{','.join(DAY_NAMES[d] for d in days)}")
+    return sorted(entries)
@@ -0,0 +1,146 @@
+import heapq
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+import pytz
+
+from backend.config import get_settings
+from backend.db import get_db
+from utils.getAllUrls import LIST_URL
+from utils.getFakId import SEARCH_URL
+
+# 账号每日请求用量：account_usage 集合，每个账号每天一个文档
+# {_id: "<account_id>:<YYYY-MM-DD>", account_id, date, list: 次数, search: 次数}
+USAGE_COLLECTION = "account_usage"
+USAGE_TZ = pytz.timezone("Asia/Shanghai")
+KIND_LIST = "list"
+KIND_SEARCH = "search"
+URL_KINDS = {LIST_URL: KIND_LIST, SEARCH_URL: KIND_SEARCH}
+
+
+def today() -> str:
+    """用量按北京时间的自然日统计（与公众号后台的每日限额一致）"""
+    return datetime.now(USAGE_TZ).strftime("%Y-%m-%d")
+
+
+class UsageTracker:
+    """
+    账号每日请求计数
+
+    每次列表/搜索请求先在内存中计数，由调度器定期 flush 以 $inc 写入 account_usage，
+    多个进程同时计数也不会互相覆盖。读取用量时每次从库中读取已写入的次数（包含其他进程已 flush 的次数），
+    再加上本进程未写入的次数；其他进程尚未 flush 的次数（最多 usage_flush_interval 秒）读不到。
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[str, str, str], int] = defaultdict(int)  # (date, account, kind) -> 次数
+        self._lock = threading.Lock()
+
+    def on_request(self, session_key, url: str):
+        """utils.http_client 的请求回调：只统计公众号后台的列表和搜索接口"""
+        kind = URL_KINDS.get(url)
+        if kind and session_key:
+            self.record(str(session_key), kind)
+
+    def record(self, account_key: str, kind: str, count: int = 1):
+        with self._lock:
+            self._pending[(today(), account_key, kind)] += count
+
+    def used(self, account_key: str) -> int:
+        """账号今天已发出的请求数"""
+        date = today()
+        base = self._load(date, account_key)
+        with self._lock:
+            pending = sum(self._pending.get((date, account_key, kind), 0) for kind in (KIND_LIST, KIND_SEARCH))
+        return base + pending
+
+    def has_quota(self, account_key: str, quota: Optional[int] = None) -> bool:
+        """quota 为账号文档上的 daily_quota，未设置时使用 account_daily_quota；<=0 表示不限"""
+        if quota is None:
+            quota = get_settings().account_daily_quota
+        return quota <= 0 or self.used(account_key) < quota
+
+    def usage_today(self, account_keys: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """多个账号今天的用量 {account_key: {"list": n, "search": n}}（含未写入的次数）"""
+        date = today()
+        keys = list(account_keys)
+        result = {key: {KIND_LIST: 0, KIND_SEARCH: 0} for key in keys}
+        for doc in get_db()[USAGE_COLLECTION].find({"date": date, "account_id": {"$in": keys}}):
+            for kind in (KIND_LIST, KIND_SEARCH):
+                result[doc["account_id"]][kind] += int(doc.get(kind) or 0)
+        with self._lock:
+            for (day, key, kind), count in self._pending.items():
+                if day == date and key in result:
+                    result[key][kind] += count
+        return result
+
+    def flush(self):
+        """把内存中的计数写入 account_usage（写入失败的计数留到下次）"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return
+        grouped = defaultdict(dict)
+        for (date, key, kind), count in pending.items():
+            grouped[(date, key)][kind] = count
+        collection = get_db()[USAGE_COLLECTION]
+        for (date, key), inc in grouped.items():
+            try:
+                collection.update_one({"_id": f"{key}:{date}"},
+                                      {"$inc": inc, "$setOnInsert": {"account_id": key, "date": date}},
+                                      upsert=True)
+            except Exception:
+                logging.exception("Failed to flush request usage for account=%s", key)
+                with self._lock:
+                    for kind, count in inc.items():
+                        self._pending[(date, key, kind)] += count
+
+    def _load(self, date: str, account_key: str) -> int:
+        try:
+            doc = get_db()[USAGE_COLLECTION].find_one({"_id": f"{account_key}:{date}"}) or {}
+        except Exception:
+            logging.exception("Failed to load request usage for account=%s", account_key)
+            return 0
+        return int(doc.get(KIND_LIST) or 0) + int(doc.get(KIND_SEARCH) or 0)
+
+
+def allocate_polls(rates: Dict[str, float], budget: float, min_polls: int = 1,
+                   max_polls: int = 24) -> Dict[str, int]:
+    """
+    在每日轮询次数预算内给目标分配轮询次数，发文越多的目标轮询越频繁
+
+    目标每天发 rate 篇、均匀轮询 k 次时，新文章平均延迟约为 1/(2k) 天；
+    第 k+1 次轮询带来的收益为 rate * (1/(2k) - 1/(2(k+1)))，按收益从大到小贪心分配。
+
+    Args:
+        rates: target_id -> 日均发文数
+        budget: 可分配的轮询总次数
+        min_polls / max_polls: 每个目标的轮询次数下限 / 上限
+
+    Returns:
+        target_id -> 每日轮询次数；预算不足以给每个目标 min_polls 次时仍分配 min_polls 次
+    """
+    polls = {tid: min_polls for tid in rates}
+    remaining = int(budget) - min_polls * len(rates)
+    # 没有发文记录的目标也给一个很小的收益，剩余预算不会被浪费
+    heap = [(-(rate + 1e-3) / (2 * min_polls * (min_polls + 1)), tid) for tid, rate in rates.items()
+            if min_polls < max_polls]
+    heapq.heapify(heap)
+    while remaining > 0 and heap:
+        _, tid = heapq.heappop(heap)
+        polls[tid] += 1
+        remaining -= 1
+        k = polls[tid]
+        if k < max_polls:
+            heapq.heappush(heap, (-(rates[tid] + 1e-3) / (2 * k * (k + 1)), tid))
+    return polls
+
+
+_tracker = UsageTracker()
+
+
+def get_usage_tracker() -> UsageTracker:
+    return _tracker
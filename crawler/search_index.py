@@ -0,0 +1,239 @@
+"""
+文章标题/摘要全文检索：n-gram 倒排索引
+
+    python -m crawler.search_index   # 为历史文章补建（或按新的切分规则重建）索引词
+
+每篇文章入库时写入 search_grams（标题和摘要的索引词），articles 上的 search_grams 多键索引即倒排索引：
+    - 连续的中日韩文字切成二元组（"公众号文章" -> 公众 众号 号文 文章），只有一个字时保留单字
+    - 连续的字母数字（小写）切成三元组（"chatgpt" -> cha hat atg tgp gpt），不足三个字符时保留整词，
+      这样 GPT 也能命中 ChatGPT
+检索时把查询切成同样的索引词，按命中文章数从少到多排列（最少的词决定索引扫描范围），
+要求全部命中，再按词的稀有程度和命中位置（标题权重高于摘要）排序。
+各索引词的命中文章数在进程内缓存 DF_CACHE_TTL 秒，同一个词不会每次请求都重新计数。
+新文章入库时即写入索引词和切分规则版本（search_grams_version）；升级前入库或版本较旧的文章由主节点启动时在后台补建，
+补建完成前检索不到这部分文章（或按旧规则匹配）。
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from backend.db import get_db
+
+GRAMS_FIELD = "search_grams"
+VERSION_FIELD = "search_grams_version"
+# 切分规则版本：规则变化时加一，后台任务按新规则重建旧文章的索引词
+INDEX_VERSION = 2
+META_COLLECTION = "search_meta"
+META_ID = "index"
+# 中日韩文字（含扩展A区、兼容区）
+_CJK = r"㐀-䶿一-鿿豈-﫿"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[0-9a-z]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+# 字母数字的切分长度
+LATIN_GRAM = 3
+# 检索词统计命中数时的上限（只用于排序和权重，不需要精确）
+DF_CAP = 100000
+# 命中数缓存的有效期（秒）和条数上限
+DF_CACHE_TTL = 600
+DF_CACHE_SIZE = 10000
+# 标题命中的权重倍数
+TITLE_WEIGHT = 2.0
+# 参与相关度排序的命中文章数上限（超出部分为更早的文章，不参与排序）
+MAX_CANDIDATES = 5000
+BACKFILL_BATCH_SIZE = 500
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def _is_cjk(term: str) -> bool:
+    return bool(_CJK_RE.match(term))
+
+
+def tokenize(text: str) -> List[str]:
+    """切分索引词（去重，保持出现顺序）"""
+    grams = []
+    for run in _TOKEN_RE.findall(_normalize(text)):
+        size = 2 if _is_cjk(run) else LATIN_GRAM
+        if len(run) <= size:
+            grams.append(run)
+        else:
+            grams.extend(run[i:i + size] for i in range(len(run) - size + 1))
+    return list(dict.fromkeys(grams))
+
+
+def article_grams(title: Optional[str], digest: Optional[str]) -> List[str]:
+    """文章的索引词：标题和摘要的并集"""
+    return list(dict.fromkeys(tokenize(title) + tokenize(digest)))
+
+
+def index_fields(title: Optional[str], digest: Optional[str]) -> Dict:
+    """写到文章上的检索字段：索引词和切分规则版本"""
+    return {GRAMS_FIELD: article_grams(title, digest), VERSION_FIELD: INDEX_VERSION}
+
+
+def _is_partial(term: str) -> bool:
+    """
+    不能直接查索引的检索词：文档中的单个汉字、不足三个字符的字母数字可能只是更长的词的一部分，
+    不一定作为单独的索引词出现
+    """
+    return len(term) < (2 if _is_cjk(term) else LATIN_GRAM)
+
+
+class _DocumentFrequencies:
+    """索引词命中文章数的进程内缓存（按有效期过期，超出条数上限时淘汰最早写入的）"""
+
+    def __init__(self, ttl: float = DF_CACHE_TTL, max_size: int = DF_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, articles, terms: List[str]) -> Dict[str, int]:
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for term in terms:
+                entry = self._entries.get(term)
+                if entry and entry[0] > now:
+                    result[term] = entry[1]
+        for term in terms:
+            if term not in result:
+                result[term] = articles.count_documents({GRAMS_FIELD: term}, limit=DF_CAP)
+                with self._lock:
+                    self._entries.pop(term, None)
+                    self._entries[term] = (now + self.ttl, result[term])
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_df_cache = _DocumentFrequencies()
+
+
+def build_search(q: str) -> Optional[Tuple[Dict, Dict]]:
+    """
+    把查询转为 (筛选条件, 相关度表达式)
+
+    单个汉字、不足三个字符的字母数字不能直接查索引：这类词作为标题/摘要的子串条件附加在索引条件之后。
+
+    Returns:
+        查询中没有可用的索引词（如只有一个汉字）时返回 None，由调用方回退为正则查询
+    """
+    terms = tokenize(q)
+    indexed = [t for t in terms if not _is_partial(t)]
+    if not indexed:
+        return None
+    articles = get_db()["articles"]
+    total = max(articles.estimated_document_count(), 1)
+    df = _df_cache.get(articles, indexed)
+    # 命中最少的词放在最前面，MongoDB 对 $all 的第一个元素走索引
+    indexed.sort(key=lambda t: df[t])
+    match: Dict = {GRAMS_FIELD: {"$all": indexed}}
+    singles = [t for t in terms if t not in indexed]
+    if singles:
+        match["$and"] = [{"$or": [{"title": {"$regex": re.escape(t), "$options": "i"}},
+                                  {"digest": {"$regex": re.escape(t), "$options": "i"}}]}
+                         for t in singles]
+
+    title_lc = {"$toLower": {"$ifNull": ["$title", ""]}}
+    digest_lc = {"$toLower": {"$ifNull": ["$digest", ""]}}
+    parts = []
+    for term in indexed:
+        weight = math.log(1 + total / (1 + df[term]))
+        parts.append({"$cond": [{"$gte": [{"$indexOfCP": [title_lc, term]}, 0]}, TITLE_WEIGHT * weight, 0]})
+        parts.append({"$cond": [{"$gte": [{"$indexOfCP": [digest_lc, term]}, 0]}, weight, 0]})
+    # 整个查询作为短语出现在标题中时额外加分
+    phrase = _normalize(q).strip()
+    if phrase:
+        parts.append({"$cond": [{"$gte": [{"$indexOfCP": [title_lc, phrase]}, 0]}, TITLE_WEIGHT * len(indexed), 0]})
+    return match, {"$add": parts}
+
+
+def search_articles(search: Tuple[Dict, Dict], query: Dict, projection: Dict, skip: int = 0,
+                    limit: int = 20) -> Tuple[List[Dict], Dict]:
+    """
+    按相关度排序的检索：search 为 build_search 的结果，query 为公众号/分类/日期等其他筛选条件
+
+    只对最新的 MAX_CANDIDATES 篇命中文章计算相关度，同分按 publish_at 降序。
+
+    Returns:
+        (当页文章, 完整筛选条件（用于计数）)
+    """
+    match, score = search
+    full_query = {"$and": [query, match]} if query else match
+    pipeline = [
+        {"$match": full_query},
+        {"$sort": {"publish_at": -1, "_id": -1}},
+        {"$limit": MAX_CANDIDATES},
+        {"$addFields": {"_score": score}},
+        {"$sort": {"_score": -1, "publish_at": -1, "_id": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": projection},
+    ]
+    return list(get_db()["articles"].aggregate(pipeline)), full_query
+
+
+def backfill(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    按 _id 顺序遍历一遍文章，为没有索引词或切分规则版本较旧的文章重建索引词，返回处理的篇数
+
+    遍历结束后在 search_meta 中记录当前版本，之后启动时不再检查。
+    """
+    db = get_db()
+    articles = db["articles"]
+    done = 0
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = list(articles.find(query, {"title": 1, "digest": 1, VERSION_FIELD: 1})
+                    .sort("_id", 1).limit(batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        ops = [UpdateOne({"_id": doc["_id"]}, {"$set": index_fields(doc.get("title"), doc.get("digest"))})
+               for doc in docs if doc.get(VERSION_FIELD) != INDEX_VERSION]
+        if ops:
+            articles.bulk_write(ops, ordered=False)
+            done += len(ops)
+    db[META_COLLECTION].update_one({"_id": META_ID},
+                                   {"$set": {"version": INDEX_VERSION, "backfilled_at": datetime.utcnow()}},
+                                   upsert=True)
+    _df_cache.clear()
+    if done:
+        logging.info("Search index backfilled for %d articles", done)
+    return done
+
+
+def needs_backfill() -> bool:
+    """还没有按当前切分规则版本补建过索引词"""
+    meta = get_db()[META_COLLECTION].find_one({"_id": META_ID}) or {}
+    return meta.get("version") != INDEX_VERSION
+
+
+def main():
+    from crawler.worker import create_worker_app
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_worker_app()
+    with app.app_context():
+        backfill()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,139 @@
 import logging
 import base64
+import functools
 import io
-import requests
-from datetime import datetime
-from typing import Dict, Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from backend.db import get_db
 from backend.config import get_settings
-from utils.getFakId import get_fakid
-from utils.getAllUrls import getAllUrl
+from crawler import (adaptive_interval, article_counters, article_refs, circuit_breaker, mp_stats,
+                     publish_predictor, search_index)
+from crawler.log_sink import get_log_sink
+from utils.profile_cache import resolve_fakid
+from utils.http_client import http_get, CDN_SESSION_KEY
+from utils.rate_limiter import get_limiter
+from utils.cooldown import AuthExpiredError, FreqControlError
+from utils.getAllUrls import iterAllUrlPages, ArticleRecord, HighWaterMark
 
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
 
+# 上次翻页没有到达水位线（水位线未推进），下次按追赶页数爬取
+HWM_CATCHUP_FIELD = "hwm_catchup"
+
+# MongoDB 重复键错误码（并发 upsert 竞争时出现）
+DUPLICATE_KEY_ERROR = 11000
+
 # 缩略图配置
 THUMBNAIL_SIZE = (64, 64)  # 缩略图尺寸
 THUMBNAIL_QUALITY = 75  # JPEG质量（1-100）
 
 
-def run_crawl(target: Dict, account: Optional[Dict], page_num: int = None):
+# _crawl_steps 产出的步骤：生成器只做流程决策，I/O 由引擎执行后把结果 send 回来（异常 throw 回来），
+# 线程池引擎（run_crawl）直接调用，asyncio 引擎（async_engine.async_run_crawl）用 aiohttp 和 asyncio.to_thread 执行
+STEP_CALL = "call"        # (STEP_CALL, 无参函数)：读写数据库、写日志等阻塞调用
+STEP_RESOLVE = "resolve"  # (STEP_RESOLVE, headers, token, mp_name, account_key, limiter, refresh)：返回值同 resolve_fakid
+STEP_FETCH = "fetch"      # (STEP_FETCH, fakeid, token, headers, page_num, high_water, account_key, limiter)：返回值同 _fetch_and_save
+STEP_AVATAR = "avatar"    # (STEP_AVATAR, avatar_url, headers)：返回 base64 头像或 None
+
+
+def run_crawl(target: Dict, account: Optional[Dict], page_num: int = None) -> Optional[str]:
     """
     结合现有 utils 实现的简易爬取：
     1) 优先使用缓存的 fakeid，如果没有或失效则查询并保存
     2) 用 getAllUrl 拉取文章列表：
+       - 有水位线（上次见到的最新文章）：翻页直到水位线，最多 crawl_incremental_max_pages 页；
+         长时间未运行的目标做追赶爬取，最多 crawl_catchup_max_pages 页
        - 新公众号（无缓存 fakeid）：爬取 3 页
        - 已有公众号（有缓存 fakeid）：只爬取 1 页（最新）
-    3) 去重写入 Mongo articles
+    3) 每拉到一页即去重写入 Mongo articles
+    账号触发频率限制时抛出 FreqControlError，由调用方按 retry_after 改期。
+    账号熔断打开（凭证连续失效）时直接跳过，只记录一条日志。
     TODO: 若需正文，可对 links 再调用内容抓取模块。
+
+    Returns:
+        失败时返回 error_type（与日志中的 error_type 一致），成功返回 None
     """
+    steps = _crawl_steps(target, account, page_num)
+    result, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = _run_step(target, step), None
+        except Exception as exc:
+            result, error = None, exc
+
+
+def _run_step(target: Dict, step: Tuple):
+    """在当前线程执行 _crawl_steps 产出的一个步骤"""
+    kind, args = step[0], step[1:]
+    if kind == STEP_CALL:
+        return args[0]()
+    if kind == STEP_RESOLVE:
+        headers, token, mp_name, account_key, limiter, refresh = args
+        return resolve_fakid(headers, token, mp_name, refresh=refresh, session_key=account_key, limiter=limiter,
+                             cooldown_key=account_key)
+    if kind == STEP_FETCH:
+        return _fetch_and_save(target, *args)
+    if kind == STEP_AVATAR:
+        return _download_avatar_as_base64(*args)
+    raise ValueError(f"unknown crawl step: {kind}")
+
+
+def _call(func, *args, **kwargs) -> Tuple:
+    """把阻塞调用包装为 STEP_CALL 步骤"""
+    return STEP_CALL, functools.partial(func, *args, **kwargs)
+
+
+def _crawl_steps(target: Dict, account: Optional[Dict], page_num: Optional[int]):
+    """爬取流程（两种引擎共用）：熔断检查、爬取、登录态失效和频率限制处理，生成器的返回值即 error_type"""
+    if account:
+        decision = yield _call(circuit_breaker.before_crawl, account)
+        if decision == circuit_breaker.REJECT:
+            yield _call(_append_log, target, status="error",
+                        message=f"账号 {account.get('name')} 凭证失效（已熔断），跳过本次爬取",
+                        details={"step": "初始化", "error_type": circuit_breaker.CIRCUIT_OPEN})
+            return circuit_breaker.CIRCUIT_OPEN
+    try:
+        error_type = yield from _fetch_steps(target, account, page_num)
+    except AuthExpiredError as exc:
+        error_type = yield _call(_auth_expired, target, exc)
+    except FreqControlError as exc:
+        # 账号进入频率限制冷却，由调度器改期，这里只记录一条日志
+        yield _call(_append_log, target, status="deferred",
+                    message=f"账号触发频率限制，冷却 {exc.retry_after:.0f} 秒后重试",
+                    details={"step": "频率限制", "error_type": "freq_control"})
+        logging.warning("Crawl deferred for target=%s: %s", target.get("name"), exc)
+        raise
+    if account:
+        yield _call(circuit_breaker.after_crawl, account, error_type)
+    return error_type
+
+
+def _fetch_steps(target: Dict, account: Optional[Dict], page_num: Optional[int]):
     if not account:
         logging.warning("No account bound for target=%s", target.get("name"))
-        _append_log(target, status="error", message="未绑定账号", details={"step": "初始化", "error_type": "no_account"})
-        return
+        yield _call(_append_log, target, status="error", message="未绑定账号",
+                    details={"step": "初始化", "error_type": "no_account"})
+        return "no_account"
     token = (account.get("token") or "").strip()
     cookie = (account.get("cookie") or "").strip()
     mp_name = target.get("name") or ""
-    if not token or not cookie or not mp_name:
-        error_msg = "token/cookie/name 缺失"
-        _set_last_error(target, error_msg)
-        _append_log(target, status="error", message=error_msg, details={"step": "初始化", "error_type": "missing_params"})
-        logging.warning("Missing token/cookie/name for target=%s", target.get("_id"))
-        return
+    missing = yield _call(_missing_params, target, token, cookie, mp_name)
+    if missing:
+        return missing
 
     headers = _build_headers(cookie)
-    settings = get_settings()
+    # 同一账号的请求复用同一个 HTTP Session（keep-alive）
+    account_key = str(account.get("_id") or mp_name)
+    # 同一账号的所有微信接口请求共享一个令牌桶（跨爬取线程）
+    limiter = get_limiter(account_key)
 
     # 记录开始时间
     start_time = datetime.utcnow()
@@ -54,137 +144,101 @@ def run_crawl(target: Dict, account: Optional[Dict], page_num: int = None):
     need_refresh_fakeid = False
     need_refresh_avatar = False
     search_results = None  # 用于保存查询结果，以便后续保存头像
-    is_new_target = not fakeid  # 判断是否是新公众号
 
-    # 自动决定爬取页数：新公众号爬3页，已有的只爬1页（最新）
-    if page_num is None:
-        page_num = 3 if is_new_target else 1
+    # 增量水位线与爬取页数
+    page_num, high_water = yield _call(_plan_pages, target, page_num)
 
     # 记录开始日志
-    _append_log(target, status="start", message="开始爬取", details={"step": "初始化"})
+    yield _call(_append_log, target, status="start", message="开始爬取", details={"step": "初始化"})
 
     if not fakeid:
         # 如果没有缓存的 fakeid，查询并保存
         logging.info("No cached fakeid for target=%s, querying...", mp_name)
-        _append_log(target, status="progress", message="查询 fakeid", details={"step": "获取fakeid"})
-        search_results = get_fakid(headers, token, mp_name)
+        yield _call(_append_log, target, status="progress", message="查询 fakeid", details={"step": "获取fakeid"})
+        search_results = yield STEP_RESOLVE, headers, token, mp_name, account_key, limiter, False
         if not search_results:
-            error_msg = "未找到 fakeid，可能 token/cookie 失效"
-            _set_last_error(target, error_msg)
-            _append_log(target, status="error", message=error_msg, details={
-                        "step": "获取fakeid", "error_type": "fakeid_not_found"})
-            logging.warning("No fakeid found for mp=%s", mp_name)
-            return
+            return (yield _call(_fakeid_missing, target, search_results, "获取fakeid", "fakeid_not_found"))
         fakeid = search_results[0]["wpub_fakid"]
         need_refresh_fakeid = True
-        _append_log(target, status="progress", message=f"成功获取 fakeid: {fakeid[:8]}...", details={
-                    "step": "获取fakeid", "fakeid": fakeid})
+        yield _call(_append_log, target, status="progress", message=f"成功获取 fakeid: {fakeid[:8]}...",
+                    details={"step": "获取fakeid", "fakeid": fakeid})
     else:
         logging.info("Using cached fakeid for target=%s", mp_name)
-        _append_log(target, status="progress", message=f"使用缓存的 fakeid: {fakeid[:8]}...", details={
-                    "step": "获取fakeid", "fakeid": fakeid})
+        yield _call(_append_log, target, status="progress", message=f"使用缓存的 fakeid: {fakeid[:8]}...",
+                    details={"step": "获取fakeid", "fakeid": fakeid})
         # 如果 fakeid 已缓存但头像为空，尝试获取头像
         if not mp_avatar:
             logging.info("No cached avatar for target=%s, querying avatar...", mp_name)
-            _append_log(target, status="progress", message="查询头像", details={"step": "获取头像"})
-            search_results = get_fakid(headers, token, mp_name)
+            yield _call(_append_log, target, status="progress", message="查询头像", details={"step": "获取头像"})
+            search_results = yield STEP_RESOLVE, headers, token, mp_name, account_key, limiter, False
             if search_results:
                 need_refresh_avatar = True
 
     # 2. 拉取文章列表
-    _append_log(target, status="progress", message=f"开始拉取文章列表（{page_num}页）", details={
-                "step": "拉取文章", "page_num": page_num})
-    titles, links, update_times = getAllUrl(
-        page_num=page_num,
-        start_page=0,
-        fad=fakeid,
-        tok=token,
-        headers=headers,
-        delay_range=(settings.request_min_delay, settings.request_max_delay),
-        retries=settings.request_retries,
-        timeout=settings.request_timeout,
-    )
+    if high_water is not None:
+        fetch_msg = f"开始增量拉取文章列表（至水位线，最多{page_num}页）"
+    else:
+        fetch_msg = f"开始拉取文章列表（{page_num}页）"
+    yield _call(_append_log, target, status="progress", message=fetch_msg,
+                details={"step": "拉取文章", "page_num": page_num})
+    fetched, inserted, newest = yield STEP_FETCH, fakeid, token, headers, page_num, high_water, account_key, limiter
 
     # 如果使用缓存的 fakeid 但返回空结果，可能是 fakeid 失效，清除缓存并重新查询
-    if not need_refresh_fakeid and (not titles or len(titles) == 0):
+    # （命中水位线说明接口正常返回，只是没有新文章）
+    reached_mark = high_water is not None and high_water.reached
+    if not need_refresh_fakeid and not reached_mark and fetched == 0:
         logging.warning("Cached fakeid returned empty results for target=%s, clearing and retrying...", mp_name)
-        _append_log(target, status="progress", message="缓存的 fakeid 失效，重新查询", details={"step": "重新获取fakeid"})
-        _clear_fakeid(target)
-        # 重新查询 fakeid
-        search_results = get_fakid(headers, token, mp_name)
+        yield _call(_append_log, target, status="progress", message="缓存的 fakeid 失效，重新查询",
+                    details={"step": "重新获取fakeid"})
+        yield _call(_clear_fakeid, target)
+        # 重新查询 fakeid（跳过资料缓存）
+        search_results = yield STEP_RESOLVE, headers, token, mp_name, account_key, limiter, True
         if not search_results:
-            error_msg = "fakeid 失效，重新查询失败"
-            _set_last_error(target, error_msg)
-            _append_log(target, status="error", message=error_msg, details={
-                        "step": "重新获取fakeid", "error_type": "fakeid_refresh_failed"})
-            logging.error("Failed to refresh fakeid for mp=%s", mp_name)
-            return
+            return (yield _call(_fakeid_missing, target, search_results, "重新获取fakeid", "fakeid_refresh_failed"))
         fakeid = search_results[0]["wpub_fakid"]
         need_refresh_fakeid = True
-        _append_log(target, status="progress", message=f"重新获取 fakeid 成功: {fakeid[:8]}...", details={
-                    "step": "重新获取fakeid", "fakeid": fakeid})
+        yield _call(_append_log, target, status="progress", message=f"重新获取 fakeid 成功: {fakeid[:8]}...",
+                    details={"step": "重新获取fakeid", "fakeid": fakeid})
         # 重试爬取
-        _append_log(target, status="progress", message="重试拉取文章列表", details={"step": "重试拉取文章"})
-        titles, links, update_times = getAllUrl(
-            page_num=page_num,
-            start_page=0,
-            fad=fakeid,
-            tok=token,
-            headers=headers,
-            delay_range=(settings.request_min_delay, settings.request_max_delay),
-            retries=settings.request_retries,
-            timeout=settings.request_timeout,
-        )
+        yield _call(_append_log, target, status="progress", message="重试拉取文章列表", details={"step": "重试拉取文章"})
+        fetched, inserted, newest = yield STEP_FETCH, fakeid, token, headers, page_num, high_water, account_key, limiter
         # 如果重试后仍然为空，记录错误
-        if not titles or len(titles) == 0:
+        if not (high_water is not None and high_water.reached) and fetched == 0:
             error_msg = "重新查询 fakeid 后仍无法获取文章"
-            _set_last_error(target, error_msg)
-            _append_log(target, status="error", message=error_msg, details={
-                        "step": "重试拉取文章", "error_type": "no_articles_after_retry"})
+            yield _call(_set_last_error, target, error_msg)
+            yield _call(_append_log, target, status="error", message=error_msg,
+                        details={"step": "重试拉取文章", "error_type": "no_articles_after_retry"})
             logging.warning("Still got empty results after refreshing fakeid for mp=%s", mp_name)
-            return
+            return "no_articles_after_retry"
 
     # 如果获取到新的 fakeid 或头像，保存到 targets 表
     if (need_refresh_fakeid or need_refresh_avatar) and search_results:
-        update_data = {}
-        if need_refresh_fakeid:
-            update_data["fakeid"] = fakeid
-
         result = search_results[0]
-
-        # 保存其他公众号信息
-        if "alias" in result:
-            update_data["mp_alias"] = result["alias"]
-        if "service_type" in result:
-            update_data["mp_service_type"] = result["service_type"]
-        if "verify_type" in result:
-            update_data["mp_verify_type"] = result["verify_type"]
-        if "signature" in result:
-            update_data["mp_signature"] = result["signature"]
-        if "user_name" in result:
-            update_data["mp_user_name"] = result["user_name"]
+        update_data = _profile_update(result, fakeid if need_refresh_fakeid else None)
 
         # 如果获取到头像URL，下载并转换为base64保存
         if "wpub_avatar" in result and result["wpub_avatar"]:
             avatar_url = result["wpub_avatar"]
-            _append_log(target, status="progress", message="开始下载头像", details={"step": "下载头像"})
+            yield _call(_append_log, target, status="progress", message="开始下载头像", details={"step": "下载头像"})
             # 如果已经是base64格式（data URI），直接保存
             if avatar_url.startswith("data:image/"):
                 update_data["mp_avatar"] = avatar_url
-                _append_log(target, status="progress", message="头像已是base64格式，直接保存",
+                yield _call(_append_log, target, status="progress", message="头像已是base64格式，直接保存",
                             details={"step": "保存头像", "avatar_fetched": True})
             else:
                 # 下载图片并转换为base64
                 logging.info("Attempting to download avatar for target=%s from URL: %s", mp_name, avatar_url)
-                avatar_base64 = _download_avatar_as_base64(avatar_url, headers)
+                avatar_base64 = yield STEP_AVATAR, avatar_url, headers
                 if avatar_base64:
                     update_data["mp_avatar"] = avatar_base64
-                    _append_log(target, status="progress", message=f"头像下载成功（{len(avatar_base64)} 字符）", details={
-                                "step": "保存头像", "avatar_fetched": True, "avatar_size": len(avatar_base64)})
+                    yield _call(_append_log, target, status="progress",
+                                message=f"头像下载成功（{len(avatar_base64)} 字符）",
+                                details={"step": "保存头像", "avatar_fetched": True,
+                                         "avatar_size": len(avatar_base64)})
                     logging.info("Downloaded and converted avatar to base64 for target=%s (length: %d chars)",
                                  mp_name, len(avatar_base64))
                 else:
-                    _append_log(target, status="progress", message="头像下载失败",
+                    yield _call(_append_log, target, status="progress", message="头像下载失败",
                                 details={"step": "保存头像", "avatar_fetched": False})
                     logging.warning("Failed to download avatar for target=%s from URL: %s", mp_name, avatar_url)
         else:
@@ -200,56 +254,137 @@ def run_crawl(target: Dict, account: Optional[Dict], page_num: int = None):
                     if any(x in key.lower() for x in ['img', 'avatar', 'head']):
                         logging.info("Found potential avatar field '%s' in raw data for %s", key, mp_name)
 
-        if update_data:
-            try:
-                result = get_db()["targets"].update_one(
-                    {"_id": target["_id"]},
-                    {"$set": update_data}
-                )
-                if need_refresh_fakeid:
-                    logging.info("Saved fakeid and avatar for target=%s (matched: %d, modified: %d)",
-                                 target.get("name"), result.matched_count, result.modified_count)
-                else:
-                    logging.info("Saved avatar for target=%s (matched: %d, modified: %d)",
-                                 target.get("name"), result.matched_count, result.modified_count)
-                # 验证保存是否成功
-                if "mp_avatar" in update_data:
-                    saved_target = get_db()["targets"].find_one({"_id": target["_id"]}, {"mp_avatar": 1})
-                    if saved_target and saved_target.get("mp_avatar"):
-                        logging.info("Verified: mp_avatar saved successfully for target=%s (length: %d chars)",
-                                     target.get("name"), len(saved_target.get("mp_avatar", "")))
-                    else:
-                        logging.error("Warning: mp_avatar not found after save for target=%s", target.get("name"))
-            except Exception:
-                logging.exception("Failed to save fakeid/avatar for target=%s", target.get("_id"))
-
-    articles = []
-    for title, link, ts in zip(titles, links, update_times):
-        publish_at = datetime.utcfromtimestamp(int(ts))
-        articles.append(
-            {
-                "mp_name": mp_name,
-                "mp_id": target.get("biz"),
-                "title": title,
-                "url": link,
-                "publish_at": publish_at,
-                "cover": "",
-                "digest": "",
-                "target_id": target["_id"],
-                "created_at": datetime.utcnow(),
-            }
+        yield _call(_save_profile, target, update_data)
+
+    # 3. 文章已在拉取时逐页去重写入
+    yield _call(_finish_crawl, target, start_time, fetched, inserted, newest, high_water)
+    return None
+
+
+def _missing_params(target: Dict, token: str, cookie: str, mp_name: str) -> Optional[str]:
+    """检查爬取参数：账号缺少 token/cookie 计为凭证失效，目标缺少名称只是该目标的问题"""
+    if not token or not cookie:
+        error_msg, error_type = "token/cookie 缺失", "missing_credentials"
+    elif not mp_name:
+        error_msg, error_type = "公众号名称缺失", "missing_params"
+    else:
+        return None
+    _set_last_error(target, error_msg)
+    _append_log(target, status="error", message=error_msg, details={"step": "初始化", "error_type": error_type})
+    logging.warning("%s for target=%s", error_type, target.get("_id"))
+    return error_type
+
+
+def _fakeid_missing(target: Dict, search_results: Optional[List[Dict]], step: str, not_found_type: str) -> str:
+    """
+    搜索不到 fakeid：接口出错（search_results 为 None）计为凭证失效 search_failed，
+    搜索无结果（含负缓存）为 not_found_type，只与该目标有关
+    """
+    if search_results is None:
+        error_msg, error_type = "查询 fakeid 接口出错，可能 token/cookie 失效", "search_failed"
+    elif not_found_type == "fakeid_refresh_failed":
+        error_msg, error_type = "fakeid 失效，重新查询无结果", not_found_type
+    else:
+        error_msg, error_type = "未找到 fakeid，请检查公众号名称", not_found_type
+    _set_last_error(target, error_msg)
+    _append_log(target, status="error", message=error_msg, details={"step": step, "error_type": error_type})
+    logging.warning("%s for mp=%s", error_type, target.get("name"))
+    return error_type
+
+
+def _auth_expired(target: Dict, exc: AuthExpiredError) -> str:
+    """微信返回登录态失效：记录错误，计入账号熔断"""
+    error_msg = "账号登录态失效，请更新 token/cookie"
+    _set_last_error(target, error_msg)
+    _append_log(target, status="error", message=error_msg, details={"step": "请求接口", "error_type": "auth_expired",
+                                                                      "ret": exc.ret})
+    logging.warning("Login expired while crawling target=%s: %s", target.get("name"), exc)
+    return "auth_expired"
+
+
+def _plan_pages(target: Dict, page_num: Optional[int]) -> Tuple[int, Optional[HighWaterMark]]:
+    """
+    决定本次爬取的页数（上限）和水位线
+
+    有水位线时翻到水位线即停止，page_num 只作为上限；
+    否则新公众号爬3页，已有的只爬1页（最新）
+    """
+    settings = get_settings()
+    high_water = _load_high_water_mark(target)
+    if page_num is None:
+        if high_water is not None:
+            # 长时间未运行，或上次翻页没有到达水位线：追赶爬取
+            if target.get(HWM_CATCHUP_FIELD) or _is_idle(target, settings.crawl_catchup_idle_hours):
+                page_num = settings.crawl_catchup_max_pages
+            else:
+                page_num = settings.crawl_incremental_max_pages
+        else:
+            page_num = 3 if not target.get("fakeid") else 1
+    return page_num, high_water
+
+
+def _profile_update(result: Dict, fakeid: Optional[str] = None) -> Dict:
+    """从搜索结果生成 targets 上的公众号信息字段（不含头像）"""
+    update_data = {}
+    if fakeid:
+        update_data["fakeid"] = fakeid
+
+    # 保存其他公众号信息
+    if "alias" in result:
+        update_data["mp_alias"] = result["alias"]
+    if "service_type" in result:
+        update_data["mp_service_type"] = result["service_type"]
+    if "verify_type" in result:
+        update_data["mp_verify_type"] = result["verify_type"]
+    if "signature" in result:
+        update_data["mp_signature"] = result["signature"]
+    if "user_name" in result:
+        update_data["mp_user_name"] = result["user_name"]
+    return update_data
+
+
+def _save_profile(target: Dict, update_data: Dict):
+    """保存 fakeid/头像等公众号信息到 targets 表"""
+    if not update_data:
+        return
+    try:
+        result = get_db()["targets"].update_one(
+            {"_id": target["_id"]},
+            {"$set": article_refs.mark_changed(dict(update_data), target)}
         )
+        if "fakeid" in update_data:
+            logging.info("Saved fakeid and avatar for target=%s (matched: %d, modified: %d)",
+                         target.get("name"), result.matched_count, result.modified_count)
+        else:
+            logging.info("Saved avatar for target=%s (matched: %d, modified: %d)",
+                         target.get("name"), result.matched_count, result.modified_count)
+        # 验证保存是否成功
+        if "mp_avatar" in update_data:
+            saved_target = get_db()["targets"].find_one({"_id": target["_id"]}, {"mp_avatar": 1})
+            if saved_target and saved_target.get("mp_avatar"):
+                logging.info("Verified: mp_avatar saved successfully for target=%s (length: %d chars)",
+                             target.get("name"), len(saved_target.get("mp_avatar", "")))
+            else:
+                logging.error("Warning: mp_avatar not found after save for target=%s", target.get("name"))
+    except Exception:
+        logging.exception("Failed to save fakeid/avatar for target=%s", target.get("_id"))
 
-    # 3. 去重写入
-    _append_log(target, status="progress", message=f"开始保存文章到数据库（共 {len(articles)} 篇）", details={
-                "step": "保存文章", "articles_count": len(articles)})
-    col = get_db()["articles"]
-    inserted = 0
-    for art in articles:
-        result = col.update_one({"url": art["url"]}, {"$setOnInsert": art}, upsert=True)
-        if result.upserted_id:
-            inserted += 1
+
+def _finish_crawl(target: Dict, start_time: datetime, fetched: int, inserted: int, newest: Optional[Dict],
+                  high_water: Optional[HighWaterMark] = None):
+    """爬取成功收尾：推进水位线、清除错误、记录完成日志"""
+    _append_log(target, status="progress", message=f"文章已保存到数据库（共 {fetched} 篇）", details={
+                "step": "保存文章", "articles_count": fetched})
+    if _should_advance_mark(high_water):
+        _advance_high_water_mark(target, newest)
+    else:
+        # 翻页在水位线之前中止：保留原水位线，下次按追赶页数继续，避免中间的文章被永久跳过
+        _mark_catchup(target)
+        _append_log(target, status="progress", message="未翻到上次的水位线，保留水位线，下次继续追赶",
+                    details={"step": "保存文章", "hwm_reached": False})
     _set_last_error(target, None)
+    if target.get("schedule_mode") == adaptive_interval.ADAPTIVE_MODE:
+        adaptive_interval.record_poll(target, inserted)
 
     # 计算耗时
     end_time = datetime.utcnow()
@@ -259,15 +394,185 @@ def run_crawl(target: Dict, account: Optional[Dict], page_num: int = None):
     final_target = get_db()["targets"].find_one({"_id": target["_id"]}, {"mp_avatar": 1})
     avatar_exists = bool(final_target and final_target.get("mp_avatar"))
 
-    _append_log(target, status="finish", message=f"完成，获取 {len(articles)} 篇，新入库 {inserted} 篇",
+    _append_log(target, status="finish", message=f"完成，获取 {fetched} 篇，新入库 {inserted} 篇",
                 details={
                     "step": "完成",
-                    "articles_count": len(articles),
+                    "articles_count": fetched,
                     "new_count": inserted,
                     "duration_ms": duration_ms,
                     "avatar_fetched": avatar_exists  # 记录头像是否存在
     })
-    logging.info("Crawled mp=%s got=%s new=%s", mp_name, len(articles), inserted)
+    logging.info("Crawled mp=%s got=%s new=%s", target.get("name"), fetched, inserted)
+
+
+def _load_high_water_mark(target: Dict) -> Optional[HighWaterMark]:
+    """读取目标的增量水位线（hwm_publish_at + hwm_url），没有则返回 None"""
+    publish_at = target.get("hwm_publish_at")
+    if not isinstance(publish_at, datetime):
+        return None
+    ts = int((publish_at - datetime(1970, 1, 1)).total_seconds())
+    return HighWaterMark(ts, target.get("hwm_url"))
+
+
+def _is_idle(target: Dict, idle_hours: float) -> bool:
+    """目标是否长时间未运行（需要追赶爬取）"""
+    last_run_at = target.get("last_run_at")
+    if not isinstance(last_run_at, datetime):
+        return True
+    if last_run_at.tzinfo is not None:
+        last_run_at = last_run_at.replace(tzinfo=None) - (last_run_at.utcoffset() or timedelta(0))
+    return datetime.utcnow() - last_run_at > timedelta(hours=idle_hours)
+
+
+def _fetch_and_save(target: Dict, fakeid: str, token: str, headers: Dict, page_num: int,
+                    high_water: Optional[HighWaterMark], session_key: Optional[str] = None,
+                    limiter=None) -> Tuple[int, int, Optional[Dict]]:
+    """
+    逐页拉取文章列表，每到一页就写入数据库
+
+    Returns:
+        (拉取篇数, 新入库篇数, 拉取到的最新文章)
+    """
+    settings = get_settings()
+    fetched = 0
+    inserted = 0
+    newest = None
+    pages = iterAllUrlPages(
+        page_num=page_num,
+        start_page=0,
+        fad=fakeid,
+        tok=token,
+        headers=headers,
+        delay_range=(settings.request_min_delay, settings.request_max_delay),
+        retries=settings.request_retries,
+        timeout=settings.request_timeout,
+        stop_at=high_water,
+        session_key=session_key,
+        limiter=limiter,
+        cooldown_key=session_key,
+    )
+    metas: Dict = {}
+    for records in pages:
+        page_inserted, page_newest = _save_page(target, records, metas)
+        inserted += page_inserted
+        fetched += len(records)
+        if newest is None or page_newest["publish_at"] > newest["publish_at"]:
+            newest = page_newest
+    return fetched, inserted, newest
+
+
+def _save_page(target: Dict, records: List[ArticleRecord], metas: Optional[Dict] = None) -> Tuple[int, Dict]:
+    """
+    写入一页文章，返回 (新入库篇数, 该页最新文章)
+
+    metas 由同一次爬取的各页共用，缓存派生数据的 meta，避免每页重复读取。
+    """
+    refs = article_refs.target_refs(target)
+    articles = [dict(_build_article(target, record), **refs) for record in records]
+    inserted = _save_articles(articles)
+    if inserted:
+        _on_articles_inserted(target, inserted, metas if metas is not None else {})
+    return len(inserted), max(articles, key=lambda a: a["publish_at"])
+
+
+def _on_articles_inserted(target: Dict, articles: List[Dict], metas: Dict):
+    """新文章入库后更新依赖文章的派生数据（每页：直方图一次更新，计数器和汇总各一次 bulk_write）"""
+    # 计数器/汇总尚未建立（meta 为空）时每页重新读取：重建开始后的文章只能由增量计入，不能沿用空 meta 跳过；
+    # 已读到的 meta 在本次爬取内沿用，重建开始后 since 之前创建的文章由重建计入，之后的仍由增量计入
+    for name, module in (("counters", article_counters), ("mp_stats", mp_stats)):
+        if not metas.get(name):
+            metas[name] = module.load_meta()
+    publish_predictor.record_articles(target, articles)
+    article_counters.record_articles(articles, metas["counters"])
+    mp_stats.record_articles(articles, metas["mp_stats"])
+
+
+def _build_article(target: Dict, record: ArticleRecord) -> Dict:
+    return {
+        "mp_name": target.get("name") or "",
+        "mp_id": target.get("biz"),
+        "title": record.title,
+        "url": record.link,
+        "publish_at": datetime.utcfromtimestamp(record.update_time),
+        "cover": record.cover,
+        "digest": record.digest,
+        "target_id": target["_id"],
+        **search_index.index_fields(record.title, record.digest),
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _should_advance_mark(high_water: Optional[HighWaterMark]) -> bool:
+    """没有旧水位线，或本次翻页已覆盖到旧水位线（或整个列表）时才能推进水位线"""
+    return high_water is None or high_water.complete
+
+
+def _advance_high_water_mark(target: Dict, newest: Optional[Dict]):
+    """用本次拉到的最新文章推进水位线（只前进不后退），并清除追赶标记"""
+    if not newest:
+        if target.get(HWM_CATCHUP_FIELD):
+            _clear_catchup(target)
+        return
+    try:
+        get_db()["targets"].update_one(
+            {"_id": target["_id"], "$or": [
+                {"hwm_publish_at": {"$exists": False}},
+                {"hwm_publish_at": None},
+                {"hwm_publish_at": {"$lt": newest["publish_at"]}},
+            ]},
+            {"$set": {"hwm_publish_at": newest["publish_at"], "hwm_url": newest["url"]}}
+        )
+        if target.get(HWM_CATCHUP_FIELD):
+            _clear_catchup(target)
+    except Exception:
+        logging.exception("Failed to advance high water mark for target=%s", target.get("_id"))
+
+
+def _mark_catchup(target: Dict):
+    try:
+        get_db()["targets"].update_one({"_id": target["_id"]}, {"$set": {HWM_CATCHUP_FIELD: True}})
+    except Exception:
+        logging.exception("Failed to mark catch-up for target=%s", target.get("_id"))
+
+
+def _clear_catchup(target: Dict):
+    try:
+        get_db()["targets"].update_one({"_id": target["_id"]}, {"$unset": {HWM_CATCHUP_FIELD: ""}})
+    except Exception:
+        logging.exception("Failed to clear catch-up for target=%s", target.get("_id"))
+
+
+def _save_articles(articles: List[Dict]) -> List[Dict]:
+    """
+    批量去重写入文章（一次 unordered bulk_write 完成）
+
+    以 url 为键做 $setOnInsert upsert，新入库数量以 upserted ids 精确统计。
+    并发任务写入同一 url 产生的重复键错误视为"已存在"，其余写错误继续抛出。
+
+    Returns:
+        本次新入库的文章列表
+    """
+    if not articles:
+        return []
+    ops = [UpdateOne({"url": art["url"]}, {"$setOnInsert": art}, upsert=True) for art in articles]
+    try:
+        result = get_db()["articles"].bulk_write(ops, ordered=False)
+        upserted = result.upserted_ids or {}
+    except BulkWriteError as exc:
+        details = exc.details or {}
+        other_errors = [e for e in details.get("writeErrors", []) if e.get("code") != DUPLICATE_KEY_ERROR]
+        if other_errors:
+            raise
+        upserted = {item["index"]: item["_id"] for item in details.get("upserted", [])}
+        logging.info("Ignored %d duplicate-key upserts (concurrent crawl)",
+                     len(details.get("writeErrors", [])))
+
+    inserted = []
+    for index, _id in upserted.items():
+        art = articles[index]
+        art["_id"] = _id
+        inserted.append(art)
+    return inserted
 
 
 def _build_headers(cookie: str):
@@ -296,14 +601,11 @@ def _download_avatar_as_base64(avatar_url: str, headers: Dict, thumbnail: bool =
 
     try:
         # 处理相对URL
-        if avatar_url.startswith("//"):
-            avatar_url = "https:" + avatar_url
-        elif avatar_url.startswith("/"):
-            avatar_url = "https://mp.weixin.qq.com" + avatar_url
+        avatar_url = _absolute_avatar_url(avatar_url)
 
         logging.info("Downloading avatar from URL: %s", avatar_url)
         # 下载图片
-        response = requests.get(avatar_url, headers=headers, timeout=10, stream=True)
+        response = http_get(avatar_url, session_key=CDN_SESSION_KEY, headers=headers, timeout=10)
         response.raise_for_status()
 
         # 检查Content-Type
@@ -312,65 +614,82 @@ def _download_avatar_as_base64(avatar_url: str, headers: Dict, thumbnail: bool =
             logging.warning("Avatar URL does not return an image: %s", avatar_url)
             return None
 
-        # 读取图片数据
-        image_data = response.content
-        if len(image_data) > 2 * 1024 * 1024:  # 限制2MB
-            logging.warning("Avatar image too large: %d bytes", len(image_data))
-            return None
+        return _encode_avatar(response.content, content_type, thumbnail)
+    except Exception as exc:
+        logging.warning("Failed to download avatar from %s: %s", avatar_url, exc)
+        return None
 
-        # 如果需要生成缩略图
-        if thumbnail:
-            try:
-                # 使用PIL处理图片
-                img = Image.open(io.BytesIO(image_data))
-
-                # 转换为RGB模式（如果是RGBA或其他模式）
-                if img.mode in ("RGBA", "LA", "P"):
-                    # 创建白色背景
-                    background = Image.new("RGB", img.size, (255, 255, 255))
-                    if img.mode == "P":
-                        img = img.convert("RGBA")
-                    background.paste(img, mask=img.split()[-1] if img.mode in ("RGBA", "LA") else None)
-                    img = background
-                elif img.mode != "RGB":
-                    img = img.convert("RGB")
-
-                # 生成缩略图（保持宽高比）
-                # 兼容不同版本的PIL
-                try:
-                    img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-                except AttributeError:
-                    # 旧版本PIL使用LANCZOS常量
-                    img.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
-
-                # 转换为字节流
-                output = io.BytesIO()
-                img.save(output, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
-                image_data = output.getvalue()
-                mime_type = "image/jpeg"
 
-                logging.debug("Generated thumbnail: %d bytes (original: %d bytes)",
-                              len(image_data), len(response.content))
-            except Exception as img_exc:
-                logging.warning("Failed to generate thumbnail, using original image: %s", img_exc)
-                # 如果缩略图生成失败，使用原图
-                mime_type = content_type
-                if mime_type == "image/jpg":
-                    mime_type = "image/jpeg"
-        else:
-            # 使用原图
+def _encode_avatar(image_data: bytes, content_type: str, thumbnail: bool = True) -> Optional[str]:
+    """
+    把头像图片数据转换为 data URI（可选生成缩略图）
+
+    Returns:
+        base64编码的图片字符串（data URI格式），图片过大返回None
+    """
+    original_size = len(image_data)
+    if len(image_data) > 2 * 1024 * 1024:  # 限制2MB
+        logging.warning("Avatar image too large: %d bytes", len(image_data))
+        return None
+
+    # 如果需要生成缩略图
+    if thumbnail:
+        try:
+            # 使用PIL处理图片
+            img = Image.open(io.BytesIO(image_data))
+
+            # 转换为RGB模式（如果是RGBA或其他模式）
+            if img.mode in ("RGBA", "LA", "P"):
+                # 创建白色背景
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                if img.mode == "P":
+                    img = img.convert("RGBA")
+                background.paste(img, mask=img.split()[-1] if img.mode in ("RGBA", "LA") else None)
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+
+            # 生成缩略图（保持宽高比）
+            # 兼容不同版本的PIL
+            try:
+                img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+            except AttributeError:
+                # 旧版本PIL使用LANCZOS常量
+                img.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+
+            # 转换为字节流
+            output = io.BytesIO()
+            img.save(output, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+            image_data = output.getvalue()
+            mime_type = "image/jpeg"
+
+            logging.debug("Generated thumbnail: %d bytes (original: %d bytes)",
+                          len(image_data), original_size)
+        except Exception as img_exc:
+            logging.warning("Failed to generate thumbnail, using original image: %s", img_exc)
+            # 如果缩略图生成失败，使用原图
             mime_type = content_type
             if mime_type == "image/jpg":
                 mime_type = "image/jpeg"
+    else:
+        # 使用原图
+        mime_type = content_type
+        if mime_type == "image/jpg":
+            mime_type = "image/jpeg"
 
-        # 转换为base64
-        base64_str = base64.b64encode(image_data).decode("utf-8")
+    # 转换为base64
+    base64_str = base64.b64encode(image_data).decode("utf-8")
 
-        # 返回data URI格式
-        return f"data:{mime_type};base64,{base64_str}"
-    except Exception as exc:
-        logging.warning("Failed to download avatar from %s: %s", avatar_url, exc)
-        return None
+    # 返回data URI格式
+    return f"data:{mime_type};base64,{base64_str}"
+
+
+def _absolute_avatar_url(avatar_url: str) -> str:
+    if avatar_url.startswith("//"):
+        return "https:" + avatar_url
+    if avatar_url.startswith("/"):
+        return "https://mp.weixin.qq.com" + avatar_url
+    return avatar_url
 
 
 def _set_last_error(target: Dict, message: Optional[str]):
@@ -408,6 +727,8 @@ def _append_log(target: Dict, status: str, message: str, details: Optional[Dict]
             - avatar_fetched: 是否获取头像
             - error_type: 错误类型
             - duration_ms: 耗时（毫秒）
+
+    日志写入器已启动时放入缓冲队列异步批量写入，否则直接写库。
     """
     try:
         log_data = {
@@ -419,6 +740,10 @@ def _append_log(target: Dict, status: str, message: str, details: Optional[Dict]
         }
         if details:
             log_data.update(details)
-        get_db()["crawl_logs"].insert_one(log_data)
+        sink = get_log_sink()
+        if sink is not None:
+            sink.put(log_data)
+        else:
+            get_db()["crawl_logs"].insert_one(log_data)
     except Exception:
         logging.exception("Failed to append crawl log for target=%s", target.get("_id"))
@@ -0,0 +1,51 @@
+"""
+独立爬取进程：从 Mongo 持久化爬取队列（crawl_jobs）认领目标并执行 run_crawl
+
+    CRAWL_QUEUE_BACKEND=mongo python -m crawler.worker [--threads 5]
+
+可以在多台机器上启动任意多个进程同时消费队列，与 API 进程分开扩容；
+爬取引擎（线程池 / asyncio）沿用 CRAWL_ENGINE 配置。收到 SIGTERM/SIGINT 后停止认领新任务，
+等正在执行的爬取结束后退出，未执行的任务留在队列中由其他进程继续执行。
+"""
+
+import argparse
+import logging
+import signal
+import threading
+
+from flask import Flask
+
+from backend.db import init_db
+from backend.scheduler import CRAWL_WORKERS, setup_worker, start_crawl_engine, stop_crawl_engine
+
+
+def create_worker_app() -> Flask:
+    """只初始化数据库连接的 Flask 应用（爬取代码通过 app context 访问 get_db）"""
+    app = Flask(__name__)
+    init_db(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl worker consuming the Mongo crawl job queue")
+    parser.add_argument("--threads", type=int, default=CRAWL_WORKERS,
+                        help="thread pool engine worker threads (default: %(default)s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_worker_app()
+    setup_worker(app)
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    start_crawl_engine(threads=max(1, args.threads))
+    logging.info("Crawl worker started")
+    stop.wait()
+    logging.info("Crawl worker stopping, waiting for running crawls")
+    stop_crawl_engine()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from crawler import account_pool, circuit_breaker
+from crawler.account_pool import ACCOUNT_ERROR_TYPES, AccountPool
+
+
+def test_account_error_types_follow_breaker():
+    assert ACCOUNT_ERROR_TYPES == circuit_breaker.AUTH_ERROR_TYPES | {"freq_control"}
+    for error_type in ("auth_expired", "search_failed", "missing_credentials", "freq_control"):
+        assert error_type in ACCOUNT_ERROR_TYPES
+    # 只与单个目标有关的失败不影响账号
+    for error_type in ("missing_params", "fakeid_not_found", "fakeid_refresh_failed", "no_articles_after_retry"):
+        assert error_type not in ACCOUNT_ERROR_TYPES
+
+
+def test_target_failures_do_not_raise_account_error_rate():
+    pool = AccountPool()
+    account = {"_id": ObjectId()}
+    for _ in range(10):
+        pool.record(account, "fakeid_not_found")
+    assert pool._stats[str(account["_id"])].error_rate == 0.0
+    for _ in range(10):
+        pool.record(account, "auth_expired")
+    assert pool._stats[str(account["_id"])].error_rate > 0.6
+
+
+class _Unlimited:
+    def has_quota(self, key, quota=None):
+        return True
+
+
+def _open_account(minutes_ago):
+    return {"_id": ObjectId(), "name": "a", "token": "t", "cookie": "c",
+            "breaker_state": circuit_breaker.STATE_OPEN,
+            "breaker_opened_at": datetime.utcnow() - timedelta(minutes=minutes_ago)}
+
+
+def test_open_breaker_rejoins_pool_when_probe_is_due(monkeypatch):
+    monkeypatch.setattr(account_pool, "get_usage_tracker", lambda: _Unlimited())
+    monkeypatch.setattr(circuit_breaker, "get_settings", lambda: SimpleNamespace(breaker_probe_interval=1800))
+    pool = AccountPool()
+    recent, due = _open_account(5), _open_account(60)
+    # 熔断前的凭证失败使错误率很高，也不影响探测
+    for _ in range(10):
+        pool.record(due, "auth_expired")
+    assert pool.choose([recent]) is None
+    assert pool.choose([recent, due]) is due
+
+    # 探测成功后清空错误率，熔断关闭后的账号继续参与选择
+    pool.record(due, None)
+    closed = {key: value for key, value in due.items() if not key.startswith("breaker_")}
+    assert pool.is_healthy(closed)
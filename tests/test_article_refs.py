@@ -0,0 +1,20 @@
+from urllib.parse import parse_qs, urlparse
+
+from bson import ObjectId
+
+from crawler.article_refs import avatar_ref, verify_avatar_ref
+
+
+def test_avatar_ref_is_signed():
+    target = {"_id": ObjectId(), "mp_avatar": "data:image/jpeg;base64,AAAA"}
+    ref = urlparse(avatar_ref(target))
+    params = {k: v[0] for k, v in parse_qs(ref.query).items()}
+    assert ref.path == f"/api/targets/{target['_id']}/avatar"
+    assert verify_avatar_ref(str(target["_id"]), params["v"], params["s"])
+    # 签名与目标绑定，不能拿去加载其他目标的头像，也不能省略
+    assert not verify_avatar_ref(str(ObjectId()), params["v"], params["s"])
+    assert not verify_avatar_ref(str(target["_id"]), params["v"], None)
+
+
+def test_no_avatar_no_ref():
+    assert avatar_ref({"_id": ObjectId()}) is None
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from crawler import async_engine, circuit_breaker, tasks
+from utils.cooldown import AuthExpiredError
+
+TARGET = {"_id": "t1", "name": "测试公众号", "fakeid": None, "mp_avatar": None}
+ACCOUNT = {"_id": "a1", "name": "账号", "token": "tok", "cookie": "c=1"}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """替换掉读写数据库的步骤，记录日志的 error_type 和熔断结果"""
+    recorded = {"logs": [], "after": []}
+    monkeypatch.setattr(tasks, "_append_log", lambda target, status, message, details=None:
+                        recorded["logs"].append((details or {}).get("error_type")))
+    monkeypatch.setattr(tasks, "_set_last_error", lambda target, message: None)
+    monkeypatch.setattr(tasks, "_plan_pages", lambda target, page_num: (3, None))
+    monkeypatch.setattr(circuit_breaker, "before_crawl", lambda account: circuit_breaker.ALLOW)
+    monkeypatch.setattr(circuit_breaker, "after_crawl", lambda account, error_type:
+                        recorded["after"].append(error_type))
+    return recorded
+
+
+def _raise_auth_expired(*args, **kwargs):
+    raise AuthExpiredError(200003)
+
+
+async def _async_raise_auth_expired(*args, **kwargs):
+    raise AuthExpiredError(200003)
+
+
+async def _async_no_results(*args, **kwargs):
+    return []
+
+
+def test_sync_and_async_engines_share_auth_expired_handling(calls, monkeypatch):
+    monkeypatch.setattr(tasks, "resolve_fakid", _raise_auth_expired)
+    assert tasks.run_crawl(dict(TARGET), ACCOUNT) == "auth_expired"
+    monkeypatch.setattr(async_engine, "async_resolve_fakid", _async_raise_auth_expired)
+    assert asyncio.run(async_engine.async_run_crawl(None, dict(TARGET), ACCOUNT)) == "auth_expired"
+    assert calls["after"] == ["auth_expired", "auth_expired"]
+
+
+def test_sync_and_async_engines_share_not_found_handling(calls, monkeypatch):
+    monkeypatch.setattr(tasks, "resolve_fakid", lambda *args, **kwargs: [])
+    assert tasks.run_crawl(dict(TARGET), ACCOUNT) == "fakeid_not_found"
+    monkeypatch.setattr(async_engine, "async_resolve_fakid", _async_no_results)
+    assert asyncio.run(async_engine.async_run_crawl(None, dict(TARGET), ACCOUNT)) == "fakeid_not_found"
+    assert calls["logs"][-1] == "fakeid_not_found"
+    assert calls["after"] == ["fakeid_not_found", "fakeid_not_found"]
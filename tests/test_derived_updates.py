@@ -0,0 +1,28 @@
+from bson import ObjectId
+
+from crawler import article_counters, mp_stats, publish_predictor, tasks
+
+
+def test_page_updates_reuse_meta_within_a_crawl(monkeypatch):
+    loads = {"counters": 0, "mp_stats": 0}
+    writes = []
+
+    def counting(name, meta):
+        def load():
+            loads[name] += 1
+            return meta
+        return load
+
+    monkeypatch.setattr(article_counters, "load_meta", counting("counters", {"ready": True}))
+    monkeypatch.setattr(mp_stats, "load_meta", counting("mp_stats", {}))
+    monkeypatch.setattr(publish_predictor, "record_articles", lambda target, articles: writes.append("hist"))
+    monkeypatch.setattr(article_counters, "record_articles", lambda articles, meta: writes.append(("counters", meta)))
+    monkeypatch.setattr(mp_stats, "record_articles", lambda articles, meta: writes.append(("mp_stats", meta)))
+
+    target = {"_id": ObjectId(), "name": "公众号"}
+    metas = {}
+    for _ in range(3):
+        tasks._on_articles_inserted(target, [{"mp_name": "公众号"}], metas)
+    # 已建立的计数器 meta 只读取一次；汇总尚未建立（空 meta）时每页重新读取
+    assert loads == {"counters": 1, "mp_stats": 3}
+    assert writes.count(("counters", {"ready": True})) == 3
@@ -0,0 +1,60 @@
+from crawler.tasks import _should_advance_mark
+from utils import getAllUrls
+from utils.getAllUrls import HighWaterMark, iterAllUrlPages
+
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+def _serve(monkeypatch, pages):
+    """按 begin 参数返回预先准备的文章列表页"""
+    def http_get(url, params=None, **kwargs):
+        items = pages[params["begin"] // 5] if params["begin"] // 5 < len(pages) else []
+        return _Response({"base_resp": {"ret": 0}, "app_msg_list": items})
+    monkeypatch.setattr(getAllUrls, "http_get", http_get)
+
+
+def _page(first_ts):
+    return [{"title": f"t{first_ts - i}", "link": f"l{first_ts - i}", "update_time": first_ts - i} for i in range(5)]
+
+
+def _crawl(mark, page_num):
+    records = []
+    for page in iterAllUrlPages(page_num, 0, "fakeid", "tok", {}, delay_range=(0, 0), stop_at=mark):
+        records.extend(page)
+    return records
+
+
+def test_page_cap_before_mark_keeps_old_mark(monkeypatch):
+    _serve(monkeypatch, [_page(1000), _page(995), _page(990), _page(985)])
+    mark = HighWaterMark(986)
+    assert len(_crawl(mark, 2)) == 10
+    # 第 3、4 页的文章还没有拉取，不能推进水位线
+    assert not mark.reached and not mark.exhausted
+    assert not _should_advance_mark(mark)
+
+
+def test_reaching_mark_advances(monkeypatch):
+    _serve(monkeypatch, [_page(1000), _page(995), _page(990), _page(985)])
+    mark = HighWaterMark(993)
+    assert len(_crawl(mark, 10)) == 8
+    assert _should_advance_mark(mark)
+
+
+def test_end_of_list_advances(monkeypatch):
+    _serve(monkeypatch, [_page(1000)])
+    mark = HighWaterMark(10)
+    assert len(_crawl(mark, 10)) == 5
+    assert mark.exhausted and _should_advance_mark(mark)
+
+
+def test_first_crawl_without_mark_advances():
+    assert _should_advance_mark(None)
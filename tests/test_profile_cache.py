@@ -0,0 +1,63 @@
+import threading
+import time
+
+from utils import profile_cache
+from utils.profile_cache import ProfileCache
+
+
+def test_followers_do_not_report_not_found_when_leader_fails(monkeypatch):
+    cache = ProfileCache()
+    monkeypatch.setattr(profile_cache, "_cache", cache)
+    calls = []
+    started = threading.Event()
+
+    def search_biz(headers, tok, query, **kwargs):
+        calls.append(query)
+        if len(calls) == 1:
+            started.set()
+            # 领头请求稍后返回接口错误，期间其他线程合并到同一次请求
+            time.sleep(0.2)
+        return None
+
+    monkeypatch.setattr(profile_cache, "search_biz", search_biz)
+    results = []
+
+    def resolve():
+        results.append(profile_cache.resolve_fakid({}, "tok", "公众号"))
+
+    leader = threading.Thread(target=resolve)
+    leader.start()
+    started.wait(1)
+    followers = [threading.Thread(target=resolve) for _ in range(3)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join(2)
+
+    # 所有调用都按接口出错返回 None（不是表示无结果的 []），等待的请求各自重试了一次
+    assert results == [None] * 4
+    assert len(calls) == 4
+    hit, _ = cache.get("公众号")
+    assert not hit
+
+
+def test_followers_share_successful_result(monkeypatch):
+    cache = ProfileCache()
+    monkeypatch.setattr(profile_cache, "_cache", cache)
+    calls = []
+
+    def search_biz(headers, tok, query, **kwargs):
+        calls.append(query)
+        time.sleep(0.1)
+        return [{"wpub_name": query, "wpub_fakid": "fid"}]
+
+    monkeypatch.setattr(profile_cache, "search_biz", search_biz)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(profile_cache.resolve_fakid({}, "tok", "公众号")))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(2)
+    assert len(calls) == 1
+    assert all(r and r[0]["wpub_fakid"] == "fid" for r in results)
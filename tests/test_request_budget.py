@@ -0,0 +1,35 @@
+from backend.scheduler import _limit_times
+from crawler.request_budget import allocate_polls
+
+
+def test_limit_times_keeps_baseline_over_day_restricted_slot():
+    assert _limit_times(["00:15@tue,wed", "10:00"], 1) == ["10:00"]
+
+
+def test_limit_times_spreads_daily_slots_evenly():
+    assert _limit_times(["09:00", "13:00", "18:00", "22:00"], 2) == ["09:00", "18:00"]
+
+
+def test_limit_times_counts_day_restricted_slots_as_fractions():
+    times = ["00:15@tue,wed", "10:00", "21:15@mon,tue,wed,thu,fri"]
+    # 1 + 5/7 + 2/7 = 2 次
+    assert _limit_times(times, 2) == times
+    # 预算 1.8 次时只能再加入覆盖天数最多的 5/7
+    assert _limit_times(times, 1.8) == ["10:00", "21:15@mon,tue,wed,thu,fri"]
+
+
+def test_limit_times_without_budget_returns_all():
+    assert _limit_times(["00:15@tue,wed", "10:00"], None) == ["00:15@tue,wed", "10:00"]
+
+
+def test_allocate_polls_prefers_frequent_publishers():
+    polls = allocate_polls({"busy": 5.0, "quiet": 0.1}, budget=10, min_polls=1, max_polls=24)
+    assert sum(polls.values()) == 10
+    assert polls["busy"] > polls["quiet"] >= 1
+
+
+def test_allocate_polls_respects_bounds():
+    polls = allocate_polls({"a": 1.0, "b": 1.0}, budget=100, min_polls=1, max_polls=4)
+    assert polls == {"a": 4, "b": 4}
+    # 预算不足时仍给每个目标 min_polls 次
+    assert allocate_polls({"a": 1.0, "b": 1.0, "c": 1.0}, budget=2) == {"a": 1, "b": 1, "c": 1}
@@ -0,0 +1,19 @@
+from crawler.search_index import index_fields, INDEX_VERSION, tokenize
+
+
+def test_tokenize_cjk_bigrams():
+    assert tokenize("公众号文章") == ["公众", "众号", "号文", "文章"]
+    assert tokenize("号") == ["号"]
+
+
+def test_tokenize_latin_trigrams_match_substrings():
+    assert tokenize("ChatGPT") == ["cha", "hat", "atg", "tgp", "gpt"]
+    # 查询 GPT 的索引词是 ChatGPT 索引词的子集
+    assert set(tokenize("GPT")) <= set(tokenize("ChatGPT 发布"))
+    assert tokenize("AI 5G") == ["ai", "5g"]
+
+
+def test_index_fields_records_version():
+    fields = index_fields("ChatGPT", None)
+    assert fields["search_grams_version"] == INDEX_VERSION
+    assert "gpt" in fields["search_grams"]
@@ -49,8 +49,8 @@ import requests
 from PyQt5.QtCore import QThread, pyqtSignal
 
 # 导入现有模块
-from .getFakId import get_fakid
-from .getAllUrls import getAllUrl
+from .profile_cache import resolve_fakid
+from .getAllUrls import iterAllUrl
 from .getContentsByUrls_MultiThread import run_getContentsByUrls_MultiThread
 from .getRealTimeByTimeStamp import run_getRealTimeByTimeStamp
 from .getTitleByKeywords import run_getTitleByKeywords
@@ -328,75 +328,55 @@ class BatchScraperThread(QThread):
         headers = self.config['headers']
         token = self.config['token']
         
-        # 1. 获取公众号fakeid
-        search_results = get_fakid(headers, token, account_name)
+        # 1. 获取公众号fakeid（优先使用资料缓存）
+        search_results = resolve_fakid(headers, token, account_name)
         if not search_results:
             raise Exception(f"未找到公众号: {account_name}")
         
         fakeid = search_results[0]['wpub_fakid']
         
-        # 2. 获取文章列表
+        # 2. 逐篇流式获取文章列表，遇到早于开始日期的文章即停止翻页
         articles_in_range = []
-        page_start = 0
         max_pages = self.config.get('max_pages_per_account', 100)  # 限制最大页数
         
-        for page in range(max_pages):
-            if self.is_cancelled:
-                break
-            
-            try:
-                # 获取一页的文章
-                titles, links, update_times = getAllUrl(
-                    page_num=1,
-                    start_page=page_start,
-                    fad=fakeid,
-                    tok=token,
-                    headers=headers
-                )
+        records = iterAllUrl(
+            page_num=max_pages,
+            start_page=0,
+            fad=fakeid,
+            tok=token,
+            headers=headers,
+            delay_range=DEFAULT_REQUEST_DELAY
+        )
+        try:
+            for record in records:
+                if self.is_cancelled:
+                    break
                 
-                if not titles:  # 没有更多文章
+                article_date = datetime.fromtimestamp(record.update_time).date()
+                if article_date < start_date:
+                    # 文章太旧，停止爬取
                     break
                 
-                # 检查文章是否在时间范围内
-                found_in_range = False
-                for i, (title, link, update_time) in enumerate(zip(titles, links, update_times)):
-                    article_date = datetime.fromtimestamp(int(update_time)).date()
+                if article_date <= end_date:
+                    article_info = {
+                        'name': account_name,
+                        'title': record.title,
+                        'link': record.link,
+                        'digest': record.digest,
+                        'publish_time': self._format_timestamp(record.update_time),
+                        'publish_timestamp': record.update_time,
+                        'content': ''  # 这里可以后续补充
+                    }
                     
-                    if article_date < start_date:
-                        # 文章太旧，停止爬取
-                        break
+                    articles_in_range.append(article_info)
                     
-                    if start_date <= article_date <= end_date:
-                        article_info = {
-                            'name': account_name,
-                            'title': title,
-                            'link': link,
-                            'digest': '',  # 这里可以后续补充
-                            'publish_time': self._format_timestamp(update_time),
-                            'publish_timestamp': update_time,
-                            'content': ''  # 这里可以后续补充
-                        }
-                        
-                        articles_in_range.append(article_info)
-                        found_in_range = True
-                        
-                        # 保存到数据库
-                        if self.db_manager:
-                            self.db_manager.save_article(article_info, batch_id)
-                
-                if not found_in_range and article_date < start_date:
-                    # 如果这页没有符合条件的文章且已经超出时间范围，停止
-                    break
-                
-                page_start += 5
-                
-                # 请求间延迟
-                delay = random.uniform(*DEFAULT_REQUEST_DELAY)
-                time.sleep(delay)
-                
-            except Exception as e:
-                logging.warning(f"获取 {account_name} 第 {page+1} 页失败: {e}")
-                continue
+                    # 保存到数据库
+                    if self.db_manager:
+                        self.db_manager.save_article(article_info, batch_id)
+        except Exception as e:
+            logging.warning(f"获取 {account_name} 文章列表失败: {e}")
+        finally:
+            records.close()
         
         return articles_in_range
     
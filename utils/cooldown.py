@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+账号冷却状态模块
+==============
+
+模块功能:
+    微信返回频率限制（ret=200013）时，把对应账号标记为冷却中，
+    冷却时长按连续触发次数指数退避并加入随机抖动。冷却期间该账号的
+    请求直接抛出 FreqControlError，由调用方改期，而不是占着线程睡眠。
+
+退避规则:
+    第 n 次连续触发的冷却时长 = min(base * 2^(n-1), max) * (1 ± jitter)
+    任意一次请求成功即清零连续触发次数。
+    默认只在进程内共享；多个爬取进程时通过 set_registry 换成跨进程共享的登记表。
+
+登录态失效（AUTH_EXPIRED_RETS）不是频率限制，抛出 AuthExpiredError，由调用方计入账号熔断。
+
+使用示例:
+    from utils.cooldown import get_cooldowns, FreqControlError
+    try:
+        ...
+    except FreqControlError as exc:
+        defer(exc.retry_after)
+"""
+
+import random
+import threading
+import time
+
+# 频率限制错误码
+FREQ_CONTROL_RET = 200013
+# 登录态失效错误码（invalid session / invalid csrf token），需要重新登录
+AUTH_EXPIRED_RETS = (200003, 200040)
+
+
+class FreqControlError(Exception):
+    """账号处于频率限制冷却期"""
+
+    def __init__(self, key, retry_after):
+        super().__init__(f"account {key} is cooling down for {retry_after:.0f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class AuthExpiredError(Exception):
+    """微信返回登录态失效，账号的 token/cookie 需要更新"""
+
+    def __init__(self, ret, msg=""):
+        super().__init__(f"wechat login expired (ret={ret}, msg={msg})")
+        self.ret = ret
+
+
+class CooldownRegistry:
+    """进程内共享的账号冷却登记表"""
+
+    def __init__(self, base=60.0, maximum=1800.0, jitter=0.2):
+        self.base = float(base)
+        self.maximum = float(maximum)
+        self.jitter = float(jitter)
+        self._state = {}  # key -> (连续触发次数, 冷却结束时间)
+        self._lock = threading.Lock()
+
+    def trip(self, key):
+        """记录一次频率限制，返回本次冷却秒数"""
+        with self._lock:
+            strikes, until = self._state.get(key, (0, 0.0))
+            now = time.monotonic()
+            if until > now:
+                # 冷却期内其他线程已触发过，沿用当前冷却
+                return until - now
+            strikes += 1
+            delay = min(self.base * (2 ** (strikes - 1)), self.maximum)
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+            self._state[key] = (strikes, now + delay)
+            return delay
+
+    def remaining(self, key):
+        """账号剩余冷却秒数，未冷却返回 0"""
+        state = self._state.get(key)
+        if not state:
+            return 0.0
+        return max(0.0, state[1] - time.monotonic())
+
+    def check(self, key):
+        """账号冷却中则抛出 FreqControlError"""
+        remaining = self.remaining(key)
+        if remaining > 0:
+            raise FreqControlError(key, remaining)
+
+    def record_success(self, key):
+        """请求成功，清零连续触发次数"""
+        if key in self._state:
+            with self._lock:
+                state = self._state.get(key)
+                if state and state[1] <= time.monotonic():
+                    del self._state[key]
+
+    def reset(self, key):
+        with self._lock:
+            self._state.pop(key, None)
+
+    def snapshot(self):
+        """当前冷却中的账号及剩余秒数"""
+        now = time.monotonic()
+        return {k: until - now for k, (_, until) in list(self._state.items()) if until > now}
+
+
+_registry = CooldownRegistry()
+
+
+def configure(base=None, maximum=None, jitter=None):
+    if base is not None:
+        _registry.base = float(base)
+    if maximum is not None:
+        _registry.maximum = float(maximum)
+    if jitter is not None:
+        _registry.jitter = float(jitter)
+
+
+def set_registry(registry):
+    """替换冷却登记表的实现（如多进程共享的 crawler.account_limits.MongoCooldownRegistry）"""
+    global _registry
+    _registry = registry
+
+
+def get_cooldowns():
+    return _registry
@@ -11,7 +11,7 @@
     提供目标URL列表。
 
 主要功能:
-    1. 分页数据获取 - 按页码批量获取文章列表
+    1. 分页数据获取 - 按页码批量获取文章列表（iterAllUrlPages/iterAllUrl 逐页流式产出）
     2. 信息提取 - 从API响应中提取文章标题、链接、时间戳
     3. 进度显示 - 使用tqdm显示爬取进度
     4. 数据保存 - 将获取的数据分类保存为CSV文件
@@ -50,7 +50,8 @@ API接口说明:
     - filename: 保存文件名前缀
 
 性能优化:
-    - 请求间随机延时1-2秒，避免被反爬
+    - 请求间随机延时1-2秒，避免被反爬（传入账号令牌桶时改为按令牌桶限流）
+    - 通过 http_client 共享 Session，复用 keep-alive 连接
     - 使用tqdm显示实时进度
     - 异常处理确保程序稳定性
 
@@ -82,6 +83,8 @@ import random
 import requests
 import time
 import csv
+from .http_client import http_get
+from .cooldown import get_cooldowns, FreqControlError, AuthExpiredError, AUTH_EXPIRED_RETS
 from tqdm import tqdm
 import datetime
 import os
@@ -93,30 +96,124 @@ FREQ_CONTROL_RET = 200013
 FREQ_CONTROL_WAIT = 60
 
 
-def getAllUrl(page_num, start_page, fad, tok, headers, delay_range=(1, 2), retries=1, timeout=TIMEOUT):                             # pages
-    url = 'https://mp.weixin.qq.com/cgi-bin/appmsg'
-    title = []
-    link = []
-    update_time = []
+class HighWaterMark:
+    """
+    增量爬取水位线：上次已见到的最新文章（发布时间戳 + 链接）
+
+    列表按时间倒序返回，遇到该文章或更早的文章即可停止翻页；
+    命中后 reached 置为 True，调用方据此区分"没有新文章"和"接口无数据"。
+    翻到列表末尾（接口返回空页）时 exhausted 置为 True。两者都为 False 说明翻页在水位线之前中止
+    （达到页数上限、请求失败或接口出错），中间的文章还没有拉取。
+    """
+    __slots__ = ("update_time", "link", "reached", "exhausted")
+
+    def __init__(self, update_time, link=None):
+        self.update_time = int(update_time)
+        self.link = link
+        self.reached = False
+        self.exhausted = False
+
+    @property
+    def complete(self):
+        """本次翻页是否已覆盖到水位线（或整个列表）"""
+        return self.reached or self.exhausted
+
+    def is_reached_by(self, item):
+        if self.link and item.get('link') == self.link:
+            return True
+        try:
+            return int(item.get('update_time') or 0) < self.update_time
+        except (TypeError, ValueError):
+            return False
+
+
+class ArticleRecord:
+    """
+    文章列表中的单篇文章（app_msg_list 的一项）
+
+    使用 __slots__ 保持内存紧凑，深度回溯时逐页产出，不需要一次性持有全部数据。
+    """
+    __slots__ = ("title", "link", "update_time", "create_time", "cover", "digest",
+                 "aid", "appmsgid", "itemidx", "author_name", "page")
+
+    def __init__(self, item, page=0):
+        self.title = item.get('title') or ''
+        self.link = item.get('link') or ''
+        self.update_time = int(item.get('update_time') or 0)
+        self.create_time = int(item.get('create_time') or self.update_time)
+        self.cover = item.get('cover') or ''
+        self.digest = item.get('digest') or ''
+        self.aid = item.get('aid') or ''
+        self.appmsgid = item.get('appmsgid')
+        self.itemidx = item.get('itemidx')
+        self.author_name = item.get('author_name') or ''
+        self.page = page
+
+    def __repr__(self):
+        return f"ArticleRecord(aid={self.aid!r}, title={self.title!r}, update_time={self.update_time})"
+
+
+LIST_URL = 'https://mp.weixin.qq.com/cgi-bin/appmsg'
+
+
+def list_params(begin, fad, tok):
+    """文章列表接口（list_ex）的请求参数"""
+    return {
+        'action': 'list_ex',
+        'begin': begin,  # 页数
+        'count': '5',
+        'fakeid': fad,
+        'type': '9',
+        'query': '',
+        'token': tok,
+        'lang': 'zh_CN',
+        'f': 'json',
+        'ajax': '1',
+    }
+
+
+def parse_list_page(msg_list, page, stop_at=None):
+    """把一页 app_msg_list 转为 ArticleRecord 列表，遇到水位线即截断"""
+    records = []
+    for item in msg_list:     # 遍历dic['app_msg_list']中所有内容
+        if stop_at is not None and stop_at.is_reached_by(item):
+            stop_at.reached = True
+            break
+        records.append(ArticleRecord(item, page=page))
+    return records
+
+
+def _throttle(limiter, delay_range):
+    """有账号令牌桶时按令牌桶放行，否则随机延时"""
+    if limiter is not None:
+        limiter.acquire()
+    else:
+        time.sleep(random.uniform(*delay_range))
+
+
+def iterAllUrlPages(page_num, start_page, fad, tok, headers, delay_range=(1, 2), retries=1, timeout=TIMEOUT,
+                    stop_at=None, session_key=None, limiter=None, cooldown_key=None):
+    """
+    逐页拉取文章列表，每拉到一页就产出该页的 ArticleRecord 列表
+
+    :param stop_at: 可选 HighWaterMark，翻到水位线即停止，page_num 作为最大页数
+    :param session_key: 共享 HTTP Session 的 key（通常为账号 id），复用连接
+    :param limiter: 可选账号令牌桶（utils.rate_limiter），提供时代替 delay_range 随机延时
+    :param cooldown_key: 可选账号冷却 key；提供时遇到频率限制登记冷却并抛出 FreqControlError，
+                         不再原地等待 FREQ_CONTROL_WAIT 秒
+    :raises AuthExpiredError: 登录态失效
+    """
+    url = LIST_URL
     with tqdm(total=page_num) as pbar:
         for i in range(page_num):
-            data = {
-                'action': 'list_ex',
-                'begin': start_page + i*5,  # 页数
-                'count': '5',
-                'fakeid': fad,
-                'type': '9',
-                'query': '',
-                'token': tok,
-                'lang': 'zh_CN',
-                'f': 'json',
-                'ajax': '1',
-            }
-            time.sleep(random.uniform(*delay_range))
+            data = list_params(start_page + i*5, fad, tok)
+            if cooldown_key is not None:
+                get_cooldowns().check(cooldown_key)
+            _throttle(limiter, delay_range)
             resp_json = None
             for retry_attempt in range(max(1, retries)):
                 try:
-                    r = requests.get(url, headers=headers, params=data, timeout=timeout)
+                    r = http_get(url, session_key=session_key, headers=headers, params=data, timeout=timeout)
                     r.raise_for_status()
                     resp_json = r.json()
                     break
@@ -124,7 +221,7 @@ def getAllUrl(page_num, start_page, fad, tok, headers, delay_range=(1, 2), retri
                     resp_json = None
                     logging.warning(f"request page {i} failed: {exc}")
                     if retry_attempt < retries - 1:
-                        time.sleep(random.uniform(*delay_range))
+                        _throttle(limiter, delay_range)
             if resp_json is None:
                 break
             # 解析json
@@ -132,23 +229,60 @@ def getAllUrl(page_num, start_page, fad, tok, headers, delay_range=(1, 2), retri
             base_ret = dic.get("base_resp", {}).get("ret")
             if base_ret not in (0, None):
                 err_msg = dic.get("base_resp", {}).get("err_msg", "未知错误")
+                if base_ret in AUTH_EXPIRED_RETS:
+                    raise AuthExpiredError(base_ret, err_msg)
                 # 如果是频率限制，等待后重试
                 if base_ret == FREQ_CONTROL_RET:
+                    if cooldown_key is not None:
+                        retry_after = get_cooldowns().trip(cooldown_key)
+                        logging.warning(
+                            f"wechat returned freq control (ret={base_ret}) on page {i}, account cooling down {retry_after:.0f}s")
+                        raise FreqControlError(cooldown_key, retry_after)
                     logging.warning(
                         f"wechat returned freq control (ret={base_ret}) on page {i}, waiting {FREQ_CONTROL_WAIT}s before retry")
                     time.sleep(FREQ_CONTROL_WAIT)
-                    # 重新尝试当前页
-                    i -= 1  # 回退一页，下次循环会重新处理
                     continue
                 else:
                     logging.warning(f"wechat returned error ret={base_ret}, msg={err_msg}")
                     break
-            for i in dic['app_msg_list']:     # 遍历dic['app_msg_list']中所有内容
-                # 按照键值对的方式选择
-                title.append(i['title'])      # get title value
-                link.append(i['link'])        # get link value
-                update_time.append(i['update_time'])    # get update-time value
+            if cooldown_key is not None:
+                get_cooldowns().record_success(cooldown_key)
+            msg_list = dic.get('app_msg_list') or []
+            records = parse_list_page(msg_list, i, stop_at)
             pbar.update(1)
+            if stop_at is not None and not msg_list:
+                stop_at.exhausted = True
+            if records:
+                yield records
+            # 已到水位线或没有更多文章，停止翻页
+            if (stop_at is not None and stop_at.reached) or not msg_list:
+                break
+
+
+def iterAllUrl(page_num, start_page, fad, tok, headers, delay_range=(1, 2), retries=1, timeout=TIMEOUT,
+               stop_at=None, session_key=None, limiter=None, cooldown_key=None):
+    """逐篇产出 ArticleRecord，参数同 iterAllUrlPages；提前停止迭代即不再请求后续页"""
+    for records in iterAllUrlPages(page_num, start_page, fad, tok, headers, delay_range=delay_range,
+                                   retries=retries, timeout=timeout, stop_at=stop_at,
+                                   session_key=session_key, limiter=limiter, cooldown_key=cooldown_key):
+        yield from records
+
+
+def getAllUrl(page_num, start_page, fad, tok, headers, delay_range=(1, 2), retries=1, timeout=TIMEOUT,
+              stop_at=None, session_key=None, limiter=None, cooldown_key=None):                             # pages
+    """
+    :param stop_at: 可选 HighWaterMark，翻到水位线即停止，page_num 作为最大页数
+    :return: (标题列表, 链接列表, 时间戳列表)
+    """
+    title = []
+    link = []
+    update_time = []
+    for record in iterAllUrl(page_num, start_page, fad, tok, headers, delay_range=delay_range,
+                             retries=retries, timeout=timeout, stop_at=stop_at,
+                             session_key=session_key, limiter=limiter, cooldown_key=cooldown_key):
+        title.append(record.title)      # get title value
+        link.append(record.link)        # get link value
+        update_time.append(record.update_time)    # get update-time value
 
     return title, link, update_time
 
@@ -81,7 +81,10 @@ HTTP请求配置:
 
 import csv
 import random
-import requests
+try:
+    from .http_client import http_get
+except ImportError:  # 作为脚本直接运行
+    from http_client import http_get
 import bs4
 import time
 from tqdm import tqdm
@@ -110,7 +113,7 @@ def getContentByUrl(url_list):
             # 随机休眠，防止被封
             # time.sleep(random.randint(1, 5))
             # 发送请求
-            response = requests.get(url[0], headers=headers)
+            response = http_get(url[0], headers=headers)
             # print("state_code:", response.status_code)    # 200即正常
             # 解析html
             soup = bs4.BeautifulSoup(response.text, 'html.parser')
@@ -78,7 +78,10 @@
 import csv
 import random
 import threading
-import requests
+try:
+    from .http_client import http_get
+except ImportError:  # 作为脚本直接运行
+    from http_client import http_get
 import bs4
 import time
 import queue
@@ -98,7 +101,7 @@ def getUrlList(url_storage_path):
 def do_craw(headers, url_queue:queue.Queue, response_queue:queue.Queue):
     while url_queue.empty() != True:
         url = url_queue.get()
-        response = requests.get(url[1][0], headers=headers)
+        response = http_get(url[1][0], headers=headers)
         response_queue.put([url[0], response])
         # print("craw")
         time.sleep(random.randint(1, 2))
@@ -57,7 +57,8 @@ API接口说明:
 
 import logging
 import time
-import requests
+from .http_client import http_get
+from .cooldown import get_cooldowns, FreqControlError, AuthExpiredError, AUTH_EXPIRED_RETS
 
 # 频率限制错误码
 FREQ_CONTROL_RET = 200013
@@ -65,18 +66,12 @@ FREQ_CONTROL_RET = 200013
 FREQ_CONTROL_WAIT = 60
 # 最大重试次数
 MAX_RETRIES = 3
+SEARCH_URL = 'https://mp.weixin.qq.com/cgi-bin/searchbiz'
 
 
-def get_fakid(headers, tok, query, retries=MAX_RETRIES):
-    '''
-    :param headers: 请求头
-    :param tok: token
-    :param query: 查询名称
-    :param retries: 遇到频率限制时的最大重试次数
-    :return: 公众号列表
-    '''
-    url = 'https://mp.weixin.qq.com/cgi-bin/searchbiz'
-    data = {
+def search_params(query, tok):
+    """搜索公众号接口（search_biz）的请求参数"""
+    return {
         'action': 'search_biz',
         'scene': 1,  # 页数
         'begin': 0,
@@ -88,12 +83,90 @@ def get_fakid(headers, tok, query, retries=MAX_RETRIES):
         'ajax': '1',
     }
 
+
+def parse_biz_list(items):
+    '''
+    解析 searchbiz 返回的 list 字段
+    :param items: dic['list']
+    :return: 公众号列表
+    '''
+    # 获取公众号名称、fakeid、头像
+    wpub_list = []
+    for item in items:
+        wpub_info = {
+            'wpub_name': item['nickname'],
+            'wpub_fakid': item['fakeid']
+        }
+        # 记录所有可用字段（用于调试）
+        available_fields = [k for k in item.keys() if 'img' in k.lower()
+                            or 'avatar' in k.lower() or 'head' in k.lower()]
+        if available_fields:
+            logging.info(f"Available image fields for {item['nickname']}: {available_fields}")
+
+        # 尝试获取头像URL（微信API可能返回的字段名，按优先级尝试）
+        avatar_found = False
+        for field_name in ['round_head_img', 'headimg', 'avatar', 'head_img', 'round_headimg', 'logo_url']:
+            if field_name in item and item[field_name]:
+                wpub_info['wpub_avatar'] = item[field_name]
+                avatar_found = True
+                logging.info(f"Found avatar for {item['nickname']} in field '{field_name}'")
+                break
+
+        if not avatar_found:
+            logging.warning(f"No avatar field found for {item['nickname']}. All fields: {list(item.keys())}")
+
+        # 保存其他可能有用的字段
+        if 'alias' in item:
+            wpub_info['alias'] = item['alias']  # 公众号别名
+        if 'service_type' in item:
+            wpub_info['service_type'] = item['service_type']  # 服务类型
+        if 'verify_type' in item:
+            wpub_info['verify_type'] = item['verify_type']  # 认证类型
+        if 'signature' in item:
+            wpub_info['signature'] = item['signature']  # 简介/签名
+        if 'user_name' in item:
+            wpub_info['user_name'] = item['user_name']  # 用户名（可能是原始ID）
+
+        # 保存原始数据用于调试（仅包含关键字段）
+        wpub_info['_raw_data'] = {
+            k: v for k, v in item.items()
+            if k not in ['nickname', 'fakeid'] and v is not None
+        }
+        wpub_list.append(wpub_info)
+
+    return wpub_list
+
+
+def search_biz(headers, tok, query, retries=MAX_RETRIES, session_key=None, limiter=None, cooldown_key=None):
+    '''
+    :param headers: 请求头
+    :param tok: token
+    :param query: 查询名称
+    :param retries: 遇到频率限制时的最大重试次数
+    :param session_key: 共享 HTTP Session 的 key（通常为账号 id），复用连接
+    :param limiter: 可选账号令牌桶（utils.rate_limiter），每次请求前取令牌
+    :param cooldown_key: 可选账号冷却 key；提供时遇到频率限制登记冷却并抛出 FreqControlError
+    :return: 公众号列表；接口出错返回 None（区别于"搜索无结果"的空列表）
+    :raises AuthExpiredError: 登录态失效
+    '''
+    url = SEARCH_URL
+    data = search_params(query, tok)
+
     for attempt in range(retries):
         # 发送请求
-        r = requests.get(url, headers=headers, params=data)
+        if cooldown_key is not None:
+            get_cooldowns().check(cooldown_key)
+        if limiter is not None:
+            limiter.acquire()
+        r = http_get(url, session_key=session_key, headers=headers, params=data)
         # 解析json
         dic = r.json()
 
+        # 登录态失效：重试没有意义，交给调用方处理
+        base_ret = dic.get('base_resp', {}).get('ret')
+        if dic.get('ret') in AUTH_EXPIRED_RETS or base_ret in AUTH_EXPIRED_RETS:
+            raise AuthExpiredError(dic.get('ret') or base_ret, dic.get('base_resp', {}).get('err_msg', ''))
+
         # 检查响应是否包含错误
         if 'ret' in dic and dic['ret'] != 0:
             ret = dic['ret']
@@ -101,6 +174,10 @@ def get_fakid(headers, tok, query, retries=MAX_RETRIES):
 
             # 如果是频率限制，等待后重试
             if ret == FREQ_CONTROL_RET:
+                if cooldown_key is not None:
+                    retry_after = get_cooldowns().trip(cooldown_key)
+                    logging.warning(f"wechat returned freq control (ret={ret}), account cooling down {retry_after:.0f}s")
+                    raise FreqControlError(cooldown_key, retry_after)
                 if attempt < retries - 1:
                     logging.warning(
                         f"wechat returned freq control (ret={ret}), waiting {FREQ_CONTROL_WAIT}s before retry ({attempt + 1}/{retries})")
@@ -108,60 +185,28 @@ def get_fakid(headers, tok, query, retries=MAX_RETRIES):
                     continue
                 else:
                     logging.error(f"wechat returned freq control (ret={ret}) after {retries} attempts, giving up")
-                    return []
+                    return None
             else:
                 logging.warning(f"wechat returned error ret={ret}, msg={error_msg}")
-                return []
+                return None
+
+        if cooldown_key is not None:
+            get_cooldowns().record_success(cooldown_key)
 
         # 检查响应中是否包含 list 字段
         if 'list' not in dic:
             logging.warning(f"wechat response missing 'list' field: {dic}")
-            return []
-
-        # 获取公众号名称、fakeid、头像
-        wpub_list = []
-        for item in dic['list']:
-            wpub_info = {
-                'wpub_name': item['nickname'],
-                'wpub_fakid': item['fakeid']
-            }
-            # 记录所有可用字段（用于调试）
-            available_fields = [k for k in item.keys() if 'img' in k.lower()
-                                or 'avatar' in k.lower() or 'head' in k.lower()]
-            if available_fields:
-                logging.info(f"Available image fields for {item['nickname']}: {available_fields}")
-
-            # 尝试获取头像URL（微信API可能返回的字段名，按优先级尝试）
-            avatar_found = False
-            for field_name in ['round_head_img', 'headimg', 'avatar', 'head_img', 'round_headimg', 'logo_url']:
-                if field_name in item and item[field_name]:
-                    wpub_info['wpub_avatar'] = item[field_name]
-                    avatar_found = True
-                    logging.info(f"Found avatar for {item['nickname']} in field '{field_name}'")
-                    break
-
-            if not avatar_found:
-                logging.warning(f"No avatar field found for {item['nickname']}. All fields: {list(item.keys())}")
-
-            # 保存其他可能有用的字段
-            if 'alias' in item:
-                wpub_info['alias'] = item['alias']  # 公众号别名
-            if 'service_type' in item:
-                wpub_info['service_type'] = item['service_type']  # 服务类型
-            if 'verify_type' in item:
-                wpub_info['verify_type'] = item['verify_type']  # 认证类型
-            if 'signature' in item:
-                wpub_info['signature'] = item['signature']  # 简介/签名
-            if 'user_name' in item:
-                wpub_info['user_name'] = item['user_name']  # 用户名（可能是原始ID）
-
-            # 保存原始数据用于调试（仅包含关键字段）
-            wpub_info['_raw_data'] = {
-                k: v for k, v in item.items()
-                if k not in ['nickname', 'fakeid'] and v is not None
-            }
-            wpub_list.append(wpub_info)
-
-        return wpub_list
-
-    return []
+            return None
+
+        return parse_biz_list(dic['list'])
+
+    return None
+
+
+def get_fakid(headers, tok, query, retries=MAX_RETRIES, session_key=None, limiter=None, cooldown_key=None):
+    '''
+    搜索公众号，参数同 search_biz
+    :return: 公众号列表（接口出错时为空列表）
+    '''
+    return search_biz(headers, tok, query, retries=retries, session_key=session_key,
+                      limiter=limiter, cooldown_key=cooldown_key) or []
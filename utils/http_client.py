@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+共享 HTTP 客户端模块
+==================
+
+模块功能:
+    为微信公众平台接口和图片 CDN 提供复用连接的 requests.Session。
+    每个账号（session_key）一个 Session，连接保持 keep-alive，
+    避免每次请求都重新建立 TCP + TLS 连接。
+
+主要功能:
+    1. 连接池 - 按 session_key 缓存 Session，池大小可配置
+    2. 压缩传输 - 默认声明 gzip/deflate
+    3. 重试策略 - 图片 CDN 的连接错误及 429/5xx 由 urllib3 Retry 退避重试；
+       微信接口 Session 不在底层重试（调用方自行重试，每次重试都经过限流和请求计数）
+    4. 默认超时 - 未显式传入 timeout 时使用统一配置
+    5. 请求回调 - add_request_listener 注册的回调在每次请求前被调用（用于统计账号请求数）
+
+使用示例:
+    from utils.http_client import http_get
+    r = http_get(url, session_key=str(account_id), headers=headers, params=params)
+
+注意事项:
+    - 后端启动时通过 configure() 按 backend.config.Settings 设置参数
+    - 修改配置会关闭并重建已有 Session
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_SESSION_KEY = "default"
+# 图片 CDN（头像等）使用的 Session
+CDN_SESSION_KEY = "cdn"
+
+_config = {
+    "pool_size": 10,      # 每个 Session 的连接池大小
+    "retries": 2,         # 图片 CDN 连接错误/429/5xx 的重试次数
+    "backoff": 0.5,       # 重试退避系数（秒）
+    "timeout": 10.0,      # 默认超时（秒）
+}
+_sessions = {}
+_listeners = []
+_lock = threading.Lock()
+
+
+def configure(pool_size=None, retries=None, backoff=None, timeout=None):
+    """更新全局配置，已创建的 Session 会被关闭并按新配置重建"""
+    with _lock:
+        if pool_size is not None:
+            _config["pool_size"] = max(1, int(pool_size))
+        if retries is not None:
+            _config["retries"] = max(0, int(retries))
+        if backoff is not None:
+            _config["backoff"] = max(0.0, float(backoff))
+        if timeout is not None:
+            _config["timeout"] = float(timeout)
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def get_session(session_key=None):
+    """获取（必要时创建）指定 key 的共享 Session"""
+    key = session_key or DEFAULT_SESSION_KEY
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _create_session(retries=key == CDN_SESSION_KEY)
+            _sessions[key] = session
+        return session
+
+
+def close_session(session_key=None):
+    """关闭并丢弃指定 key 的 Session（如账号 cookie 更新后）"""
+    with _lock:
+        session = _sessions.pop(session_key or DEFAULT_SESSION_KEY, None)
+    if session is not None:
+        session.close()
+
+
+def add_request_listener(listener):
+    """注册请求回调 listener(session_key, url)，回调内的异常会被忽略"""
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def notify_request(session_key, url):
+    """通知请求回调（不经过 http_get 发出的请求，如 asyncio 引擎，需自行调用）"""
+    for listener in list(_listeners):
+        try:
+            listener(session_key, url)
+        except Exception:
+            pass
+
+
+def http_get(url, session_key=None, timeout=None, **kwargs):
+    """使用共享 Session 发送 GET 请求，参数同 requests.get"""
+    if timeout is None:
+        timeout = _config["timeout"]
+    if _listeners:
+        notify_request(session_key, url)
+    return get_session(session_key).get(url, timeout=timeout, **kwargs)
+
+
+def _create_session(retries=False):
+    retry = Retry(
+        total=_config["retries"] if retries else 0,
+        backoff_factor=_config["backoff"],
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=_config["pool_size"],
+        pool_maxsize=_config["pool_size"],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    return session
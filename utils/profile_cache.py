@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+公众号资料解析缓存模块
+==================
+
+模块功能:
+    searchbiz（按名称搜索公众号）是最容易被频率限制的接口。本模块按规范化后的
+    公众号名称缓存搜索结果（fakeid、头像URL、别名、简介等），后端爬虫和桌面批量
+    爬取共用，大部分情况下不必再请求 searchbiz。
+
+主要功能:
+    1. TTL 缓存 - 命中结果在 ttl 秒内有效
+    2. 负缓存 - "搜索无结果"缓存 negative_ttl 秒；接口出错（token 失效等）不缓存
+    3. 请求合并 - 同一名称的并发解析只发一次请求，其余线程等待结果
+
+使用示例:
+    from utils.profile_cache import resolve_fakid
+    results = resolve_fakid(headers, token, '公众号名称')
+    # 返回格式与 get_fakid 相同：[{'wpub_name': ..., 'wpub_fakid': ..., ...}]
+"""
+
+import copy
+import threading
+import time
+import unicodedata
+
+from .getFakId import search_biz
+
+# 缓存的字段（不保存调试用的 _raw_data）
+PROFILE_FIELDS = ('wpub_name', 'wpub_fakid', 'wpub_avatar', 'alias', 'signature',
+                  'service_type', 'verify_type', 'user_name')
+
+
+def normalize_name(name):
+    """规范化公众号名称：全角转半角、去首尾空白、合并空白、忽略大小写"""
+    name = unicodedata.normalize('NFKC', name or '')
+    return ' '.join(name.split()).casefold()
+
+
+class _InFlight:
+    __slots__ = ('event', 'result', 'failed')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class ProfileCache:
+    """线程安全的公众号资料缓存"""
+
+    def __init__(self, ttl=86400.0, negative_ttl=3600.0, max_entries=10000):
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self.max_entries = int(max_entries)
+        self._entries = {}   # key -> (过期时间, 资料 dict 或 None)
+        self._inflight = {}  # key -> _InFlight
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """
+        读取缓存
+        :return: (是否命中, 资料 dict 或 None)；命中 None 表示负缓存
+        """
+        entry = self._entries.get(normalize_name(name))
+        if entry is None or entry[0] <= time.monotonic():
+            return False, None
+        return True, entry[1]
+
+    def put(self, name, profile):
+        ttl = self.ttl if profile is not None else self.negative_ttl
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[normalize_name(name)] = (time.monotonic() + ttl, profile)
+
+    def invalidate(self, name):
+        with self._lock:
+            self._entries.pop(normalize_name(name), None)
+
+    def resolve(self, name, fetch):
+        """
+        解析公众号资料，未命中时调用 fetch()（返回 search_biz 的结果）
+
+        :return: 资料 dict；搜索无结果或接口出错返回 None
+        """
+        hit, profile = self.get(name)
+        if hit:
+            return profile
+        key = normalize_name(name)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+        if not leader:
+            flight.event.wait()
+            if not flight.failed:
+                return flight.result
+            # 领头请求失败（抛出异常或接口出错返回 None，如该账号被限流），自行请求一次
+            return self._fetch(name, fetch)
+        try:
+            results = fetch()
+            # 接口出错不是"无结果"，等待中的请求不能把 None 当作负结果返回
+            flight.failed = results is None
+            flight.result = self.store(name, results)
+            return flight.result
+        except Exception:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def store(self, name, results):
+        """
+        缓存一次 search_biz 的结果（供自行发请求的调用方使用，如 asyncio 爬取引擎）
+        :return: 资料 dict；搜索无结果或接口出错返回 None
+        """
+        if results is None:
+            # 接口出错，不缓存
+            return None
+        profile = None
+        if results:
+            profile = {k: results[0][k] for k in PROFILE_FIELDS if k in results[0]}
+        self.put(name, profile)
+        return profile
+
+    def _fetch(self, name, fetch):
+        return self.store(name, fetch())
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [k for k, (expires, _) in self._entries.items() if expires <= now]
+        for k in expired:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            # 仍然太多时淘汰最早过期的一半
+            for k, _ in sorted(self._entries.items(), key=lambda kv: kv[1][0])[:self.max_entries // 2]:
+                del self._entries[k]
+
+
+_cache = ProfileCache()
+
+
+def configure(ttl=None, negative_ttl=None):
+    if ttl is not None:
+        _cache.ttl = float(ttl)
+    if negative_ttl is not None:
+        _cache.negative_ttl = float(negative_ttl)
+
+
+def get_profile_cache():
+    return _cache
+
+
+def resolve_fakid(headers, tok, query, refresh=False, **kwargs):
+    '''
+    带缓存的 get_fakid，参数同 getFakId.search_biz
+    :param refresh: 为 True 时跳过缓存重新搜索（如缓存的 fakeid 已失效）
+    :return: 公众号列表（最多一项，格式同 get_fakid）；无结果返回空列表，本次搜索接口出错返回 None
+    '''
+    if refresh:
+        _cache.invalidate(query)
+    failed = []
+
+    def fetch():
+        results = search_biz(headers, tok, query, **kwargs)
+        if results is None:
+            failed.append(True)
+        return results
+
+    profile = _cache.resolve(query, fetch)
+    if profile:
+        return [copy.deepcopy(profile)]
+    return None if failed else []
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+账号级令牌桶限流模块
+==================
+
+模块功能:
+    同一账号的所有微信接口请求（文章列表、搜索公众号等）从同一个令牌桶取令牌，
+    进程内所有爬取线程共享，避免多个线程同时使用一个账号的 token 触发频率限制。
+    多个爬取进程时通过 set_bucket_factory 换成跨进程共享的令牌桶（crawler.account_limits）。
+
+令牌桶参数:
+    - rate: 持续速率（每秒令牌数）
+    - burst: 桶容量，空闲后允许的突发请求数
+
+使用示例:
+    from utils.rate_limiter import get_limiter
+    limiter = get_limiter(str(account_id))
+    if limiter.wait_time() > 30:
+        ...  # 改期执行，而不是占着线程睡眠
+    limiter.acquire()
+"""
+
+import threading
+import time
+
+_config = {
+    "rate": 0.5,    # 每秒 0.5 个请求，即每分钟 30 个
+    "burst": 5,
+}
+_limiters = {}
+_lock = threading.Lock()
+# 创建令牌桶的函数 factory(key, rate, burst)，默认为进程内令牌桶
+_factory = None
+
+
+class TokenBucket:
+    """线程安全的令牌桶；令牌可透支，排队的线程按取令牌顺序依次放行"""
+
+    def __init__(self, rate, burst):
+        self.rate = max(float(rate), 1e-6)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0  # 累计放行的请求数
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self):
+        """当前取一个令牌需要等待的秒数（不消耗令牌）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1.0 - self._tokens) / self.rate)
+
+    def reserve(self, max_wait=None):
+        """
+        预约一个令牌，返回需要等待的秒数（调用方自行等待，可用于 asyncio）
+
+        :param max_wait: 最长等待秒数；需要等待更久时不预约，返回 None
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (1.0 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1.0
+            self.acquired += 1
+            return wait
+
+    def acquire(self, max_wait=None):
+        """
+        取一个令牌，必要时阻塞等待
+
+        :param max_wait: 最长等待秒数；需要等待更久时不取令牌，直接返回 False
+        :return: 是否取到令牌
+        """
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+def configure(rate=None, burst=None):
+    """更新默认参数，已创建的令牌桶按新参数重建"""
+    with _lock:
+        if rate is not None:
+            _config["rate"] = float(rate)
+        if burst is not None:
+            _config["burst"] = float(burst)
+        _limiters.clear()
+
+
+def set_bucket_factory(factory):
+    """
+    替换令牌桶的实现（如多进程共享的令牌桶），已创建的令牌桶按新实现重建
+
+    :param factory: factory(key, rate, burst)，返回与 TokenBucket 接口相同的对象；None 恢复为进程内令牌桶
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _limiters.clear()
+
+
+def get_limiter(key):
+    """获取指定账号（key）的共享令牌桶"""
+    limiter = _limiters.get(key)
+    if limiter is not None:
+        return limiter
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            if _factory is not None:
+                limiter = _factory(key, _config["rate"], _config["burst"])
+            else:
+                limiter = TokenBucket(_config["rate"], _config["burst"])
+            _limiters[key] = limiter
+        return limiter